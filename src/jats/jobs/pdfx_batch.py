@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Batch conversion of a directory of PDFs with PDFX: files are sent concurrently by a pool
+of `concurrency` threads (with a `requests.Session` each, so connections are reused),
+requests without a response or with a 429 or 5xx one are retried with exponential backoff,
+and the status of every file is appended to a JSON Lines log (`--status`) as it's done;
+files converted according to the log are skipped, so an interrupted batch can be resumed.
+The throughput & latency percentiles of files are reported at the end. Without `--url`
+it runs against a stand-in PDFX started in the process (see `pdfx_stand_in`).
+
+    python -m jats.jobs.pdfx_batch path/to/pdfs --url http://pdfx.cs.man.ac.uk/ --concurrency 16
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import typing as t
+from collections import Counter
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter, sleep
+
+import requests
+
+from utils.itertools import percentile
+
+from .pdfx_client import PDFX_SERVICE_URL, save_xml, send_to_pdfx
+from .pdfx_stand_in import StandInPdfx
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class FileStatus(t.NamedTuple):
+    path: str
+    status: str  # 'done' or 'failed'
+    attempts: int
+    seconds: float  # of all the attempts, backoffs included
+    output: t.Optional[str] = None
+    error: t.Optional[str] = None
+
+
+def find_pdfs(input_dir: str) -> t.List[str]:
+    """Absolute paths of PDFs in the directory & its subdirectories, sorted."""
+    return sorted(
+        os.path.abspath(os.path.join(root, name))
+        for root, _, names in os.walk(input_dir)
+        for name in names
+        if name.lower().endswith('.pdf')
+    )
+
+
+def doc_name(filepath: str) -> str:
+    """Name of the document of the PDF, which names its task dir & its XML."""
+    return os.path.basename(filepath).rsplit('.', 1)[0]
+
+
+class _Converter:
+    """
+    Converts files in the threads of a pool, with a session per thread. XMLs are written
+    to the subdirectories of `output_dir` mirroring the ones of PDFs in `input_dir`.
+    """
+
+    def __init__(self,
+                 url: str,
+                 retries: int,
+                 backoff: float,
+                 timeout: float,
+                 input_dir: str,
+                 output_dir: t.Optional[str]):
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = output_dir
+        self._local = threading.local()
+        self._sessions: t.List[requests.Session] = []
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            self._sessions.append(session)
+        return session
+
+    def convert(self, filepath: str) -> FileStatus:
+        started = perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            resp = send_to_pdfx(filepath, url=self.url, session=self.session, timeout=self.timeout)
+            if resp is not None and resp.status_code == 200:
+                try:
+                    output = save_xml(filepath, resp.content, self.xml_dir(filepath))['output']
+                except OSError as e:
+                    error = f'not saved: {e.strerror or e}'
+                    return FileStatus(
+                        filepath, 'failed', attempts, perf_counter() - started, error=error
+                    )
+                return FileStatus(filepath, 'done', attempts, perf_counter() - started, output)
+            if resp is None:
+                error, retry = 'no response', True
+            else:
+                error, retry = f'HTTP {resp.status_code}', resp.status_code in RETRY_STATUSES
+            if not retry or attempts > self.retries:
+                return FileStatus(
+                    filepath, 'failed', attempts, perf_counter() - started, error=error
+                )
+            # exponential backoff with jitter, so retries of concurrent failures spread out
+            delay = self.backoff * 2 ** (attempts - 1)
+            sleep(random.uniform(delay / 2, delay))
+
+    def xml_dir(self, filepath: str) -> t.Optional[str]:
+        """The output dir of the PDF (`None` for the task dir of its document)."""
+        if not self.output_dir:
+            return None
+        relative = os.path.relpath(os.path.dirname(filepath), self.input_dir)
+        xml_dir = os.path.normpath(os.path.join(self.output_dir, relative))
+        os.makedirs(xml_dir, exist_ok=True)
+        return xml_dir
+
+    def close(self) -> None:
+        for session in self._sessions:
+            session.close()
+
+
+def converted(status_path: t.Optional[str]) -> t.Set[str]:
+    """Paths of files done, according to the status log."""
+    if not status_path or not os.path.exists(status_path):
+        return set()
+    statuses = {}
+    with open(status_path) as log:
+        for line in log:
+            if line.strip():
+                record = json.loads(line)
+                statuses[record['path']] = record['status']
+    return {filepath for filepath, status in statuses.items() if status == 'done'}
+
+
+def convert_batch(input_dir: str,
+                  url: str = PDFX_SERVICE_URL,
+                  concurrency: int = 8,
+                  retries: int = 3,
+                  backoff: float = 0.5,
+                  timeout: float = 60.,
+                  output_dir: t.Optional[str] = None,
+                  status_path: t.Optional[str] = None) -> dict:
+    """
+    Converts the PDFs of the directory (to the same subdirectories of `output_dir`,
+    by default to the task dirs of the documents, whose names have to be unique then);
+    returns the report.
+
+    >>> import tempfile
+    >>> input_dir, output_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    >>> for i in range(6):
+    ...     with open(os.path.join(input_dir, f'{i}.pdf'), 'wb') as pdf:
+    ...         _ = pdf.write(b'%PDF-1.4' if i else b'<html>')
+    >>> os.mkdir(os.path.join(input_dir, 'more'))
+    >>> with open(os.path.join(input_dir, 'more', '1.pdf'), 'wb') as pdf:
+    ...     _ = pdf.write(b'%PDF-1.5')
+    >>> server = StandInPdfx(latency=0.01, failure_rate=0.3).start()
+    >>> status_path = os.path.join(output_dir, 'status.jsonl')
+    >>> options = dict(url=server.url, concurrency=3, retries=10, backoff=0.01,
+    ...                output_dir=output_dir, status_path=status_path)
+    >>> report = convert_batch(input_dir, **options)
+    >>> report['done'], report['failed'], report['errors']
+    (6, 1, {'HTTP 400': 1})
+    >>> sorted(os.listdir(output_dir)), os.listdir(os.path.join(output_dir, 'more'))
+    (['1.xml', '2.xml', '3.xml', '4.xml', '5.xml', 'more', 'status.jsonl'], ['1.xml'])
+    >>> report = convert_batch(input_dir, **options)  # resumed
+    >>> report['skipped'], report['done'], report['failed']
+    (6, 0, 1)
+    >>> unwritable = dict(options, output_dir=status_path, status_path=None)  # a file
+    >>> report = convert_batch(input_dir, **unwritable)
+    >>> report['done'], report['failed'], sorted(report['errors'])
+    (0, 7, ['HTTP 400', 'not saved: File exists', 'not saved: Not a directory'])
+    >>> server.shutdown(); server.server_close()
+    """
+    files = find_pdfs(input_dir)
+    if not output_dir:
+        duplicates = [name for name, count in Counter(map(doc_name, files)).items() if count > 1]
+        assert not duplicates, f"Documents of the same names would share task dirs: {duplicates}"
+    done = converted(status_path)
+    pending = [filepath for filepath in files if filepath not in done]
+    converter = _Converter(url, retries, backoff, timeout, input_dir, output_dir)
+    statuses = []
+    started = perf_counter()
+    try:
+        with ThreadPoolExecutor(concurrency) as pool, \
+                (open(status_path, 'a') if status_path else nullcontext()) as log:
+            futures = [pool.submit(converter.convert, filepath) for filepath in pending]
+            for future in as_completed(futures):
+                status = future.result()
+                statuses.append(status)
+                if log:
+                    log.write(json.dumps(status._asdict()) + '\n')
+                    log.flush()
+    finally:
+        converter.close()
+    elapsed = perf_counter() - started
+
+    latencies = sorted(status.seconds for status in statuses if status.status == 'done')
+    attempts = sum(status.attempts for status in statuses)
+    return {
+        'files': len(files),
+        'skipped': len(files) - len(pending),
+        'done': len(latencies),
+        'failed': len(statuses) - len(latencies),
+        'errors': dict(Counter(status.error for status in statuses if status.error)),
+        'requests': attempts,
+        'retries': attempts - len(statuses),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p90_ms': percentile(latencies, 0.9) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.,
+    }
+
+
+def run_stand_in(input_dir: str,
+                 latency: float = 0.05,
+                 failure_rate: float = 0.,
+                 **options) -> dict:
+    """Converts the batch with a stand-in PDFX started in the process; reports its stats too."""
+    server = StandInPdfx(latency=latency, failure_rate=failure_rate).start()
+    try:
+        report = convert_batch(input_dir, url=server.url, **options)
+    finally:
+        server.shutdown()
+        server.server_close()
+    report['server'] = server.stats()
+    return report
+
+
+def main(argv: t.Sequence[str] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input_dir')
+    parser.add_argument('--url', help="URL of PDFX; a stand-in one is started if missing")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=0.5,
+                        help="seconds before the first retry")
+    parser.add_argument('--timeout', type=float, default=60., help="seconds per request")
+    parser.add_argument('--output-dir',
+                        help="by default, the task dirs of the documents in the workbench")
+    parser.add_argument('--status', dest='status_path', help="JSON Lines log of statuses of files")
+    parser.add_argument('--latency', type=float, default=0.05, help="of the stand-in PDFX")
+    parser.add_argument('--failure-rate', type=float, default=0., help="of the stand-in PDFX")
+    args = parser.parse_args(argv)
+    options = dict(
+        concurrency=args.concurrency,
+        retries=args.retries,
+        backoff=args.backoff,
+        timeout=args.timeout,
+        output_dir=args.output_dir,
+        status_path=args.status_path,
+    )
+    if args.url:
+        report = convert_batch(args.input_dir, url=args.url, **options)
+    else:
+        report = run_stand_in(args.input_dir, args.latency, args.failure_rate, **options)
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    main()
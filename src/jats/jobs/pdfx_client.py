@@ -2,7 +2,7 @@ import os
 import requests
 
 from jats import PdfxError
-from utils.oss import path
+from utils.os import path
 
 from .. import make_task_dir
 
@@ -12,8 +12,14 @@ TASK_NR = 1
 TASK_NAME = 'pdfx_xml'
 
 
-def send_to_pdfx(filepath):
-    data = {
+def send_to_pdfx(filepath, url=PDFX_SERVICE_URL, session=None, timeout=None):
+    """
+    Posts the PDF as the body of the request, which is what PDFX expects
+    of `Content-Type: application/pdf`. Pass a `requests.Session` to reuse
+    its connections. Returns `None` if the file can't be read or the service
+    can't be reached.
+    """
+    params = {
         'sent_splitter': 'punkt',
         'ref_doi': 'ref_doi',
     }
@@ -21,31 +27,39 @@ def send_to_pdfx(filepath):
 
     try:
         with open(filepath, 'rb') as pdf:
-            files = {'userfile': pdf}
-            resp = requests.post(
-                PDFX_SERVICE_URL,
-                data=data, files=files, headers=headers)
+            resp = (session or requests).post(
+                url,
+                params=params, data=pdf, headers=headers, timeout=timeout)
     except OSError:
         resp = None
     return resp
 
 
-def get_xml_from_pdfx(input_path):
+def get_xml_from_pdfx(input_path, output_dir=None, **options):
+    """
+    Converts the PDF and writes the XML to `output_dir` (by default, to the
+    task dir of the document). `options` are passed to `send_to_pdfx`.
+    """
     assert os.path.isfile(input_path)
 
-    resp = send_to_pdfx(input_path)
-    if not resp or resp.status_code != 200:
-        raise PdfxError("PDFX error:\n{}".format(resp.content))
+    resp = send_to_pdfx(input_path, **options)
+    if resp is None or resp.status_code != 200:
+        raise PdfxError("PDFX error:\n{}".format(
+            resp.content if resp is not None else 'no response'))
+    return save_xml(input_path, resp.content, output_dir)
 
+
+def save_xml(input_path, content, output_dir=None):
+    """Writes the XML of the PDF; returns the description of the document."""
     input_filename = input_path.rsplit(os.path.sep, 1)[-1] \
         if os.path.sep in input_path else input_path
     doc_name, _ = input_filename.rsplit('.', 1)
     xml_name = doc_name + ".xml"
-    output_dir = make_task_dir(doc_name, TASK_NR, TASK_NAME)
+    output_dir = output_dir or make_task_dir(doc_name, TASK_NR, TASK_NAME)
     output_path = path(output_dir, xml_name)
 
-    with open(output_path, 'w') as output:
-        output.write(resp.content)
+    with open(output_path, 'wb') as output:
+        output.write(content)
     assert os.path.isfile(output_path)
 
     return {
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in of the PDFX service, for tests & benchmarks of `pdfx_batch`: a posted PDF
+is answered, after `latency` seconds, with an XML document of its size & digest;
+a `failure_rate` fraction of requests fails with 503 instead.
+
+    python -m jats.jobs.pdfx_stand_in --port 8000 --latency 0.2 --failure-rate 0.05
+"""
+import argparse
+import hashlib
+import random
+import threading
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+
+_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<pdfx><job>{}</job><meta><size>{}</size></meta></pdfx>\n'
+)
+
+
+class StandInPdfx(ThreadingHTTPServer):
+    """
+    >>> import requests
+    >>> server = StandInPdfx(latency=0).start()
+    >>> headers = {'Content-Type': 'application/pdf'}
+    >>> response = requests.post(server.url, data=b'%PDF-1.4', headers=headers)
+    >>> response.status_code, b'<size>8</size>' in response.content
+    (200, True)
+    >>> requests.post(server.url, data=b'<html>').status_code
+    400
+    >>> server.shutdown(); server.server_close()
+    """
+    daemon_threads = True
+
+    def __init__(self,
+                 address: t.Tuple[str, int] = ('127.0.0.1', 0),
+                 latency: float = 0.05,
+                 failure_rate: float = 0.,
+                 seed: int = 0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self) -> 'StandInPdfx':
+        """Serves in a daemon thread; stop it with `shutdown`."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def fails(self) -> bool:
+        """Counts the request and draws whether it fails."""
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.failure_rate
+            self.failures += failed
+        return failed
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'failures': self.failures}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keeps connections alive, as clients reuse them
+    protocol_version = 'HTTP/1.1'
+    # headers & body of a response are written apart: without it the body waits for
+    # the delayed ACK of the headers (40ms per request on Linux)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        sleep(self.server.latency)
+        if self.server.fails():
+            self._respond(503, b'Service unavailable', 'text/plain')
+        elif not body.startswith(b'%PDF'):
+            self._respond(400, b'Not a PDF', 'text/plain')
+        else:
+            xml = _XML.format(hashlib.sha1(body).hexdigest(), len(body))
+            self._respond(200, xml.encode(), 'application/xml')
+
+    def _respond(self, status: int, content: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv: t.Sequence[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per request")
+    parser.add_argument('--failure-rate', type=float, default=0.)
+    args = parser.parse_args(argv)
+    server = StandInPdfx((args.host, args.port), args.latency, args.failure_rate)
+    print(f'Serving at {server.url}')
+    with server:
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
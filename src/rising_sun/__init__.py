@@ -1,9 +1,36 @@
 # -*- coding: utf-8 -*-
-from utils.db_repo import DbRepo
+from functools import lru_cache
 
 from . import config_repo
-from .base_model import DbModelBase, DbModelMeta
 
-
-db_repo = DbRepo(model=DbModelBase, metaclass=DbModelMeta)
 config = config_repo
+
+
+@lru_cache(maxsize=None)
+def get_db_repo():
+    """
+    The repo of DB models. Built on the first use (ie. `from rising_sun import db_repo`),
+    so importing the package does not import SQLAlchemy; the engine is created once
+    the repo is used, see `DbRepo.session`.
+    """
+    from utils.db_repo import DbRepo, HydratingQuery
+    from .db_model import DbModelBase, DbModelMeta
+    return DbRepo(
+        model=DbModelBase, metaclass=DbModelMeta, query_class=HydratingQuery, cache_size=1024
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_db_repo():
+    """
+    Asyncio counterpart of `db_repo`, serving the same models. Built on the first use,
+    as it needs SQLAlchemy>=1.4 and `aiosqlite`.
+    """
+    from utils.async_db_repo import AsyncDbRepo
+    return AsyncDbRepo(model=get_db_repo().Model)
+
+
+def __getattr__(name):
+    if name == 'db_repo':
+        return get_db_repo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import asyncio
+import sys
+
 from rising_sun import handlers
 
 
 if __name__ == '__main__':
-    handlers.create_example_setup()
-    print(handlers.handle_example_request({}))
+    if sys.argv[1:2] == ['serve']:
+        from rising_sun import server
+        server.create_games('context', 1)
+        asyncio.run(server.serve())
+    elif sys.argv[1:2] == ['startup']:
+        from rising_sun import startup
+        startup.main()
+    else:
+        handlers.create_example_setup()
+        print(handlers.handle_example_request({}))
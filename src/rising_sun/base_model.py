@@ -1,19 +1,36 @@
 # -*- coding: utf-8 -*-
 import typing as t
+from types import MemberDescriptorType
 
 # TODO #12. from pyDatalog import pyDatalog, pyParser
-from sqlalchemy import Column, String
-from sqlalchemy.ext.declarative.base import _add_attribute, _as_declarative
-
-from rising_sun import config_repo
 from utils import validation as v
 from utils.itertools import recursive_get
 from utils.serialization import yaml, CustomLoader
 
+_missing = object()
+
 
 class ModelMeta(yaml.YAMLObjectMetaclass):
+    """
+    A class declaring `__compact__ = True` gets `__slots__` of the fields of its `__schema__`
+    (and `context`) instead of an instance dict; its bases have to declare `__slots__` too.
+    Slots shadowing class attributes of the bases (ie. `context`) start with their values.
+    """
     # TODO: #12. inherit pyDatalog.metaMixin
-    pass
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        if namespace.get('__compact__') and '__slots__' not in namespace:
+            schema = namespace.get('__schema__')
+            assert schema is not None, f"Compact model {name} needs a __schema__"
+            assert getattr(schema.typ, 'unknown', 'ignore') != 'preserve', \
+                f"Compact model {name} can't preserve unknown fields"
+            fields = tuple(node.name for node in schema.children) + ('context',)
+            has_weakref = any(hasattr(base, '__weakref__') for base in bases)
+            weakref = () if has_weakref else ('__weakref__',)
+            namespace['__slots__'] = fields + weakref
+            namespace['__fields__'] = fields
+            namespace['__slot_defaults__'] = _class_defaults(bases, fields)
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
     #
     # def __init__(cls, *args, **kwargs):
     #     super().__init__(*args, **kwargs)
@@ -43,13 +60,46 @@ class ModelMeta(yaml.YAMLObjectMetaclass):
     #     raise AttributeError
 
 
-class BaseModel(yaml.YAMLObject, metaclass=ModelMeta):
+def _class_defaults(bases: t.Tuple[type, ...], names: t.Iterable[str]) -> t.Dict[str, t.Any]:
+    defaults = {}
+    for name in names:
+        for base in bases:
+            value = getattr(base, name, _missing)
+            if value is not _missing and not isinstance(value, MemberDescriptorType):
+                defaults[name] = value
+                break
+    return defaults
+
+
+class SlottedModel(metaclass=ModelMeta):
+    """
+    The base of models that may be compact (see `ModelMeta`), ie. of config models. It mirrors
+    `yaml.YAMLObject` rather than subclassing it, as the base of that one has no `__slots__`:
+    instances of compact subclasses would have a dict anyway.
+    """
+    __slots__ = ()
 
     yaml_constructor = CustomLoader
+    yaml_representer = yaml.Representer
+    yaml_tag = None
+    yaml_flow_style = None
     __schema__: v.Schema = None
     __pks__: tuple = None
+    # names of slots of compact models & initial values of some, see `ModelMeta`
+    __fields__: t.Optional[t.Tuple[str, ...]] = None
+    __slot_defaults__: t.Mapping[str, t.Any] = {}
     context: str = None
 
+    @classmethod
+    def from_yaml(cls, constructor, node):
+        return constructor.construct_yaml_object(node, cls)
+
+    @classmethod
+    def to_yaml(cls, representer, data):
+        return representer.represent_yaml_object(
+            cls.yaml_tag, data, cls, flow_style=cls.yaml_flow_style
+        )
+
     @classmethod
     def get_pk(cls, kwargs):
         if not cls.__pks__:
@@ -70,9 +120,34 @@ class BaseModel(yaml.YAMLObject, metaclass=ModelMeta):
 
     def __init__(self, **kwargs):
         validated_kwargs = self._validate(kwargs)
-        self.__dict__.update(validated_kwargs)
+        self._set_attributes(validated_kwargs)
         super().__init__()
 
+    def _get_attributes(self) -> t.Dict[str, t.Any]:
+        """
+        The instance dict, or a dict of the slots of a compact model, skipping the unset ones
+        & the ones left with their class defaults.
+        """
+        if self.__fields__ is None:
+            return self.__dict__
+        attributes = {}
+        defaults = self.__slot_defaults__
+        for name in self.__fields__:
+            value = getattr(self, name, _missing)
+            if value is not _missing and (name not in defaults or value is not defaults[name]):
+                attributes[name] = value
+        return attributes
+
+    def _set_attributes(self, attributes: t.Mapping[str, t.Any]) -> None:
+        if self.__fields__ is None:
+            self.__dict__.update(attributes)
+            return
+        for name, value in self.__slot_defaults__.items():
+            if not hasattr(self, name):
+                object.__setattr__(self, name, value)
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
     def __getstate__(self):
         """
         Serialization ignores attributes with names starting with `_`.
@@ -81,11 +156,11 @@ class BaseModel(yaml.YAMLObject, metaclass=ModelMeta):
         >>> yaml.dump(a)
         '!!python/object:rising_sun.base_model.BaseModel {foo: bar}\\n'
         """
-        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+        return {k: v for k, v in self._get_attributes().items() if not k.startswith('_')}
 
     def __setstate__(self, state: t.Mapping):
         validated_state = self._validate(state)
-        self.__dict__.update(validated_state)
+        self._set_attributes(validated_state)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({", ".join(map(str, self.pk))})'
@@ -94,25 +169,10 @@ class BaseModel(yaml.YAMLObject, metaclass=ModelMeta):
         return yaml.dump(self)
 
 
-class DbModelMeta(ModelMeta):
-    # TODO #12. inherit pyDatalog.sqlMetaMixin
-
-    def __init__(cls, classname, bases, dict_):
-        # DeclarativeMeta
-        if '_decl_class_registry' not in cls.__dict__:
-            _as_declarative(cls, classname, cls.__dict__)
-        type.__init__(cls, classname, bases, dict_)
-
-        cls.__schema__ = v.SQLAlchemySchemaNode(cls) if hasattr(cls, '__table__') else None
-
-    def __setattr__(cls, key, value):
-        _add_attribute(cls, key, value)
-
-
-class DbModelBase(BaseModel):
-    context = Column(String(20), primary_key=True)
+class BaseModel(SlottedModel, yaml.YAMLObject):
+    """A model keeping its attributes in the instance dict, ie. a DB model."""
 
 
-def get_model(name: str) -> BaseModel:
+def get_model(name: str) -> t.Type[SlottedModel]:
     from .models import __models__
     return __models__.get(name)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Batch simulator of war-phase conflicts: N conflicts of K clans are resolved at once with array
+operations, one step of the war phase at a time for all of them.
+
+Advantages are resolved in the order of the rules, each won by the highest bid (ties are won
+by the higher honor) and all bids are paid:
+
+* `seppuku`: all the figures of the winner die, for a VP each and a point of honor,
+* `take_hostage`: the winner takes a figure of the strongest opponent, for a VP,
+* `hire_ronin`: ronins of the winner fight along with its figures,
+* then the strongest clan (ties by honor) wins the battle & the reward of the region, figures
+  of all the other clans die and the coins bid by the winner are split among them,
+* `imperial_poets`: the winner gets a VP per figure lost (died or taken) in the conflict.
+
+Other advantages of the config (ie. `undertake_battle`) are not simulated.
+"""
+import typing as t
+
+import numpy as np
+
+from rising_sun import config_repo
+from rising_sun.models.gains import GainType
+
+ADVANTAGES = ('seppuku', 'take_hostage', 'hire_ronin', 'imperial_poets')
+SEPPUKU, TAKE_HOSTAGE, HIRE_RONIN, IMPERIAL_POETS = range(len(ADVANTAGES))
+GAINS = (GainType.VICTORY_POINTS, GainType.COINS, GainType.RONINS, GainType.HONOR)
+NONE = -1
+
+
+class Conflicts(t.NamedTuple):
+    """Inputs of N conflicts of K clans; a clan without figures does not take part."""
+    regions: np.ndarray  # (N,) indexes of rows of the rewards
+    figures: np.ndarray  # (N, K)
+    ronins: np.ndarray  # (N, K)
+    honor: np.ndarray  # (N, K) distinct per conflict
+    bids: np.ndarray  # (N, K, len(ADVANTAGES))
+
+    @classmethod
+    def sample(cls,
+               size: int,
+               clans: int = 3,
+               regions: int = 1,
+               max_figures: int = 5,
+               max_ronins: int = 3,
+               max_coins: int = 6,
+               seed: int = 0) -> 'Conflicts':
+        """Random conflicts: bids of a clan are a random split of up to `max_coins`."""
+        rng = np.random.default_rng(seed)
+        coins = rng.integers(0, max_coins + 1, size=(size, clans))
+        split = rng.dirichlet(np.ones(len(ADVANTAGES)), size=(size, clans))
+        return cls(
+            regions=rng.integers(0, regions, size=size),
+            figures=rng.integers(0, max_figures + 1, size=(size, clans)),
+            ronins=rng.integers(0, max_ronins + 1, size=(size, clans)),
+            honor=np.argsort(rng.random((size, clans)), axis=1),
+            bids=np.floor(split * coins[..., None]).astype(int),
+        )
+
+
+class Outcomes(t.NamedTuple):
+    """Deltas of N conflicts per clan (N, K); `winners` of the battles (-1 if nobody fought)."""
+    winners: np.ndarray
+    vps: np.ndarray
+    honor: np.ndarray
+    coins: np.ndarray
+    ronins: np.ndarray
+    losses: np.ndarray
+
+    def distribution(self) -> t.Dict[str, t.Any]:
+        """Per clan: the rate of won battles, means of the deltas and the histogram of VPs."""
+        clans = self.vps.shape[1]
+        wins = np.bincount(self.winners[self.winners >= 0], minlength=clans)
+        return {
+            'wins': wins / len(self.winners),
+            'vps': self.vps.mean(axis=0),
+            'honor': self.honor.mean(axis=0),
+            'coins': self.coins.mean(axis=0),
+            'ronins': self.ronins.mean(axis=0),
+            'losses': self.losses.mean(axis=0),
+            'vps_histogram': [np.bincount(self.vps[:, k].clip(0)) for k in range(clans)],
+        }
+
+
+def region_rewards(context: t.Optional[str] = None) -> t.Tuple[t.Tuple[str, ...], np.ndarray]:
+    """Names of the regions of the map of the context & their rewards as rows of `GAINS`."""
+    board_map, = config_repo.lookup('Map', 'context', context)
+    regions = board_map.regions
+    rewards = np.array(
+        [[getattr(region.reward, gain.value, None) or 0 for gain in GAINS] for region in regions],
+        dtype=int,
+    ).reshape(len(regions), len(GAINS))
+    return tuple(region.name for region in regions), rewards
+
+
+def simulate(conflicts: Conflicts, rewards: np.ndarray) -> Outcomes:
+    """
+    >>> conflicts = Conflicts(
+    ...     regions=np.array([0, 0]),
+    ...     figures=np.array([[3, 2], [3, 2]]),
+    ...     ronins=np.array([[0, 2], [0, 2]]),
+    ...     honor=np.array([[1, 0], [1, 0]]),
+    ...     bids=np.array([[[0, 0, 0, 1], [0, 0, 0, 0]], [[0, 0, 0, 0], [0, 1, 2, 0]]]),
+    ... )
+    >>> outcomes = simulate(conflicts, rewards=np.array([[3, 0, 0, 0]]))
+    >>> outcomes.winners.tolist(), outcomes.vps.tolist(), outcomes.losses.tolist()
+    ([0, 1], [[5, 0], [0, 4]], [[0, 2], [3, 0]])
+    >>> outcomes.coins.tolist(), outcomes.ronins.tolist()
+    ([[-1, 1], [3, -3]], [[0, 0], [0, -2]])
+    """
+    bids = conflicts.bids
+    size, clans = conflicts.figures.shape
+    rows = np.arange(size)
+    figures = conflicts.figures.copy()
+    fighting = figures > 0
+    vps = np.zeros((size, clans), dtype=int)
+    honor = np.zeros((size, clans), dtype=int)
+    ronins = np.zeros((size, clans), dtype=int)
+    losses = np.zeros((size, clans), dtype=int)
+    # every bid is paid; the coins of the winner of the battle go to the other clans later
+    coins = -bids.sum(axis=2)
+    # an order of clans: by bid first, by honor then (honors of a conflict are distinct)
+    tie_break = conflicts.honor - conflicts.honor.min() + 1
+    scale = tie_break.max() + 1
+
+    def winners_of(scores: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+        ranked = np.where(eligible, scores * scale + tie_break, NONE)
+        winners = ranked.argmax(axis=1)
+        return np.where(ranked[rows, winners] > 0, winners, NONE)
+
+    def winners_of_advantage(advantage: int) -> t.Tuple[np.ndarray, np.ndarray]:
+        winners = winners_of(bids[:, :, advantage], fighting & (bids[:, :, advantage] > 0))
+        return winners, rows[winners >= 0]
+
+    # seppuku
+    winners, won = winners_of_advantage(SEPPUKU)
+    seppuku = figures[won, winners[won]]
+    vps[won, winners[won]] += seppuku
+    honor[won, winners[won]] += 1
+    losses[won, winners[won]] += seppuku
+    figures[won, winners[won]] = 0
+    # hostage of the strongest opponent
+    winners, won = winners_of_advantage(TAKE_HOSTAGE)
+    opponents = figures[won].copy()
+    opponents[np.arange(len(won)), winners[won]] = 0
+    hostages = opponents.argmax(axis=1)
+    taken = opponents[np.arange(len(won)), hostages] > 0
+    won, hostages = won[taken], hostages[taken]
+    figures[won, hostages] -= 1
+    losses[won, hostages] += 1
+    vps[won, winners[won]] += 1
+    # ronins
+    strength = figures.copy()
+    winners, won = winners_of_advantage(HIRE_RONIN)
+    strength[won, winners[won]] += conflicts.ronins[won, winners[won]]
+    ronins[won, winners[won]] -= conflicts.ronins[won, winners[won]]
+    # the battle
+    battle_winners = winners_of(strength, fighting & (strength > 0))
+    won = rows[battle_winners >= 0]
+    losers = fighting.copy()
+    losers[won, battle_winners[won]] = False
+    losers[battle_winners < 0] = False
+    killed = np.where(losers, figures, 0)
+    losses += killed
+    reward = rewards[conflicts.regions[won]]
+    vps[won, battle_winners[won]] += reward[:, 0]
+    coins[won, battle_winners[won]] += reward[:, 1]
+    ronins[won, battle_winners[won]] += reward[:, 2]
+    honor[won, battle_winners[won]] += reward[:, 3]
+    losers_count = losers.sum(axis=1)
+    paid = bids[won, battle_winners[won]].sum(axis=1)
+    share = np.zeros(size, dtype=int)
+    share[won] = paid // np.maximum(losers_count[won], 1)
+    coins += np.where(losers, share[:, None], 0)
+    # imperial poets
+    winners, won = winners_of_advantage(IMPERIAL_POETS)
+    vps[won, winners[won]] += losses[won].sum(axis=1)
+    return Outcomes(battle_winners, vps, honor, coins, ronins, losses)
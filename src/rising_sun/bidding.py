@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Bid allocation of the war phase: how a clan splits its coins among the advantages of all
+the contested regions, valued with the battle simulator (`rising_sun.battles`).
+
+A best response to known bids of the opponents is exact: in a region, only the cheapest
+winning bid for each set of advantages is worth considering, so a region is valued
+by `2 ** len(ADVANTAGES)` simulated conflicts per spendable amount of coins, and the coins
+are split among regions by a knapsack-like dynamic programming. An approximate
+equilibrium follows best responses of the clans within a time budget.
+"""
+import typing as t
+from functools import lru_cache
+from itertools import product
+from time import perf_counter
+
+import numpy as np
+
+from rising_sun import config_repo
+from rising_sun.battles import ADVANTAGES, Conflicts, simulate
+from rising_sun.models.war_phase import AdvantageBid
+
+_SUBSETS = np.array(list(product((0, 1), repeat=len(ADVANTAGES))), dtype=bool)
+_TOLERANCE = 1e-9
+
+
+class Utility(t.NamedTuple):
+    """Weights of the outcome of a conflict for a clan."""
+    vps: float = 1.
+    coins: float = 0.5
+    honor: float = 0.5
+    ronins: float = 0.25
+    losses: float = 0.25
+
+    def __call__(self, outcomes, clan: int) -> np.ndarray:
+        return (
+            self.vps * outcomes.vps[:, clan] +
+            self.coins * outcomes.coins[:, clan] +
+            self.honor * outcomes.honor[:, clan] +
+            self.ronins * outcomes.ronins[:, clan] -
+            self.losses * outcomes.losses[:, clan]
+        )
+
+
+class Contests(t.NamedTuple):
+    """R contested regions of K clans."""
+    regions: np.ndarray  # (R,) indexes of rows of the rewards
+    figures: np.ndarray  # (R, K)
+    ronins: np.ndarray  # (R, K)
+    honor: np.ndarray  # (K,) distinct
+
+
+class BidSolution(t.NamedTuple):
+    bids: np.ndarray  # (R, K, len(ADVANTAGES))
+    values: np.ndarray  # (K,) utility of the bids for each clan
+    regret: float  # the most a clan would gain by a best response (`inf` if not known)
+    iterations: int
+    converged: bool
+    elapsed: float
+
+
+class BidSolver:
+    """
+    Values of regions are memoized per (region, clan, bids of the opponents), so
+    iterated best responses only simulate regions where the opponents changed their bids.
+
+    >>> contests = Contests(
+    ...     regions=np.array([0, 1]),
+    ...     figures=np.array([[2, 2], [1, 3]]),
+    ...     ronins=np.zeros((2, 2), dtype=int),
+    ...     honor=np.array([0, 1]),
+    ... )
+    >>> solver = BidSolver(contests, rewards=np.array([[3, 0, 0, 0], [1, 0, 0, 0]]), coins=[2, 2])
+    >>> bids, value = solver.best_response(0, np.zeros((2, 2, 4), dtype=int))
+    >>> bids[:, 0].tolist(), value
+    ([[0, 1, 0, 1], [0, 0, 0, 0]], 4.75)
+    """
+
+    def __init__(self,
+                 contests: Contests,
+                 rewards: np.ndarray,
+                 coins: t.Sequence[int],
+                 utility: Utility = Utility(),
+                 cache_size: int = 4096):
+        self.contests = contests
+        self.rewards = rewards
+        self.coins = np.asarray(coins)
+        self.utility = utility
+        self.region_values = lru_cache(maxsize=cache_size)(self._region_values)
+
+    @property
+    def clans(self) -> int:
+        return len(self.coins)
+
+    def best_response(self, clan: int, bids: np.ndarray) -> t.Tuple[np.ndarray, float]:
+        """Best bids of the clan (all regions) to `bids` of the opponents, and their utility."""
+        coins = int(self.coins[clan])
+        regions = len(self.contests.regions)
+        # keys of the cache are the bytes of int64 bids, whatever the dtype of `bids`
+        opponents = bids.astype(np.int64)
+        opponents[:, clan] = 0
+        tables = [
+            self.region_values(region, clan, opponents[region].tobytes(), coins)
+            for region in range(regions)
+        ]
+        # best[i][c]: the best utility of regions from i on, with c coins;
+        # choice[i][c]: coins spent in i
+        best = np.zeros((regions + 1, coins + 1))
+        choice = np.zeros((regions, coins + 1), dtype=int)
+        for region in reversed(range(regions)):
+            values = tables[region][0]
+            for budget in range(coins + 1):
+                totals = values[:budget + 1] + best[region + 1, budget::-1]
+                choice[region, budget] = spent = int(totals.argmax())
+                best[region, budget] = totals[spent]
+        response = bids.copy()
+        budget = coins
+        for region in range(regions):
+            spent = choice[region, budget]
+            response[region, clan] = tables[region][1][spent]
+            budget -= spent
+        return response, float(best[0, coins])
+
+    def values(self, bids: np.ndarray) -> np.ndarray:
+        """Utilities (K,) of the bids (R, K, len(ADVANTAGES)) for all the clans."""
+        contests = self.contests
+        regions = len(contests.regions)
+        conflicts = Conflicts(
+            regions=contests.regions,
+            figures=contests.figures,
+            ronins=contests.ronins,
+            honor=np.repeat(contests.honor[None], regions, axis=0),
+            bids=bids,
+        )
+        outcomes = simulate(conflicts, self.rewards)
+        return np.array([self.utility(outcomes, clan).sum() for clan in range(self.clans)])
+
+    def equilibrium(self,
+                    bids: t.Optional[np.ndarray] = None,
+                    seconds: float = 0.1,
+                    max_iterations: int = 100) -> BidSolution:
+        """
+        Best-response dynamics: the clan gaining the most by a best response to the others
+        switches to it, until no clan gains (an exact equilibrium of the model), the bids cycle,
+        the time budget is spent or `max_iterations` are done. Auctions often have no pure
+        equilibrium, so the bids of the smallest regret seen are returned. The budget is checked
+        before each best response; the initial bids are returned with an infinite regret if
+        it does not suffice for a single round of them.
+        """
+        started = perf_counter()
+        deadline = started + seconds
+        regions, clans = self.contests.figures.shape
+        if bids is None:
+            bids = np.zeros((regions, clans, len(ADVANTAGES)), dtype=int)
+        else:
+            bids = bids.copy()
+        best = BidSolution(bids, self.values(bids), np.inf, 0, False, 0.)
+        seen = set()
+        iterations = 0
+        while iterations < max_iterations and bids.tobytes() not in seen:
+            seen.add(bids.tobytes())
+            responses = []
+            for clan in range(clans):
+                if perf_counter() >= deadline:
+                    break
+                responses.append(self.best_response(clan, bids))
+            if len(responses) < clans:
+                break
+            iterations += 1
+            values = self.values(bids)
+            regrets = np.array([value for _, value in responses]) - values
+            if regrets.max() < best.regret:
+                best = BidSolution(bids, values, float(regrets.max()), iterations, False, 0.)
+            if regrets.max() <= _TOLERANCE:
+                break
+            bids = responses[int(regrets.argmax())][0]
+        return best._replace(
+            iterations=iterations,
+            converged=best.regret <= _TOLERANCE,
+            elapsed=perf_counter() - started,
+        )
+
+    def _region_values(self,
+                       region: int,
+                       clan: int,
+                       bids: bytes,
+                       coins: int) -> t.Tuple[np.ndarray, np.ndarray]:
+        """
+        The best utility of the region for the clan spending up to c coins (c = 0..coins),
+        and the bids achieving it.
+        """
+        contests = self.contests
+        clans = len(self.coins)
+        opponents = np.frombuffer(bids, dtype=np.int64).reshape(clans, len(ADVANTAGES))
+        fighting = contests.figures[region] > 0
+        # the cheapest winning bid of each advantage: ties are won by the higher honor
+        rivals = fighting.copy()
+        rivals[clan] = False
+        highest = np.where(rivals[:, None], opponents, 0).max(axis=0)
+        more_honor = contests.honor[:, None] > contests.honor[clan]
+        loses_tie = (rivals[:, None] & (opponents == highest) & more_honor).any(axis=0)
+        cheapest = np.maximum(highest + loses_tie, 1)
+        candidates = _SUBSETS * cheapest
+        if not fighting[clan]:
+            candidates = candidates[:1]
+        costs = candidates.sum(axis=1)
+        count = len(candidates)
+        conflicts = Conflicts(
+            regions=np.full(count, contests.regions[region]),
+            figures=np.repeat(contests.figures[region][None], count, axis=0),
+            ronins=np.repeat(contests.ronins[region][None], count, axis=0),
+            honor=np.repeat(contests.honor[None], count, axis=0),
+            bids=np.repeat(opponents[None], count, axis=0),
+        )
+        conflicts.bids[:, clan] = candidates
+        utilities = self.utility(simulate(conflicts, self.rewards), clan)
+        values = np.full(coins + 1, -np.inf)
+        chosen = np.zeros((coins + 1, len(ADVANTAGES)), dtype=int)
+        for i in np.argsort(costs, kind='stable'):
+            if costs[i] <= coins and utilities[i] > values[costs[i]]:
+                values[costs[i]], chosen[costs[i]] = utilities[i], candidates[i]
+        # spending up to c coins: the best of the cheaper options
+        for c in range(1, coins + 1):
+            if values[c - 1] >= values[c]:
+                values[c], chosen[c] = values[c - 1], chosen[c - 1]
+        return values, chosen
+
+
+def advantage_bids(context: t.Optional[str],
+                   clans: t.Sequence[str],
+                   bids: np.ndarray) -> t.List[AdvantageBid]:
+    """
+    Rows of the bids (K, len(ADVANTAGES)) of a single region, as `AdvantageBid` has
+    no region; advantages of the config are matched by their procedures.
+    """
+    advantages = config_repo.lookup('Advantage', 'context', context)
+    names = {advantage.procedure: advantage.name for advantage in advantages}
+    return [
+        AdvantageBid(
+            context=context, clan_name=clan, advantage_name=names[procedure], coins=int(coins)
+        )
+        for clan, clan_bids in zip(clans, bids)
+        for procedure, coins in zip(ADVANTAGES, clan_bids)
+        if coins
+    ]
@@ -1,25 +1,180 @@
 # -*- coding: utf-8 -*-
+import gc
 import typing as t
 from collections import defaultdict
-from functools import lru_cache
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sys import getsizeof
 from weakref import WeakValueDictionary
 
+from frozendict import frozendict
+
+from utils.itertools import recursive_get
 from utils.os import REPO_PATH
 from utils.serialization import load_from_filename
 
-from .base_model import BaseModel
+from .base_model import SlottedModel
+
+
+class ContextRegister:
+    """
+    Partition of the register: all the models of a single context (ie. a hosted game).
+    The partition owns what was loaded or cloned into it: the models live until
+    the context is unloaded.
+    """
+    __slots__ = ('name', 'instances', 'owned', 'frozen')
+
+    def __init__(self, name: t.Optional[str]):
+        self.name = name
+        # (class name, pk) -> instance
+        self.instances = WeakValueDictionary()
+        self.owned = []
+        self.frozen = False
 
+    def __len__(self):
+        return len(self.instances)
 
+    def memory_usage(self) -> int:
+        """Approximate size (in bytes) of the models, their `__dict__`s and containers in them."""
+        total = 0
+        for instance in self.instances.values():
+            attributes = instance._get_attributes()
+            total += getsizeof(instance)
+            if instance.__fields__ is None:
+                total += getsizeof(attributes)
+            total += sum(
+                getsizeof(value) for value in attributes.values()
+                if isinstance(value, (list, tuple, dict))
+            )
+        return total
+
+
+# class name -> pk -> instance; pks of models include their context, so it's a lookup
+# across all the contexts
 _register = defaultdict(WeakValueDictionary)
-_base_class_name = 'BaseModel'
+# class name -> index name -> indexed value -> pk -> instance
+_indexes = defaultdict(lambda: defaultdict(lambda: defaultdict(WeakValueDictionary)))
+_contexts: t.Dict[t.Optional[str], ContextRegister] = {}
+_current_context: ContextVar = ContextVar('config_context', default=None)
+_base_class_name = 'SlottedModel'
 CONFIG_DIR = REPO_PATH / 'rising_sun' / 'config'
 
 
-def load_config(filename):
-    return load_from_filename(CONFIG_DIR / filename)
+@contextmanager
+def using_context(context: t.Optional[str]):
+    """Models constructed within the block, without explicit `context`, get the given one."""
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+def load_config(filename, context: str = None):
+    """
+    Loads the config file into the context, which owns the loaded models from now on.
+    Only the partition of the context is touched, in O(size of the config).
+    """
+    with using_context(context):
+        document = load_from_filename(CONFIG_DIR / filename)
+    get_context(context).owned.append(document)
+    return document
+
+
+def unload_context(context: t.Optional[str]) -> None:
+    """Removes all the models of the context from the register, in O(size of the context)."""
+    register = _contexts.pop(context, None)
+    if register is None:
+        return
+    for instance in list(register.instances.values()):
+        remove(instance)
+
+
+def clone_context(source: t.Optional[str], target: str) -> ContextRegister:
+    """
+    Copies all the models of the `source` context into the `target` one, without reloading
+    nor revalidating them. References between models of the context are remapped to
+    the copies; other objects (ie. `Gain`s) are shared.
+    """
+    assert not len(get_context(target)), f"Context {target} is not empty"
+    originals = list(get_context(source).instances.values())
+    copies = {}
+    for original in originals:
+        copy = object.__new__(type(original))
+        copy._set_attributes(dict(original._get_attributes(), context=target))
+        copies[id(original)] = copy
+
+    def remap(value):
+        if isinstance(value, Model):
+            return copies.get(id(value), value)
+        if isinstance(value, (list, tuple)):
+            return type(value)(remap(item) for item in value)
+        if isinstance(value, dict):
+            return {key: remap(item) for key, item in value.items()}
+        return value
+
+    for copy in copies.values():
+        copy._set_attributes({key: remap(value) for key, value in copy._get_attributes().items()})
+    for copy in copies.values():
+        add(copy)
+    register = get_context(target)
+    register.owned.extend(copies.values())
+    return register
+
+
+def freeze_context(context: t.Optional[str]) -> ContextRegister:
+    """
+    Makes all the models of the context immutable: their containers become tuples
+    & frozendicts and their classes are swapped for frozen subclasses (of the same name),
+    which refuse to set or delete attributes. The models stay registered as they were.
+    """
+    register = get_context(context)
+    for instance in list(register.instances.values()):
+        _freeze(instance)
+    register.frozen = True
+    return register
+
+
+def prepare_fork(*contexts: t.Optional[str]) -> None:
+    """
+    Freezes the contexts and moves all the objects of the process to the permanent generation
+    of the garbage collector. Call it in the parent process once the configs are loaded:
+    workers forked afterwards inherit the configs at no cost and, as the GC of the workers
+    does not touch inherited objects anymore, share their memory pages with the parent
+    (until their reference counts get modified).
+    """
+    for context in contexts:
+        freeze_context(context)
+    gc.collect()
+    gc.freeze()
+
+
+def get_context(context: t.Optional[str]) -> ContextRegister:
+    register = _contexts.get(context)
+    if register is None:
+        register = _contexts[context] = ContextRegister(context)
+    return register
+
+
+def contexts() -> t.List[t.Optional[str]]:
+    return list(_contexts)
+
+
+def memory_usage() -> t.Dict[t.Optional[str], int]:
+    return {name: register.memory_usage() for name, register in _contexts.items()}
+
 
+IndexKey = t.Union[str, t.Callable[['Model'], t.Hashable]]
 
-class Model(BaseModel):
+
+class Model(SlottedModel):
+    """
+    `__indexes__` declares secondary indexes of the model: a mapping of index names to either
+    a (dotted) attribute path or a function of the instance, returning the indexed value.
+    Indexes are maintained by `add` & `remove`, and queried with `lookup`.
+    """
+    __slots__ = ()
+    __indexes__: t.Mapping[str, IndexKey] = {'context': 'context'}
 
     def __new__(cls, **kwargs):
         """
@@ -27,21 +182,31 @@ class Model(BaseModel):
         property. The value of the property are values of the attribute described with `__pks__`
         iff it is defined, or objects ID otherwise.
         """
-        instance: 'Model' = get(cls.__name__, cls.get_pk(kwargs))
+        instance: 'Model' = get(cls.__name__, cls.get_pk(_with_context(kwargs)))
         if instance:
             return instance
         return super().__new__(cls)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._set_context(kwargs)
         add(self)
 
     def __setstate__(self, state: t.Mapping):
         super().__setstate__(state)
+        self._set_context(state)
         add(self)
 
+    def _set_context(self, kwargs: t.Mapping):
+        """Context is not a part of schemas; it is kept even if validation drops it."""
+        context = _with_context(kwargs).get('context')
+        if context is not None:
+            self.context = context
+
 
 def add(instance: Model):
+    keys = _index_keys(instance)
+    get_context(instance.context).instances[instance.__class__.__name__, instance.pk] = instance
     for klass in instance.__class__.mro():
         if klass.__name__ == _base_class_name:
             return
@@ -53,23 +218,127 @@ def add(instance: Model):
             f"{_register[klass.__name__][instance.pk]} with {instance} in the class register."
         )
         _register[klass.__name__][instance.pk] = instance
+        indexes = _indexes[klass.__name__]
+        for index_name, key in keys:
+            indexes[index_name][key][instance.pk] = instance
 
 
 def remove(instance: Model):
+    keys = _index_keys(instance)
+    register = _contexts.get(instance.context)
+    if register is not None:
+        register.instances.pop((instance.__class__.__name__, instance.pk), None)
     for klass in instance.__class__.mro():
-        _register[klass.__name__].pop(instance.pk)
-        if klass == _base_class_name:
+        if klass.__name__ == _base_class_name:
             return
+        _register[klass.__name__].pop(instance.pk, None)
+        indexes = _indexes[klass.__name__]
+        for index_name, key in keys:
+            indexes[index_name][key].pop(instance.pk, None)
 
 
 def get(klass_name: str, pk: t.Tuple):
     return _register[klass_name].get(pk) if pk else None
 
 
-@lru_cache(maxsize=64)
+def get_many(klass_name: str, pks: t.Iterable[t.Tuple]) -> t.Dict[t.Tuple, Model]:
+    """Instances of the class by their pks, each distinct pk looked up once."""
+    register = _register[klass_name]
+    return {pk: register.get(pk) for pk in set(pks) if pk}
+
+
+def lookup(klass_name: str, index_name: str, key: t.Hashable) -> t.List[Model]:
+    """
+    All instances of the class with the value of the index equal to `key`, ie.
+    `lookup('ClanType', 'context', context)`.
+    """
+    return list(_indexes[klass_name][index_name][key].values())
+
+
 def filter(klass_name: str, condition: t.Callable[[t.Tuple], bool]):
+    """Linear scan over the whole class register; use `lookup` with an index, if possible."""
     return [model for pk, model in _register[klass_name].items() if condition(pk)]
 
 
 def clear():
     _register.clear()
+    _indexes.clear()
+    _contexts.clear()
+
+
+class FrozenModel:
+    """
+    Mixin of frozen model classes, see `freeze_context`. It follows the model class in bases
+    of a frozen class & declares empty `__slots__`, so the layout of the frozen class
+    is the layout of the model class.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{self!r} is frozen, can't set attribute {key}")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{self!r} is frozen, can't delete attribute {key}")
+
+    def __reduce__(self):
+        # frozen classes can't be found by their names, which are the names of model classes
+        return _load_frozen, (type(self).__bases__[0], self.__getstate__())
+
+
+_frozen_classes: t.Dict[type, type] = {}
+
+
+def _freeze(instance: Model) -> None:
+    if isinstance(instance, FrozenModel):
+        return
+    attributes = instance._get_attributes()
+    instance._set_attributes({key: _freeze_value(value) for key, value in attributes.items()})
+    klass = type(instance)
+    frozen_class = _frozen_classes.get(klass)
+    if frozen_class is None:
+        # the same name keeps class-name-based register, reprs & yaml dumps untouched
+        # compact models have no instance dict, nor may their frozen classes
+        namespace = {'__module__': klass.__module__}
+        if klass.__fields__ is not None:
+            namespace['__slots__'] = ()
+        frozen_class = type(klass)(klass.__name__, (klass, FrozenModel), namespace)
+        _frozen_classes[klass] = frozen_class
+    instance.__class__ = frozen_class
+
+
+def _load_frozen(klass: t.Type[Model], state: t.Mapping) -> Model:
+    """
+    Unpickles the model of the class & freezes it; the instance registered with its pk
+    (ie. by an earlier unpickling or by loading the context in the process) is kept instead.
+    """
+    registered = get(klass.__name__, klass.get_pk(state))
+    if registered is not None:
+        return registered
+    instance = klass.__new__(klass)
+    instance.__setstate__(state)
+    _freeze(instance)
+    return instance
+
+
+def _freeze_value(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    if isinstance(value, dict):
+        return frozendict((key, _freeze_value(item)) for key, item in value.items())
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _with_context(kwargs: t.Mapping) -> t.Mapping:
+    context = _current_context.get()
+    if context is None or 'context' in kwargs:
+        return kwargs
+    return dict(kwargs, context=context)
+
+
+def _index_keys(instance: Model) -> t.List[t.Tuple[str, t.Hashable]]:
+    return [
+        (index_name, key(instance) if callable(key) else recursive_get(instance, key))
+        for index_name, key in getattr(instance, '__indexes__', {}).items()
+    ]
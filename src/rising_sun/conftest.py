@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import pytest
 
-from rising_sun import config_repo, db_repo
+from rising_sun import config_repo, db_repo, models  # noqa: models have to be declared for tables & YAML tags
 
 
 @pytest.fixture(scope="session", autouse=True)
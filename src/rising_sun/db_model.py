@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Base of DB models of `rising_sun.db_repo`: declarative SQLAlchemy models, which are
+`BaseModel`s too. Imported along with the repo, on the first use of `rising_sun.db_repo`.
+"""
+import typing as t
+from functools import update_wrapper
+
+from sqlalchemy import Column, String
+
+try:  # SQLAlchemy>=1.4: classes are mapped by the registry of the declarative base
+    from sqlalchemy.orm.decl_base import _add_attribute, _as_declarative
+    _REGISTRY = True
+except ImportError:
+    from sqlalchemy.ext.declarative.base import _add_attribute, _as_declarative
+    _REGISTRY = False
+
+from rising_sun import config_repo
+from utils import validation as v
+from utils.functools import reify
+
+from .base_model import BaseModel, ModelMeta
+
+
+class config_reference(reify):
+    """
+    `reify` of a config model referred to by a DB model: the decorated method returns the pk
+    of the config model. Instances loaded by queries of `db_repo` get their references
+    resolved in bulk, see `DbModelBase.__hydrate__`.
+
+        @config_reference('ClanType')
+        def type(self):
+            return self.context, self.name
+    """
+
+    def __init__(self, klass_name: str):
+        self.klass_name = klass_name
+
+    def __call__(self, wrapped: t.Callable[[t.Any], t.Tuple]) -> 'config_reference':
+        def resolve(instance):
+            return config_repo.get(self.klass_name, wrapped(instance))
+
+        self.key = wrapped
+        super().__init__(update_wrapper(resolve, wrapped))
+        return self
+
+
+class lazy_schema_node:
+    """`__schema__` of a DB model, built from its table on the first use."""
+
+    def __get__(self, instance, owner):
+        node = v.SQLAlchemySchemaNode(owner)
+        type.__setattr__(owner, '__schema__', node)
+        return node
+
+
+class DbModelMeta(ModelMeta):
+    # TODO #12. inherit pyDatalog.sqlMetaMixin
+
+    def __init__(cls, classname, bases, dict_):
+        # DeclarativeMeta
+        if _REGISTRY:
+            registry = getattr(cls, '_sa_registry', None) or dict_['registry']
+            type.__setattr__(cls, '_sa_registry', registry)
+            if not cls.__dict__.get('__abstract__', False):
+                _as_declarative(registry, cls, dict_)
+        elif '_decl_class_registry' not in cls.__dict__:
+            _as_declarative(cls, classname, cls.__dict__)
+        type.__init__(cls, classname, bases, dict_)
+
+        cls.__schema__ = lazy_schema_node() if hasattr(cls, '__table__') else None
+        attributes = {
+            name: value for klass in reversed(cls.__mro__) for name, value in vars(klass).items()
+        }
+        cls.__config_references__ = tuple(
+            (name, value) for name, value in attributes.items()
+            if isinstance(value, config_reference)
+        )
+
+    def __setattr__(cls, key, value):
+        _add_attribute(cls, key, value)
+
+
+class DbModelBase(BaseModel):
+    context = Column(String(20), primary_key=True)
+    __config_references__: t.Tuple[t.Tuple[str, config_reference], ...] = ()
+
+    @classmethod
+    def __hydrate__(cls, instances: t.Sequence['DbModelBase']) -> None:
+        """
+        Resolves `config_reference`s of the instances, touching the config register once
+        per distinct pk rather than once per instance.
+        """
+        for name, reference in cls.__config_references__:
+            pending = [instance for instance in instances if name not in instance.__dict__]
+            keys = [reference.key(instance) for instance in pending]
+            found = config_repo.get_many(reference.klass_name, keys)
+            for instance, key in zip(pending, keys):
+                instance.__dict__[name] = found.get(key) if key else None
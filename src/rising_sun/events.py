@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Event sourcing of games: actions of a game are appended to a binary log, as records of
+`<u32 length><action as JSON>`, and the `GameState` is snapshotted every `snapshot_every`
+actions, as records of `<u32 turn><u64 hash><u32 length><state data>`. A turn is the number
+of actions resolved, so the state at a turn is the nearest snapshot before it with
+the actions since replayed on it.
+
+Both files are append-only; an incomplete record at the end (ie. of a crashed writer)
+is cut off when the file is opened, and snapshots not matching the layout or their hash
+are passed over for older ones.
+"""
+import json
+import os
+import struct
+import typing as t
+from bisect import bisect_right
+
+import numpy as np
+
+from rising_sun.planner import Action, Rules
+from rising_sun.state import GameState, StateLayout
+
+if t.TYPE_CHECKING:
+    from rising_sun.models.game import Game
+
+_LENGTH = struct.Struct('<I')
+_SNAPSHOT = struct.Struct('<IQI')
+
+
+def history_path(game: 'Game', directory: str) -> str:
+    """
+    Path prefix of the history of the game in the directory: a subdirectory per context.
+
+    >>> from rising_sun.models.game import Game
+    >>> history_path(Game(context='tournament', id=7), 'histories')
+    'histories/tournament/game-7'
+    >>> history_path(Game(id=7), 'histories')
+    'histories/default/game-7'
+    """
+    return os.path.join(directory, game.context or 'default', f'game-{game.id}')
+
+
+class _RecordFile:
+    """
+    Append-only file of records with a fixed-size header, the last field of which
+    is the payload length.
+    """
+
+    def __init__(self, path: str, header: struct.Struct, sync: bool = False):
+        self.path = path
+        self.header = header
+        self.sync = sync
+        self.file = open(path, 'a+b')
+        # (offset, header fields) of the records
+        self.records: t.List[t.Tuple[int, tuple]] = []
+        self._scan()
+
+    def _scan(self) -> None:
+        self.file.seek(0)
+        offset = 0
+        size = os.fstat(self.file.fileno()).st_size
+        while offset + self.header.size <= size:
+            fields = self.header.unpack(self.file.read(self.header.size))
+            end = offset + self.header.size + fields[-1]
+            if end > size:
+                break
+            self.records.append((offset, fields))
+            self.file.seek(end)
+            offset = end
+        if offset < size:
+            self.file.truncate(offset)
+
+    def append(self, payload: bytes, *fields) -> None:
+        """Lists the record once written, so a failed write leaves the records as they were."""
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(self.header.pack(*fields, len(payload)) + payload)
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+        self.records.append((offset, fields + (len(payload),)))
+
+    def payload(self, index: int) -> bytes:
+        offset, fields = self.records[index]
+        self.file.seek(offset + self.header.size)
+        return self.file.read(fields[-1])
+
+    def payloads(self, start: int, stop: int) -> t.Iterator[bytes]:
+        """Payloads of records `start:stop`, read sequentially."""
+        if start >= stop:
+            return
+        self.file.seek(self.records[start][0])
+        for _ in range(start, stop):
+            length = self.header.unpack(self.file.read(self.header.size))[-1]
+            yield self.file.read(length)
+
+    def copy_to(self, path: str, count: int) -> None:
+        """Writes the first `count` records to a new file."""
+        end = self.records[count][0] if count < len(self.records) else None
+        self.file.seek(0)
+        with open(path, 'xb') as target:
+            target.write(self.file.read() if end is None else self.file.read(end))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ActionLog:
+    """
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.log')
+    >>> log = ActionLog(path)
+    >>> log.append({'type': 'pass', 'clan': 'Koi'}), log.append({'type': 'pass', 'clan': 'Fox'})
+    (0, 1)
+    >>> log.close()
+    >>> with open(path, 'ab') as f:
+    ...     _ = f.write(b'\\x10\\x00')  # a torn write
+    >>> log = ActionLog(path)
+    >>> len(log), list(log.read(1))
+    (2, [{'type': 'pass', 'clan': 'Fox'}])
+    """
+
+    def __init__(self, path: str, sync: bool = False):
+        self._records = _RecordFile(path, _LENGTH, sync)
+
+    def __len__(self):
+        return len(self._records.records)
+
+    def append(self, action: t.Mapping) -> int:
+        """Appends the action; returns its index."""
+        self._records.append(json.dumps(action, separators=(',', ':')).encode())
+        return len(self) - 1
+
+    def read(self, start: int = 0, stop: t.Optional[int] = None) -> t.Iterator[dict]:
+        stop = len(self) if stop is None else min(stop, len(self))
+        return (json.loads(payload) for payload in self._records.payloads(start, stop))
+
+    def close(self) -> None:
+        self._records.close()
+
+
+class SnapshotStore:
+
+    def __init__(self, path: str, sync: bool = False):
+        self._records = _RecordFile(path, _SNAPSHOT, sync)
+        self.turns: t.List[int] = [fields[0] for _, fields in self._records.records]
+
+    def save(self, turn: int, state: GameState) -> None:
+        assert not self.turns or turn > self.turns[-1], \
+            f"Snapshot of turn {turn} is not the latest one"
+        self._records.append(state.data.tobytes(), turn, state.hash)
+        self.turns.append(turn)
+
+    def latest(self, turn: int, layout: StateLayout) -> t.Tuple[int, GameState]:
+        """
+        The valid snapshot of the latest turn not after the given one (and the turn): one
+        with the data of a state of the layout, hashed to the recorded hash.
+        """
+        for index in range(bisect_right(self.turns, turn) - 1, -1, -1):
+            _, (snapshot_turn, hash_, length) = self._records.records[index]
+            if length != layout.size * 4:
+                continue
+            data = np.frombuffer(self._records.payload(index), dtype=np.int32).copy()
+            state = GameState(layout, data, hash_)
+            if state.full_hash() == hash_:
+                return snapshot_turn, state
+        raise AssertionError(f"No valid snapshot before turn {turn}")
+
+    def close(self) -> None:
+        self._records.close()
+
+
+class GameHistory:
+    """
+    Actions of a game, resolved on its `state` and recorded in files of the `path` prefix
+    (`<path>.log` & `<path>.snapshots`). Reopening a history needs the layout of its states.
+
+    >>> import tempfile
+    >>> layout = StateLayout(None, ['Fox', 'Koi'], ['Edo', 'Kansai'], ['Seppuku'], [1])
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game')
+    >>> initial = GameState.initial(layout, coins=[5, 5])
+    >>> history = GameHistory(path, layout, initial, snapshot_every=2)
+    >>> for location in ('Edo', 'Kansai', 'Edo'):
+    ...     history.record({'type': 'move', 'clan': 'Koi', 'figure_id': 1, 'location': location})
+    >>> history.record({'type': 'bid', 'clan': 'Koi', 'advantage': 'Seppuku', 'coins': 2})
+    >>> history.turn, history.snapshots.turns, history.state.coins.tolist()
+    (4, [0, 2, 4], [5, 3])
+    >>> history.state_at(2).figures_at('Kansai'), history.state_at(3).figures_at('Edo')
+    ([1], [1])
+    >>> branch = history.branch(2, path + '-branch')
+    >>> branch.record({'type': 'pass', 'clan': 'Fox'})
+    >>> branch.turn, branch.state == history.state_at(2)
+    (3, True)
+    >>> history.close()
+    >>> GameHistory(path, layout).state == history.state
+    True
+    """
+
+    def __init__(self,
+                 path: str,
+                 layout: StateLayout,
+                 initial: t.Optional[GameState] = None,
+                 rules: Rules = None,
+                 snapshot_every: int = 64,
+                 sync: bool = False):
+        assert snapshot_every > 0, "Snapshots have to be taken every positive number of actions"
+        self.path = path
+        self.layout = layout
+        self.rules = rules or Rules()
+        self.snapshot_every = snapshot_every
+        self.actions = ActionLog(f'{path}.log', sync)
+        self.snapshots = SnapshotStore(f'{path}.snapshots', sync)
+        if not self.snapshots.turns:
+            assert initial is not None, f"No history at {path}: an initial state is needed"
+            assert not len(self.actions), f"Actions at {path} without the initial snapshot"
+            self.snapshots.save(0, initial)
+        self.state = self.state_at(len(self.actions))
+
+    @property
+    def turn(self) -> int:
+        return len(self.actions)
+
+    @classmethod
+    def for_game(cls,
+                 game: 'Game',
+                 directory: str,
+                 initial: t.Optional[GameState] = None,
+                 **options) -> 'GameHistory':
+        """
+        The history of the game at its `history_path` in the directory. A new history starts
+        with `initial`, by default the state of the game persisted in the DB; the layout of
+        reopened ones is the one of that state too.
+        """
+        initial = initial or GameState.load(game.context)
+        path = history_path(game, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return cls(path, initial.layout, initial, **options)
+
+    def record(self, action: t.Mapping) -> None:
+        """
+        Resolves the action on a copy of the state and appends it to the log; the state
+        is replaced once the action is logged, so it never gets ahead of the log.
+        """
+        state = self.state.copy()
+        self.rules.apply(state, Action(**action))
+        self.actions.append(action)
+        self.state = state
+        if self.turn % self.snapshot_every == 0:
+            self.snapshots.save(self.turn, self.state)
+
+    def state_at(self, turn: int) -> GameState:
+        """A new state of the turn, in O(actions since the latest snapshot before it)."""
+        assert 0 <= turn <= self.turn, f"No turn {turn} in the history of {self.turn} turns"
+        snapshot_turn, state = self.snapshots.latest(turn, self.layout)
+        for action in self.actions.read(snapshot_turn, turn):
+            self.rules.apply(state, Action(**action))
+        return state
+
+    def branch(self, turn: int, path: str) -> 'GameHistory':
+        """A new history at `path` with the actions & snapshots of this one up to the turn."""
+        self.actions._records.copy_to(f'{path}.log', turn)
+        snapshots = bisect_right(self.snapshots.turns, turn)
+        self.snapshots._records.copy_to(f'{path}.snapshots', snapshots)
+        return GameHistory(path, self.layout, rules=self.rules, snapshot_every=self.snapshot_every)
+
+    def close(self) -> None:
+        self.actions.close()
+        self.snapshots.close()
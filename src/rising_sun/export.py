@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export & import of a `config_repo` context or of the DB rows of a game, streamed one
+record at a time as JSON Lines (`'jsonl'`) or msgpack (`'msgpack'`, needs the `msgpack` package).
+
+Config models are written with `__getstate__` semantics (attributes starting with `_` are
+skipped); every model gets an id in the stream, and references to it (ie. `Connection.a`)
+are written as `{"$ref": id}`, after the model itself. Importing constructs models the way
+`utils.serialization.CustomLoader` does, so they are validated and registered as if loaded
+from YAML. Game rows are plain column values, imported with `DbRepo.bulk_insert`.
+"""
+import json
+import typing as t
+from collections import abc
+from itertools import groupby
+
+from sqlalchemy import orm
+
+from rising_sun import config_repo, db_repo
+from rising_sun.base_model import get_model, SlottedModel
+
+FORMATS = ('jsonl', 'msgpack')
+# in the order of foreign keys between them
+GAME_MODELS = ('Game', 'Clan', 'Figure', 'AdvantageBid')
+REF = '$ref'
+
+
+def dump_context(context: t.Optional[str], stream: t.IO, format: str = 'jsonl') -> int:
+    """
+    Writes all the models of the context (and models they refer to); returns the number
+    of records. Frozen contexts (see `config_repo.freeze_context`) are written alike.
+
+    >>> import io
+    >>> stream = io.StringIO()
+    >>> count = dump_context(None, stream)
+    >>> context = load_context(io.StringIO(stream.getvalue()), 'exported')
+    >>> edo = config_repo.get('Region', ('exported', 'Edo'))
+    >>> edo.context, edo.reward is config_repo.get('Region', (None, 'Edo')).reward
+    ('exported', False)
+    >>> connection = config_repo.lookup('Connection', 'context', 'exported')[0]
+    >>> connection.a is config_repo.get('Region', ('exported', connection.a.name))
+    True
+    """
+    write = _writer(stream, format)
+    ids: t.Dict[int, int] = {}
+    in_progress = set()
+
+    def encode(value):
+        if isinstance(value, SlottedModel):
+            return {REF: add(value)}
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return [encode(item) for item in value]
+        if isinstance(value, abc.Mapping):  # frozendicts of frozen models too
+            return {key: encode(item) for key, item in value.items()}
+        return value
+
+    def add(model: SlottedModel) -> int:
+        found = ids.get(id(model))
+        if found is not None:
+            return found
+        assert id(model) not in in_progress, f"{model!r} refers to itself"
+        in_progress.add(id(model))
+        state = {
+            key: encode(value) for key, value in model.__getstate__().items() if key != 'context'
+        }
+        ids[id(model)] = model_id = len(ids)
+        write({'id': model_id, 'class': type(model).__name__, 'state': state})
+        return model_id
+
+    for model in list(config_repo.get_context(context).instances.values()):
+        add(model)
+    return len(ids)
+
+
+def load_context(stream: t.IO,
+                 context: t.Optional[str] = None,
+                 format: str = 'jsonl') -> config_repo.ContextRegister:
+    """Reads models written by `dump_context` into the context, which owns them from now on."""
+    models: t.Dict[int, SlottedModel] = {}
+
+    def decode(value):
+        if isinstance(value, dict):
+            if REF in value:
+                return models[value[REF]]
+            return {key: decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [decode(item) for item in value]
+        return value
+
+    with config_repo.using_context(context):
+        for record in _reader(stream, format):
+            klass = get_model(record['class'])
+            assert klass, f"No model named {record['class']}"
+            state = {key: decode(value) for key, value in record['state'].items()}
+            model = klass.__new__(klass, **state)
+            model.__setstate__(state)
+            models[record['id']] = model
+    register = config_repo.get_context(context)
+    register.owned.extend(models.values())
+    return register
+
+
+def dump_game(context: str,
+              stream: t.IO,
+              format: str = 'jsonl',
+              chunk_size: int = 1000) -> int:
+    """Writes rows of `GAME_MODELS` of the context; returns the number of rows."""
+    write = _writer(stream, format)
+    session = db_repo.session()
+    count = 0
+    for klass_name in GAME_MODELS:
+        klass = db_repo.get_class(klass_name)
+        keys = [attr.key for attr in orm.class_mapper(klass).column_attrs]
+        columns = (getattr(klass, key) for key in keys)
+        query = session.query(*columns).filter(klass.context == context)
+        for values in query.yield_per(chunk_size):
+            write({'class': klass_name, 'row': dict(zip(keys, values))})
+            count += 1
+    return count
+
+
+def load_game(stream: t.IO,
+              context: t.Optional[str] = None,
+              format: str = 'jsonl',
+              chunk_size: int = 1000) -> int:
+    """
+    Inserts rows written by `dump_game` (into another context, if given) in a single
+    transaction; returns the number of rows.
+    """
+    count = 0
+    records_of_classes = groupby(_reader(stream, format), key=lambda record: record['class'])
+    try:
+        for klass_name, records in records_of_classes:
+            rows = (
+                dict(record['row'], context=context) if context else record['row']
+                for record in records
+            )
+            result = db_repo.bulk_insert(klass_name, rows, chunk_size=chunk_size, commit=False)
+            count += result.rowcount
+        db_repo.session.commit()
+    except Exception:
+        db_repo.session.rollback()
+        raise
+    return count
+
+
+def _writer(stream: t.IO, format: str) -> t.Callable[[dict], None]:
+    assert format in FORMATS, f"Unknown format {format}"
+    if format == 'msgpack':
+        packer = _msgpack().Packer()
+        return lambda record: stream.write(packer.pack(record))
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return lambda record: stream.write(encoder.encode(record) + '\n')
+
+
+def _reader(stream: t.IO, format: str) -> t.Iterator[dict]:
+    assert format in FORMATS, f"Unknown format {format}"
+    if format == 'msgpack':
+        return iter(_msgpack().Unpacker(stream, raw=False))
+    return (json.loads(line) for line in stream if line.strip())
+
+
+def _msgpack():
+    """The `msgpack` package, imported on the first use of the format."""
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("Format 'msgpack' needs the msgpack package: pip install msgpack") \
+            from None
+    return msgpack
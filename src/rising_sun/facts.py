@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Fact base of a game: `config_repo` models of a context and DB rows of the game compiled
+into relations of `utils.datalog`, with rules of the game derived incrementally. Moves
+of figures & changes of bids replace just their own facts, see `FactBase.listen`.
+"""
+import typing as t
+from itertools import chain
+
+from sqlalchemy import event, orm
+
+from rising_sun import config_repo
+from utils.datalog import atom, Fact, Program, rule, Rule, variables
+
+A, B, C, R, R0, S, _ = variables('A B C R R0 S _')
+
+# model class name -> predicate & function of the model returning its fact
+COMPILERS: t.Dict[str, t.Tuple[str, t.Callable[[t.Any], Fact]]] = {
+    'Region': ('region', lambda m: (m.name,)),
+    'Connection': ('connection', lambda m: (m.a.name, m.b.name, m.is_sea)),
+    'ClanType': ('clan_type', lambda m: (m.name, m.region.name)),
+    'Advantage': ('advantage', lambda m: (m.name,)),
+    'Clan': ('clan', lambda m: (m.name,)),
+    'Figure': (
+        'figure', lambda m: (m.id, m.type_name, m.location, m.owner_name, m.controller_name)
+    ),
+    'AdvantageBid': ('bid', lambda m: (m.clan_name, m.advantage_name, m.coins)),
+}
+CONFIG_MODELS = ('Region', 'Connection', 'ClanType', 'Advantage')
+DB_MODELS = ('Clan', 'Figure', 'AdvantageBid')
+
+RULES: t.Tuple[Rule, ...] = (
+    rule(atom('adjacent', A, B, S), atom('connection', A, B, S)),
+    rule(atom('adjacent', A, B, S), atom('connection', B, A, S)),
+    rule(atom('land_route', A, B), atom('adjacent', A, B, False)),
+    rule(atom('land_route', A, C), atom('land_route', A, B), atom('adjacent', B, C, False)),
+    rule(atom('present', C, R), atom('figure', _, _, R, _, C), atom('region', R)),
+    rule(atom('reaches', C, R), atom('present', C, R0), atom('adjacent', R0, R, _)),
+    rule(atom('at_home', C, R), atom('present', C, R), atom('clan_type', C, R)),
+    rule(atom('bidding', C, A), atom('bid', C, A, _)),
+)
+
+
+class FactBase(Program):
+    """
+    >>> facts = FactBase.from_config(None)
+    >>> facts.ask('adjacent', 'Kansai', 'Edo', False), facts.ask('land_route', 'Edo', 'Shikoku')
+    (True, False)
+    >>> facts.update('Figure', 1, (1, 'Bushi', 'Edo', 'Koi', 'Koi'))
+    >>> sorted(facts.query('reaches', 'Koi', None))
+    [('Koi', 'Kansai'), ('Koi', 'Shikoku')]
+    >>> facts.ask('at_home', 'Koi', 'Edo')
+    True
+    >>> facts.update('Figure', 1, (1, 'Bushi', 'Kansai', 'Koi', 'Koi'))
+    >>> sorted(facts.query('reaches', 'Koi', None)), facts.ask('at_home', 'Koi', 'Edo')
+    ([('Koi', 'Edo'), ('Koi', 'Shikoku')], False)
+    """
+
+    def __init__(self, rules: t.Iterable[Rule] = RULES, context: t.Optional[str] = None):
+        super().__init__(rules)
+        # of the game: rows of other contexts are not its facts
+        self.context = context
+        # (model class name, pk) -> its current fact
+        self._facts: t.Dict[t.Tuple[str, t.Hashable], Fact] = {}
+        # key of the changes flushed by a session, pending until its transaction is committed
+        self._session_key = '_fact_base_changes_{}'.format(id(self))
+
+    @classmethod
+    def from_config(cls, context: t.Optional[str], rules: t.Iterable[Rule] = RULES) -> 'FactBase':
+        facts = cls(rules, context)
+        for klass_name in CONFIG_MODELS:
+            facts.add_models(klass_name, config_repo.lookup(klass_name, 'context', context))
+        return facts
+
+    def add_models(self, klass_name: str, models: t.Iterable[t.Any]) -> None:
+        """
+        Bulk compilation of models of a class; derived facts are evaluated once for all of them.
+        """
+        predicate, compile_model = COMPILERS[klass_name]
+        facts = []
+        for model in models:
+            fact = compile_model(model)
+            self._facts[klass_name, _pk(model)] = fact
+            facts.append(fact)
+        self.add(predicate, facts)
+
+    def update(self, klass_name: str, pk: t.Hashable, fact: t.Optional[Fact]) -> None:
+        """
+        Replaces the fact of the model (`None` removes it); does nothing if it did not change.
+        """
+        predicate = COMPILERS[klass_name][0]
+        key = (klass_name, pk)
+        old = self._facts.pop(key, None)
+        if fact is not None:
+            self._facts[key] = fact
+        if old == fact:
+            return
+        if old is not None:
+            self.remove(predicate, [old])
+        if fact is not None:
+            self.add(predicate, [fact])
+
+    def update_model(self, model: t.Any, deleted: bool = False) -> None:
+        klass_name = type(model).__name__
+        self.update(klass_name, _pk(model), None if deleted else COMPILERS[klass_name][1](model))
+
+    def listen(self, session_factory) -> None:
+        """
+        Keeps the facts of DB models in sync with the rows of the context committed
+        by sessions of the factory: facts of the rows are compiled when they are flushed,
+        and replace the old ones once the transaction is committed (or are dropped once it is
+        rolled back).
+        """
+        event.listen(session_factory, 'after_flush', self._after_flush)
+        event.listen(session_factory, 'after_commit', self._after_commit)
+        event.listen(session_factory, 'after_rollback', self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        # (model class name, pk) -> its new fact (`None` if deleted); the latest flush wins
+        changes = session.info.setdefault(self._session_key, {})
+        for instance in chain(session.new, session.dirty):
+            if self._follows(instance):
+                klass_name = type(instance).__name__
+                changes[klass_name, _pk(instance)] = COMPILERS[klass_name][1](instance)
+        for instance in session.deleted:
+            if self._follows(instance):
+                changes[type(instance).__name__, _pk(instance)] = None
+
+    def _after_commit(self, session):
+        for (klass_name, pk), fact in session.info.pop(self._session_key, {}).items():
+            self.update(klass_name, pk, fact)
+
+    def _after_rollback(self, session):
+        session.info.pop(self._session_key, None)
+
+    def _follows(self, instance: t.Any) -> bool:
+        return type(instance).__name__ in DB_MODELS and instance.context == self.context
+
+
+def _pk(model: t.Any) -> t.Hashable:
+    if isinstance(model, config_repo.Model):
+        return model.pk
+    return tuple(orm.object_mapper(model).primary_key_from_instance(model))
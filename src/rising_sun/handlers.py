@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
-from rising_sun import db_repo
+from rising_sun import config_repo, db_repo, get_async_db_repo, planner
 from rising_sun.models import Game
+from rising_sun.state import GameState
 
 
 def create_example_setup():
@@ -25,3 +26,52 @@ def handle_example_request(request):
     action = get_action(request)
     result = game.resolve(action)
     return build_response(result)
+
+
+def handle_planned_request(request):
+    """
+    Resolves the best action of `request['clan']` found by the planner within the budget
+    of the request (`rollouts` and/or `seconds`), searched by `workers` processes.
+    """
+    game: Game = db_repo.get(Game, ('context', 'id'))
+    state = GameState.load(game.context)
+    board_map, = config_repo.lookup('Map', 'context', game.context)
+    result = planner.plan(
+        state,
+        board_map.graph,
+        request['clan'],
+        rollouts=request.get('rollouts', 1000),
+        seconds=request.get('seconds'),
+        workers=request.get('workers', 0),
+    )
+    game.resolve(result.action.as_dict())
+    return build_response({
+        'action': result.action.as_dict(),
+        'value': result.value,
+        'rollouts': result.stats.rollouts,
+        'elapsed': result.stats.elapsed,
+    })
+
+
+async def create_example_setup_async():
+    repo = get_async_db_repo()
+    await repo.create_tables()
+    try:
+        await repo.add(Game(context='context', id='id'))
+    finally:
+        await repo.remove()
+
+
+async def handle_example_request_async(request):
+    """
+    Asyncio variant of `handle_example_request`: each request gets its own session,
+    scoped to the task serving it, so the requests can be handled concurrently.
+    """
+    repo = get_async_db_repo()
+    try:
+        game: Game = await repo.get(Game, ('context', 'id'))
+        action = get_action(request)
+        result = game.resolve(action)
+        return build_response(result)
+    finally:
+        await repo.remove()
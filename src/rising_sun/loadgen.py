@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Load generator of `rising_sun.server`: connections send requests for random games, keeping
+up to `pipeline` requests in flight each, and the throughput & latency percentiles are
+reported. Without `--port` it runs against a stand-in server started in the process,
+with `--games` games in the (in-memory) DB.
+
+    python -m rising_sun.loadgen --requests 20000 --connections 50 --pipeline 8
+"""
+import argparse
+import asyncio
+import json
+import random
+import typing as t
+from collections import Counter
+from time import perf_counter
+
+from utils.itertools import percentile
+
+from rising_sun.server import create_games, GameKey, GameServer
+
+
+async def _client(host: str,
+                  port: int,
+                  keys: t.Sequence[GameKey],
+                  count: int,
+                  pipeline: int,
+                  latencies: t.List[float],
+                  errors: Counter,
+                  seed: int) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(seed)
+    window = asyncio.Semaphore(pipeline)
+    started = {}
+
+    async def read_responses():
+        for _ in range(count):
+            response = json.loads(await reader.readline())
+            latencies.append(perf_counter() - started.pop(response['id']))
+            if 'error' in response:
+                errors[response['error']] += 1
+            window.release()
+
+    reading = asyncio.ensure_future(read_responses())
+    for i in range(count):
+        await window.acquire()
+        started[i] = perf_counter()
+        writer.write(json.dumps({'id': i, 'game': rng.choice(keys)}).encode() + b'\n')
+        await writer.drain()
+    await reading
+    writer.close()
+
+
+def spread(requests: int, connections: int) -> t.List[int]:
+    """
+    Numbers of requests of the connections: the remainder goes to the first ones.
+
+    >>> spread(10, 4), spread(3, 4)
+    ([3, 3, 2, 2], [1, 1, 1, 0])
+    """
+    return [requests // connections + (i < requests % connections) for i in range(connections)]
+
+
+async def run_load(host: str,
+                   port: int,
+                   keys: t.Sequence[GameKey],
+                   requests: int = 10000,
+                   connections: int = 20,
+                   pipeline: int = 8,
+                   seed: int = 0) -> dict:
+    latencies, errors = [], Counter()
+    counts = spread(requests, connections)
+    started = perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, keys, count, pipeline, latencies, errors, seed + i)
+        for i, count in enumerate(counts) if count  # connections without requests are not opened
+    ))
+    elapsed = perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': dict(errors),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p90_ms': percentile(latencies, 0.9) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.,
+    }
+
+
+async def run_stand_in(games: int = 100, **options) -> dict:
+    """Runs the load against a server started in the process; reports its stats too."""
+    keys = create_games('load', games)
+    game_server = GameServer()
+    server = await game_server.start()
+    host, port = server.sockets[0].getsockname()[:2]
+    async with server:
+        report = await run_load(host, port, keys, **options)
+    report['server'] = game_server.stats()
+    return report
+
+
+def main(argv: t.Sequence[str] = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int,
+                        help="port of a running server; a stand-in one is started if missing")
+    parser.add_argument('--context', default='load',
+                        help="context of the games of a running server")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--pipeline', type=int, default=8)
+    args = parser.parse_args(argv)
+    options = dict(requests=args.requests, connections=args.connections, pipeline=args.pipeline)
+    if args.port:
+        keys = [(args.context, i) for i in range(args.games)]
+        report = asyncio.run(run_load(args.host, args.port, keys, **options))
+    else:
+        report = asyncio.run(run_stand_in(args.games, **options))
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 from utils.imports import get_all_names
 
-from ..base_model import BaseModel
+from ..base_model import SlottedModel
 
 
 def is_model(cls):
     try:
-        return issubclass(cls, BaseModel)
+        return issubclass(cls, SlottedModel)
     except TypeError:
         return False
 
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import abc
+import typing as t
+from collections import deque
 from itertools import chain
 from enum import Enum
 
+import numpy as np
+
 from utils import validation as v
 
 from rising_sun import config_repo
@@ -15,7 +19,7 @@ class LocationType(Enum):
 
 
 class Location(config_repo.Model):
-
+    __slots__ = ()
     __pks__ = ('context', 'name')
 
     @property
@@ -32,6 +36,7 @@ class Region(Location):
     yaml_tag = LocationType.REGION.value
     type = LocationType.REGION
     __schema__ = RegionSchema()
+    __compact__ = True
 
 
 class ClanReserveSchema(v.Schema):
@@ -86,6 +91,7 @@ class Connection(config_repo.Model):
     yaml_tag = 'connection'
     __pks__ = ('context', 'a.name', 'b.name')
     __schema__ = ConnectionSchema()
+    __compact__ = True
 
     def __init__(self, **kwargs):
         super(Connection, self).__init__(**kwargs)
@@ -118,10 +124,162 @@ class MapSchema(v.Schema):
             ))
 
 
+class MapGraph:
+    """
+    Compact adjacency of a `Map`. Regions are numbered by their position in `Map.regions`
+    and neighbours of region `i` are `indices[indptr[i]:indptr[i + 1]]` (CSR layout), with
+    the parallel `sea_mask` & `land_mask` telling the kind of each connection. The graph
+    holds no models, so it is shared by clones of the map; as it never changes, results
+    of the queries are cached.
+
+    >>> graph = MapGraph(('a', 'b', 'c'), [(0, 1, False), (1, 2, True)])
+    >>> graph.indptr.tolist(), graph.indices.tolist(), graph.sea_mask.tolist()
+    ([0, 1, 3, 4], [1, 0, 2, 1], [False, False, True, True])
+    >>> graph.neighbours(1), graph.neighbours(1, sea=True), graph.distances(0)
+    ((0, 2), (2,), (0, 1, 2))
+    >>> graph.shortest_path(0, 2), graph.shortest_path(0, 2, by_sea=False)
+    ((0, 1, 2), None)
+    """
+    __slots__ = (
+        'names', 'ids', 'indptr', 'indices', 'sea_mask', 'land_mask', '_neighbours', '_searches'
+    )
+
+    def __init__(self, names: t.Sequence[str], edges: t.Iterable[t.Tuple[int, int, bool]]):
+        self.names = tuple(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        adjacency = [[] for _ in self.names]
+        for a, b, is_sea in edges:
+            adjacency[a].append((b, is_sea))
+            adjacency[b].append((a, is_sea))
+        self.indptr = np.zeros(len(adjacency) + 1, dtype=np.int32)
+        self.indptr[1:] = np.cumsum([len(neighbours) for neighbours in adjacency])
+        neighbours = list(chain.from_iterable(sorted(item) for item in adjacency))
+        self.indices = np.array([b for b, _ in neighbours], dtype=np.int32)
+        self.sea_mask = np.array([is_sea for _, is_sea in neighbours], dtype=bool)
+        self.land_mask = ~self.sea_mask
+        self._neighbours = {}
+        self._searches = {}
+
+    @classmethod
+    def from_map(cls,
+                 regions: t.Sequence[Region],
+                 connections: t.Iterable[Connection]) -> 'MapGraph':
+        ids = {region.name: i for i, region in enumerate(regions)}
+        return cls(
+            (region.name for region in regions),
+            ((ids[c.a.name], ids[c.b.name], c.is_sea) for c in connections),
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def neighbours(self, region: int, sea: t.Optional[bool] = None) -> t.Tuple[int, ...]:
+        """
+        Neighbours of the region: all of them, only by sea (`sea=True`) or only by land
+        (`sea=False`).
+        """
+        key = (region, sea)
+        found = self._neighbours.get(key)
+        if found is None:
+            start, end = self.indptr[region], self.indptr[region + 1]
+            indices = self.indices[start:end]
+            if sea is not None:
+                indices = indices[(self.sea_mask if sea else self.land_mask)[start:end]]
+            found = self._neighbours[key] = tuple(indices.tolist())
+        return found
+
+    def distances(self, source: int, by_sea: bool = True) -> t.Tuple[int, ...]:
+        """Number of moves from the source to each region, -1 for unreachable ones."""
+        return self._search(source, by_sea)[0]
+
+    def is_reachable(self, source: int, target: int, by_sea: bool = True) -> bool:
+        return self._search(source, by_sea)[0][target] >= 0
+
+    def shortest_path(self,
+                      source: int,
+                      target: int,
+                      by_sea: bool = True) -> t.Optional[t.Tuple[int, ...]]:
+        """Regions from the source to the target (both included), or None if unreachable."""
+        distances, predecessors = self._search(source, by_sea)
+        if distances[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(predecessors[path[-1]])
+        return tuple(reversed(path))
+
+    def _search(self, source: int, by_sea: bool) -> t.Tuple[t.Tuple[int, ...], t.Tuple[int, ...]]:
+        """Breadth-first search from the source: distances & predecessors of all the regions."""
+        key = (source, by_sea)
+        found = self._searches.get(key)
+        if found is None:
+            sea = None if by_sea else False
+            distances = [-1] * len(self)
+            predecessors = [-1] * len(self)
+            distances[source] = 0
+            queue = deque((source,))
+            while queue:
+                current = queue.popleft()
+                for neighbour in self.neighbours(current, sea):
+                    if distances[neighbour] < 0:
+                        distances[neighbour] = distances[current] + 1
+                        predecessors[neighbour] = current
+                        queue.append(neighbour)
+            found = self._searches[key] = (tuple(distances), tuple(predecessors))
+        return found
+
+
 class Map(config_repo.Model):
+    """
+    Adjacency of regions is indexed once, when the map is constructed or loaded (see `MapGraph`);
+    queries accept regions or their names.
+
+    >>> board_map = Map.sample()
+    >>> board_map.neighbours('Nagato'), board_map.neighbours('Nagato', sea=False)
+    ([Region(None, Shikoku), Region(None, Kansai)], [Region(None, Kansai)])
+    >>> board_map.shortest_path('Shikoku', 'Kansai')
+    [Region(None, Shikoku), Region(None, Kansai)]
+    >>> board_map.is_reachable('Shikoku', 'Kansai', by_sea=False)
+    False
+    """
     yaml_tag = 'map'
     __schema__ = MapSchema()
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._graph = MapGraph.from_map(self.regions, self.connections)
+
+    def __setstate__(self, state: t.Mapping):
+        super().__setstate__(state)
+        self._graph = MapGraph.from_map(self.regions, self.connections)
+
+    @property
+    def graph(self) -> MapGraph:
+        return self._graph
+
+    def region_id(self, region: t.Union[Region, str]) -> int:
+        return self._graph.ids[region if isinstance(region, str) else region.name]
+
+    def neighbours(self,
+                   region: t.Union[Region, str],
+                   sea: t.Optional[bool] = None) -> t.List[Region]:
+        return [self.regions[i] for i in self._graph.neighbours(self.region_id(region), sea)]
+
+    def is_reachable(self,
+                     source: t.Union[Region, str],
+                     target: t.Union[Region, str],
+                     by_sea: bool = True) -> bool:
+        return self._graph.is_reachable(self.region_id(source), self.region_id(target), by_sea)
+
+    def shortest_path(
+            self,
+            source: t.Union[Region, str],
+            target: t.Union[Region, str],
+            by_sea: bool = True
+    ) -> t.Optional[t.List[Region]]:
+        path = self._graph.shortest_path(self.region_id(source), self.region_id(target), by_sea)
+        return None if path is None else [self.regions[i] for i in path]
+
     def __repr__(self):
         """
         >>> Map.sample()
@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 from enum import Enum
 
-from sqlalchemy import Column, Unicode
+from sqlalchemy import Column, Integer, Unicode
 from sqlalchemy.orm.mapper import validates
 
 from rising_sun import config_repo, db_repo
+from rising_sun.db_model import config_reference
 from utils import validation as v
-from utils.functools import reify
 
 
 class ClanColors(Enum):
@@ -17,7 +17,7 @@ class ClanColors(Enum):
 
 class ClanTypeSchema(v.Schema):
     name = v.SchemaNode(v.String(), validator=v.Length(max=20))
-    color = v.SchemaNode(v.String(), validator=v.OneOf(c.value for c in ClanColors))
+    color = v.SchemaNode(v.String(), validator=v.OneOf([c.value for c in ClanColors]))
     starting_honor = v.SchemaNode(v.Integer(), validator=v.Range(1, 10))
     starting_coins = v.SchemaNode(v.Integer(), validator=v.Range(1, 10))
     region = v.SchemaNode(v.Instance('rising_sun.models.board:Region'))
@@ -27,6 +27,7 @@ class ClanType(config_repo.Model):
     yaml_tag = 'clan_type'
     __pks__ = ('context', 'name')
     __schema__ = ClanTypeSchema()
+    __compact__ = True
 
 
 class Clan(db_repo.Model):
@@ -34,17 +35,20 @@ class Clan(db_repo.Model):
     __pks__ = ('context', 'name')
 
     name = Column(Unicode(20), primary_key=True)
+    # `None` until the first update: the clan has the starting ones of its type
+    coins = Column(Integer)
+    honor = Column(Integer)
     assets = None
 
-    @reify
+    @config_reference("ClanType")
     def type(self):
-        return config_repo.get("ClanType", (self.context, self.name))
+        return self.context, self.name
 
-    @reify
+    @config_reference("ClanReserve")
     def reserve(self):
-        return config_repo.get("ClanReserve", (self.context, self.name))
+        return self.context, self.name
 
     @validates("name")
     def validate_name(self, key, name):
-        assert name in config_repo.filter("ClanType", lambda pk: pk[0] == self.context)
+        assert config_repo.get("ClanType", (self.context, name)), f"No ClanType named {name}"
         return name
@@ -5,8 +5,8 @@ from sqlalchemy import Column, ForeignKey, Integer, Unicode
 from sqlalchemy.orm import relationship
 
 from rising_sun import config_repo, db_repo
+from rising_sun.db_model import config_reference
 from utils import validation as v
-from utils.functools import reify
 
 
 class FigureCategory(Enum):
@@ -23,7 +23,7 @@ class FigureTypeSchema(v.Schema):
 
     @v.instantiate(missing=())
     class categories(v.SequenceSchema):
-        category = v.SchemaNode(v.String(), validator=v.OneOf(c.value for c in FigureCategory))
+        category = v.SchemaNode(v.String(), validator=v.OneOf([c.value for c in FigureCategory]))
 
 
 class FigureType(config_repo.Model):
@@ -49,6 +49,6 @@ class Figure(db_repo.Model):
     owner = relationship("Clan", foreign_keys=[owner_name], backref='figures_owned')
     controller = relationship("Clan", foreign_keys=[controller_name], backref='figures_controlled')
 
-    @reify
+    @config_reference("FigureType")
     def type(self):
-        return config_repo.get("FigureType", (self.context, self.id))
+        return self.context, self.type_name
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from enum import Enum
 
-from rising_sun.base_model import BaseModel
+from rising_sun.base_model import SlottedModel
 from utils import validation as v
 
 
@@ -22,6 +22,7 @@ GainSchema = type(
 )
 
 
-class Gain(BaseModel):
+class Gain(SlottedModel):
     __pks__ = tuple(gain_type.value for gain_type in GainType)
     __schema__ = GainSchema(v.Mapping(unknown='raise'))
+    __compact__ = True
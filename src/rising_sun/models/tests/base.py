@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import pickle
+
 import pytest
 
 from rising_sun import config_repo
@@ -74,3 +76,116 @@ def test_attr_not_serialized_raises(SerializedConfigModel):
     with pytest.raises(v.UnsupportedFields) as e:
         SerializedConfigModel(attr_int=1, attr_str='foo', _not_serialized=2)
     assert e.value.asdict() == {'': 'Unrecognized keys in mapping: "{\'_not_serialized\': 2}"'}
+
+
+class IndexedConfigModel(config_repo.Model):
+    __pks__ = ('context', 'name')
+    __indexes__ = {
+        'context': 'context',
+        'initial': lambda instance: instance.name[0],
+    }
+
+
+def test_config_model_lookup():
+    a1 = IndexedConfigModel(context='lookup', name='a1')
+    a2 = IndexedConfigModel(context='lookup', name='a2')
+    b1 = IndexedConfigModel(context='lookup', name='b1')
+    assert set(config_repo.lookup("IndexedConfigModel", 'context', 'lookup')) == {a1, a2, b1}
+    assert set(config_repo.lookup("IndexedConfigModel", 'initial', 'a')) == {a1, a2}
+    assert config_repo.lookup("IndexedConfigModel", 'initial', 'c') == []
+
+
+def test_config_model_lookup_after_remove():
+    instance = IndexedConfigModel(context='remove', name='a')
+    config_repo.remove(instance)
+    assert config_repo.get("IndexedConfigModel", ('remove', 'a')) is None
+    assert config_repo.lookup("IndexedConfigModel", 'context', 'remove') == []
+
+
+def test_config_contexts_load_unload():
+    config_repo.load_config('battle_workout.yaml', context='game 1')
+    config_repo.load_config('battle_workout.yaml', context='game 2')
+    koi_1 = config_repo.get("ClanType", ('game 1', 'Koi'))
+    koi_2 = config_repo.get("ClanType", ('game 2', 'Koi'))
+    assert koi_1 is not koi_2
+    assert koi_1.region is config_repo.get("Region", ('game 1', 'Edo'))
+    assert config_repo.memory_usage()['game 1'] > 0
+
+    config_repo.unload_context('game 1')
+    assert config_repo.get("ClanType", ('game 1', 'Koi')) is None
+    assert config_repo.lookup("ClanType", 'context', 'game 1') == []
+    assert config_repo.get("ClanType", ('game 2', 'Koi')) is koi_2
+    config_repo.unload_context('game 2')
+
+
+def test_config_contexts_clone():
+    config_repo.load_config('battle_workout.yaml', context='source')
+    config_repo.clone_context('source', 'clone')
+    koi = config_repo.get("ClanType", ('clone', 'Koi'))
+    assert koi.context == 'clone'
+    assert koi.region is config_repo.get("Region", ('clone', 'Edo'))
+    assert len(config_repo.get_context('clone')) == len(config_repo.get_context('source'))
+    config_repo.unload_context('source')
+    config_repo.unload_context('clone')
+
+
+class CompactSchema(v.Schema):
+    name = v.SchemaNode(v.String())
+    size = v.SchemaNode(v.Int(), missing=v.drop)
+
+
+class CompactConfigModel(config_repo.Model):
+    __pks__ = ('context', 'name')
+    __schema__ = CompactSchema()
+    __compact__ = True
+
+
+def test_compact_config_models():
+    model = CompactConfigModel(name='scroll')
+    assert not hasattr(model, '__dict__')
+    assert CompactConfigModel.__slots__ == ('name', 'size', 'context', '__weakref__')
+    assert model.context is None and model.pk == (None, 'scroll')
+    assert model.__getstate__() == {'name': 'scroll'}
+    assert not hasattr(model, 'size')
+    assert config_repo.get('CompactConfigModel', (None, 'scroll')) is model
+
+    config_repo.load_config('battle_workout.yaml', context='compact')
+    edo = config_repo.get('Region', ('compact', 'Edo'))
+    assert not hasattr(edo, '__dict__') and not hasattr(edo.reward, '__dict__')
+    assert edo.__getstate__() == {'name': 'Edo', 'reward': edo.reward, 'context': 'compact'}
+    clone = config_repo.clone_context('compact', 'compact_clone')
+    connection = next(m for m in clone.instances.values() if type(m).__name__ == 'Connection')
+    assert connection.context == 'compact_clone'
+    assert connection.a is config_repo.get('Region', ('compact_clone', connection.a.name))
+    config_repo.freeze_context('compact_clone')
+    with pytest.raises(AttributeError):
+        connection.is_sea = True
+    config_repo.unload_context('compact_clone')
+    config_repo.unload_context('compact')
+
+
+def test_config_contexts_freeze():
+    config_repo.load_config('battle_workout.yaml', context='frozen')
+    config_repo.freeze_context('frozen')
+    koi = config_repo.get("ClanType", ('frozen', 'Koi'))
+    with pytest.raises(AttributeError):
+        koi.starting_coins = 10
+    assert isinstance(koi, config_repo.FrozenModel)
+    assert repr(koi) == 'ClanType(frozen, Koi)'
+    assert isinstance(config_repo.lookup("Map", 'context', 'frozen')[0].regions, tuple)
+    pickled = pickle.dumps(koi)
+    config_repo.unload_context('frozen')
+    assert config_repo.get("ClanType", ('frozen', 'Koi')) is None
+
+    # ie. in a spawned worker
+    unpickled = pickle.loads(pickled)
+    assert type(unpickled) is type(koi) and repr(unpickled) == 'ClanType(frozen, Koi)'
+    assert unpickled.region.name == koi.region.name
+    assert isinstance(unpickled.region, config_repo.FrozenModel)
+    assert config_repo.get("ClanType", ('frozen', 'Koi')) is unpickled
+    with pytest.raises(AttributeError):
+        unpickled.starting_coins = 10
+    # ie. a worker that has the context already
+    assert pickle.loads(pickled) is unpickled
+    assert pickle.loads(pickle.dumps(unpickled)) is unpickled
+    config_repo.unload_context('frozen')
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import pytest
 
+from rising_sun import config_repo
+
 from ..board import *
 
 
@@ -25,3 +27,12 @@ def test_connection_symmetric(regions):
     c12 = Connection(a=regions[0], b=regions[1])
     c21 = Connection(a=regions[0], b=regions[1])
     assert c12 == c21
+
+
+def test_map_loaded_from_config():
+    board_map, = config_repo.lookup('Map', 'context', None)
+    assert [r.name for r in board_map.regions] == ['Edo', 'Shikoku', 'Kansai']
+    assert board_map.graph.indptr.tolist() == [0, 2, 4, 6]
+    assert [r.name for r in board_map.neighbours('Edo', sea=True)] == ['Shikoku']
+    assert [r.name for r in board_map.shortest_path('Kansai', 'Shikoku')] == ['Kansai', 'Shikoku']
+    assert board_map.shortest_path('Kansai', 'Shikoku', by_sea=False) is None
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from rising_sun import config_repo, db_repo
+
+from ..figure import Figure, FigureType
+
+
+def test_bulk_insert_figures():
+    rows = ({'context': 'bulk', 'id': i, 'type_name': 'Bushi'} for i in range(250))
+    result = db_repo.bulk_insert('Figure', rows, chunk_size=100)
+    assert result.rowcount == 250
+    assert result.pks is None
+    assert Figure.query.filter_by(context='bulk').count() == 250
+
+
+def test_add_all_figures_return_pks():
+    figures = [Figure(context='add_all', id=i, type_name='Bushi') for i in range(5)]
+    result = db_repo.add_all(figures, chunk_size=2, return_pks=True)
+    assert result.rowcount == 5
+    assert result.pks == [('add_all', i) for i in range(5)]
+
+
+def test_query_hydrates_figure_types(monkeypatch):
+    types = [FigureType(context='hydrate', name=name) for name in ('Bushi', 'Shinto')]
+    rows = ({'context': 'hydrate', 'id': i, 'type_name': types[i % 2].name} for i in range(100))
+    db_repo.bulk_insert('Figure', rows)
+    lookups = []
+    get_many = config_repo.get_many
+    monkeypatch.setattr(config_repo, 'get', lambda *args: lookups.append(args))
+    monkeypatch.setattr(
+        config_repo, 'get_many', lambda name, pks: lookups.append(name) or get_many(name, pks)
+    )
+    figures = Figure.query.filter_by(context='hydrate').all()
+    assert lookups == ['FigureType']
+    assert all(figure.type is types[figure.id % 2] for figure in figures)
+    assert lookups == ['FigureType']
@@ -3,8 +3,8 @@ from sqlalchemy import Column, ForeignKey, Integer, Unicode
 from sqlalchemy.orm import relationship
 
 from rising_sun import config_repo, db_repo
+from rising_sun.db_model import config_reference
 from utils import validation as v
-from utils.functools import reify
 
 
 class AdvantageSchema(v.Schema):
@@ -27,6 +27,6 @@ class AdvantageBid(db_repo.Model):
     clan = relationship("Clan")
     coins = Column(Integer())
 
-    @reify
+    @config_reference("Advantage")
     def advantage(self):
-        return config_repo.get("Advantage", (self.context, self.advantage_name))
+        return self.context, self.advantage_name
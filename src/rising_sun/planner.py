@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Action planning over `GameState`s: legal actions of a clan are evaluated with Monte Carlo
+rollouts (random playouts of a few turns of all the clans) on copies of the state.
+Rollouts are allotted to actions with UCB1 and spread in batches over a process pool,
+which outlives the search, so its workers start once rather than once per decision;
+the setup of a search (the state & co.) is sent along with its first batches only, and kept
+by the workers. The search stops when its budget (number of rollouts and/or wall-clock time)
+is spent.
+Final positions of rollouts are evaluated once per process, thanks to a transposition table.
+"""
+import os
+import random
+import typing as t
+from collections import OrderedDict
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import lru_cache
+from itertools import count
+from math import log, sqrt
+from time import perf_counter, time
+
+import numpy as np
+
+from rising_sun.models.board import MapGraph
+from rising_sun.state import GameState
+from rising_sun.transpositions import TableStats, TranspositionTable
+
+
+class Action(t.NamedTuple):
+    type: str  # 'pass', 'move' or 'bid'
+    clan: str
+    figure_id: int = None
+    location: str = None
+    advantage: str = None
+    coins: int = 0
+
+    def as_dict(self) -> dict:
+        """The action as accepted by `Game.resolve`."""
+        return {key: value for key, value in self._asdict().items() if value is not None}
+
+
+class Rules:
+    """
+    Stand-in rules used by rollouts, until `Game.resolve` implements the real ones:
+    a clan passes, moves a figure it controls to a neighbouring region or bids for
+    an advantage (paying the coins at once). A clan scores 3 points per region where it
+    has the most figures, plus a point per 5 coins and honor.
+    """
+
+    def legal_actions(self, state: GameState, graph: MapGraph, clan: str) -> t.List[Action]:
+        layout = state.layout
+        clan_index = layout.clan_index[clan]
+        actions = [Action('pass', clan)]
+        locations, controllers = state.locations, state.controllers
+        on_map = (locations >= 0) & (locations < len(graph))
+        for i in np.flatnonzero((controllers == clan_index) & on_map):
+            figure_id = layout.figure_ids[i]
+            for neighbour in graph.neighbours(int(locations[i])):
+                location = graph.names[neighbour]
+                actions.append(Action('move', clan, figure_id=figure_id, location=location))
+        coins = int(state.coins[clan_index])
+        for advantage, bid in zip(layout.advantages, state.bids[clan_index].tolist()):
+            if not bid:
+                actions.extend(
+                    Action('bid', clan, advantage=advantage, coins=c) for c in range(1, coins + 1)
+                )
+        return actions
+
+    def apply(self, state: GameState, action: Action) -> None:
+        if action.type == 'move':
+            state.move_figure(action.figure_id, action.location)
+        elif action.type == 'bid':
+            state.place_bid(action.clan, action.advantage, action.coins)
+            state.add_coins(action.clan, -action.coins)
+
+    def points(self, state: GameState, graph: MapGraph) -> np.ndarray:
+        """Points of all the clans."""
+        figures = state.figures_per_location()[:, :len(graph)]
+        best = figures.max(axis=0)
+        majority = (figures == best) & (best > 0) & ((figures == best).sum(axis=0) == 1)
+        return 3 * majority.sum(axis=1) + (state.coins + state.honor) // 5
+
+    def reward(self, state: GameState, graph: MapGraph, clan: str) -> float:
+        """1 for the sole leader, 0.5 for a shared lead, 0 otherwise."""
+        points = self.points(state, graph)
+        own = points[state.layout.clan_index[clan]]
+        if own < points.max():
+            return 0.
+        return 1. if (points == own).sum() == 1 else 0.5
+
+
+class SearchStats(t.NamedTuple):
+    rollouts: int
+    batches: int
+    workers: int
+    elapsed: float
+    # action -> (number of rollouts, mean reward)
+    actions: t.Dict[Action, t.Tuple[int, float]]
+    # summed over the processes
+    transpositions: TableStats
+
+
+class Plan(t.NamedTuple):
+    action: Action
+    value: float
+    stats: SearchStats
+
+
+def plan(state: GameState,
+         graph: MapGraph,
+         clan: str,
+         rollouts: t.Optional[int] = 1000,
+         seconds: t.Optional[float] = None,
+         depth: int = 3,
+         workers: int = 0,
+         batch_size: int = 32,
+         exploration: float = sqrt(2),
+         seed: int = 0,
+         table_size: int = 1 << 16,
+         rules: Rules = None,
+         executor: t.Optional[Executor] = None) -> Plan:
+    """
+    Finds the best action of the clan. The budget is `rollouts` and/or `seconds` (whichever
+    is spent first); a rollout plays `depth` turns of all the clans after the action.
+    With `workers=0` the rollouts are run in the calling process, otherwise in the `executor`
+    (by default, the pool of `workers` processes kept by `get_pool`), at most `2 * workers`
+    batches at a time. The best action is the most
+    simulated one (ties are broken by the mean reward). `table_size` is the capacity
+    of the transposition tables of the processes.
+
+    >>> from rising_sun.state import StateLayout
+    >>> graph = MapGraph(('Edo', 'Kansai'), [(0, 1, False)])
+    >>> layout = StateLayout(None, ['Fox', 'Koi'], graph.names, [], [1, 2, 3])
+    >>> state = GameState.initial(layout, coins=[0, 0], honor=[0, 0])
+    >>> state.move_figure(1, 'Edo', owner='Koi')
+    >>> state.move_figure(2, 'Kansai', owner='Fox'); state.move_figure(3, 'Kansai', owner='Fox')
+    >>> result = plan(state, graph, 'Koi', rollouts=200, depth=0)
+    >>> result.action
+    Action(type='pass', clan='Koi', figure_id=None, location=None, advantage=None, coins=0)
+    >>> result.value, result.stats.rollouts
+    (0.5, 200)
+    >>> result.stats.transpositions.hit_rate  # a final position per action
+    0.99
+    """
+    assert rollouts or seconds, "Provide a budget: `rollouts` and/or `seconds`"
+    assert graph.names == state.layout.locations[:len(graph)], \
+        "The state is not laid out for the map"
+    rules = rules or Rules()
+    started = perf_counter()
+    deadline = started + seconds if seconds else None
+    # of the batches too, on the wall clock shared by the processes: batches left running
+    # after the deadline stop short rather than hold up the next search of the pool
+    until = time() + seconds if seconds else None
+    actions = rules.legal_actions(state, graph, clan)
+    # rollouts of the actions: scheduled (done or running), done & the sums of their rewards
+    scheduled = [0] * len(actions)
+    visits = [0] * len(actions)
+    totals = [0.] * len(actions)
+    rng = random.Random(seed)
+    batches = 0
+    # process ID -> the latest stats of its transposition table
+    tables: t.Dict[int, TableStats] = {}
+
+    def next_batch() -> t.List[int]:
+        """Actions of the next batch, allotted with UCB1; running rollouts count as done."""
+        if deadline is not None and perf_counter() >= deadline:
+            return []
+        size = min(batch_size, rollouts - sum(scheduled)) if rollouts else batch_size
+        batch = []
+        for _ in range(size):
+            untried = [i for i, count in enumerate(scheduled) if not count]
+            if untried:
+                chosen = untried[0]
+            else:
+                total = log(sum(scheduled))
+                chosen = max(
+                    range(len(actions)),
+                    key=lambda i: (
+                        totals[i] / max(visits[i], 1) + exploration * sqrt(total / scheduled[i])
+                    )
+                )
+            scheduled[chosen] += 1
+            batch.append(chosen)
+        return batch
+
+    def record(batch: t.List[int], result: '_BatchResult') -> None:
+        nonlocal batches
+        tables[result.pid] = result.table
+        for i, reward in zip(batch, result.rewards):
+            visits[i] += 1
+            totals[i] += reward
+        batches += 1
+
+    if len(actions) > 1 and workers:
+        pool = executor or get_pool(workers)
+        search = (os.getpid(), next(_searches))
+        setup = (state, graph, clan, depth, rules, table_size)
+        # future -> its batch & seed
+        pending: t.Dict[Future, t.Tuple[t.List[int], int]] = {}
+        submitted = 0
+
+        def submit(batch: t.List[int], seed: int, with_setup: bool) -> None:
+            batch_actions = [actions[i] for i in batch]
+            future = pool.submit(
+                _run_batch, search, setup if with_setup else None, batch_actions, seed, until
+            )
+            pending[future] = (batch, seed)
+
+        try:
+            while True:
+                while len(pending) < 2 * workers:
+                    batch = next_batch()
+                    if not batch:
+                        break
+                    # the first batches are likely to reach all the workers
+                    submit(batch, rng.getrandbits(32), with_setup=submitted < 2 * workers)
+                    submitted += 1
+                if not pending:
+                    break
+                timeout = None if deadline is None else max(deadline - perf_counter(), 0)
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:  # out of time
+                    break
+                for future in done:
+                    batch, seed = pending.pop(future)
+                    result = future.result()
+                    if result is None:  # run by a worker without the setup of the search
+                        submit(batch, seed, with_setup=True)
+                    else:
+                        record(batch, result)
+        finally:
+            # running batches are not awaited: their results would come after the deadline
+            for future in pending:
+                future.cancel()
+    elif len(actions) > 1:
+        rollout = _Rollouts(state, graph, clan, depth, rules, table_size)
+        batch = next_batch()
+        while batch:
+            record(batch, rollout.run([actions[i] for i in batch], rng.getrandbits(32), until))
+            batch = next_batch()
+
+    best = max(range(len(actions)), key=lambda i: (visits[i], totals[i] / max(visits[i], 1)))
+    stats = SearchStats(
+        rollouts=sum(visits),
+        batches=batches,
+        workers=workers,
+        elapsed=perf_counter() - started,
+        actions={
+            action: (visits[i], totals[i] / max(visits[i], 1)) for i, action in enumerate(actions)
+        },
+        transpositions=sum(tables.values(), TableStats(*[0] * len(TableStats._fields))),
+    )
+    return Plan(actions[best], stats.actions[actions[best]][1], stats)
+
+
+class _BatchResult(t.NamedTuple):
+    rewards: t.List[float]
+    pid: int
+    table: TableStats
+
+
+class _Rollouts:
+
+    def __init__(self,
+                 state: GameState,
+                 graph: MapGraph,
+                 clan: str,
+                 depth: int,
+                 rules: Rules,
+                 table_size: int):
+        self.table = TranspositionTable(table_size)
+        self.state = state
+        self.graph = graph
+        self.clan = clan
+        self.depth = depth
+        self.rules = rules
+        clans = state.layout.clans
+        start = clans.index(clan) + 1
+        # turns of all the clans, starting with the one after the planning clan
+        self.turns = (clans[start:] + clans[:start]) * depth
+
+    def run(self,
+            actions: t.Sequence[Action],
+            seed: int,
+            until: t.Optional[float] = None) -> _BatchResult:
+        """Rewards of the rollouts of the actions, but of the ones not started by `until`."""
+        rng = random.Random(seed)
+        rules, graph, table = self.rules, self.graph, self.table
+        rewards = []
+        for action in actions:
+            if until is not None and time() >= until:
+                break
+            state = self.state.copy()
+            rules.apply(state, action)
+            for clan in self.turns:
+                rules.apply(state, rng.choice(rules.legal_actions(state, graph, clan)))
+            reward = table.get(state.hash)
+            if reward is None:
+                reward = rules.reward(state, graph, self.clan)
+                table.store(state.hash, reward)
+            rewards.append(reward)
+        return _BatchResult(rewards, os.getpid(), table.stats())
+
+
+@lru_cache(maxsize=None)
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """The pool of `workers` processes of the planner, started on the first use."""
+    return ProcessPoolExecutor(workers)
+
+
+_searches = count()
+# rollouts of the latest searches run by the process, by their keys
+_rollouts: t.Dict[t.Tuple[int, int], _Rollouts] = OrderedDict()
+_ROLLOUTS_KEPT = 4
+
+
+def _run_batch(search: t.Tuple[int, int],
+               setup: t.Optional[tuple],
+               actions: t.Sequence[Action],
+               seed: int,
+               until: t.Optional[float]) -> t.Optional[_BatchResult]:
+    """
+    Runs a batch of the search; the rollouts (and the transposition table) of a search are
+    set up by the first of its batches with the `setup` run by the process. Returns `None`
+    if the process has no rollouts of the search nor the setup, so the batch is resubmitted
+    with it.
+    """
+    rollouts = _rollouts.get(search)
+    if rollouts is None:
+        if setup is None:
+            return None
+        rollouts = _rollouts[search] = _Rollouts(*setup)
+        if len(_rollouts) > _ROLLOUTS_KEPT:
+            _rollouts.popitem(last=False)
+    return rollouts.run(actions, seed, until)
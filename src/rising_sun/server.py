@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio front end serving game requests of `rising_sun.handlers` concurrently, as JSON lines
+over TCP: `{"id": 1, "game": ["context", 1], "action": {...}}` is answered with
+`{"id": 1, "result": ...}` or `{"id": 1, "error": "..."}`.
+
+* actions of a game are resolved one at a time, under the lock of the game (in the threads
+  of the `executor` of the server, if given),
+* games requested within the same iteration of the event loop are read with a single query,
+* requests over `max_pending` are rejected at once (`"error": "overloaded"`) and a connection
+  stops being read while it has `max_per_connection` requests in progress.
+"""
+import asyncio
+import json
+import typing as t
+from collections import defaultdict
+from concurrent.futures import Executor
+from weakref import WeakValueDictionary
+
+from rising_sun import db_repo, handlers
+from rising_sun.models import Game
+
+GameKey = t.Tuple[str, int]
+
+
+class Overloaded(Exception):
+    pass
+
+
+class BatchLoader:
+    """
+    Coalesces loads of keys requested in the same iteration of the event loop into one call
+    of `load_many` (keys -> mapping of the found ones); concurrent loads of a key share it.
+
+    >>> calls = []
+    >>> def load_many(keys):
+    ...     calls.append(sorted(keys))
+    ...     return {key: key * 10 for key in keys if key < 3}
+    >>> async def main():
+    ...     loader = BatchLoader(load_many)
+    ...     return await asyncio.gather(*(loader.load(key) for key in (1, 2, 1, 3)))
+    >>> asyncio.run(main()), calls
+    ([10, 20, 10, None], [[1, 2, 3]])
+    """
+
+    def __init__(self,
+                 load_many: t.Callable[[t.List[t.Hashable]], t.Mapping[t.Hashable, t.Any]],
+                 max_batch_size: int = 100,
+                 executor: t.Optional[Executor] = None):
+        self.load_many = load_many
+        self.max_batch_size = max_batch_size
+        self.executor = executor
+        self.batches = 0
+        self.keys = 0
+        self._queue: t.Dict[t.Hashable, asyncio.Future] = {}
+        self._scheduled = False
+
+    async def load(self, key: t.Hashable) -> t.Any:
+        future = self._queue.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._queue[key] = loop.create_future()
+            if len(self._queue) >= self.max_batch_size:
+                self._dispatch()
+            elif not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        self._scheduled = False
+        queue, self._queue = self._queue, {}
+        if queue:
+            asyncio.ensure_future(self._load(queue))
+
+    async def _load(self, queue: t.Dict[t.Hashable, asyncio.Future]) -> None:
+        self.batches += 1
+        self.keys += len(queue)
+        try:
+            if self.executor is None:
+                found = self.load_many(list(queue))
+            else:
+                loop = asyncio.get_running_loop()
+                found = await loop.run_in_executor(self.executor, self.load_many, list(queue))
+        except Exception as e:
+            for future in queue.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in queue.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+def load_games(keys: t.Iterable[GameKey]) -> t.Dict[GameKey, Game]:
+    """
+    One query per context of the games, in the (thread-local) session of the calling thread,
+    which is removed afterwards: games are read anew by each batch and handed out detached,
+    rather than kept by the sessions of executor threads from one batch to the next.
+    """
+    ids = defaultdict(list)
+    for context, game_id in keys:
+        ids[context].append(game_id)
+    games = {}
+    try:
+        for context, context_ids in ids.items():
+            for game in Game.query.filter(Game.context == context, Game.id.in_(context_ids)):
+                games[game.context, game.id] = game
+    finally:
+        db_repo.session.remove()
+    return games
+
+
+class GameServer:
+    """
+    With the default (in-memory) database, games are read & their actions resolved in the thread
+    of the event loop; pass an `executor` to do it in other threads, if the DB is shared by them.
+    """
+
+    def __init__(self,
+                 max_pending: int = 1000,
+                 max_per_connection: int = 64,
+                 load_many: t.Callable[[t.List[GameKey]], t.Mapping[GameKey, Game]] = load_games,
+                 executor: t.Optional[Executor] = None):
+        self.max_pending = max_pending
+        self.max_per_connection = max_per_connection
+        self.executor = executor
+        self.loader = BatchLoader(load_many, executor=executor)
+        self.pending = 0
+        self.handled = 0
+        self.rejected = 0
+        self._locks: t.MutableMapping[GameKey, asyncio.Lock] = WeakValueDictionary()
+
+    def lock(self, key: GameKey) -> asyncio.Lock:
+        found = self._locks.get(key)
+        if found is None:
+            found = self._locks[key] = asyncio.Lock()
+        return found
+
+    async def handle(self, request: t.Mapping) -> t.Any:
+        """Resolves the action of the request on its game; raises `Overloaded` or `LookupError`."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(f"{self.pending} requests pending")
+        self.pending += 1
+        try:
+            key = tuple(request['game'])
+            game = await self.loader.load(key)
+            if game is None:
+                raise LookupError(f"No game {key}")
+            action = request.get('action') or handlers.get_action(request)
+            async with self.lock(key):
+                result = handlers.build_response(await self._resolve(game, action))
+            self.handled += 1
+            return result
+        finally:
+            self.pending -= 1
+
+    async def _resolve(self, game: Game, action: dict) -> t.Any:
+        if self.executor is None:
+            return game.resolve(action)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, game.resolve, action)
+
+    def stats(self) -> dict:
+        return {
+            'handled': self.handled,
+            'rejected': self.rejected,
+            'pending': self.pending,
+            'batches': self.loader.batches,
+            'keys_per_batch': (
+                self.loader.keys / self.loader.batches if self.loader.batches else 0.
+            ),
+        }
+
+    async def serve_connection(self,
+                               reader: asyncio.StreamReader,
+                               writer: asyncio.StreamWriter) -> None:
+        slots = asyncio.Semaphore(self.max_per_connection)
+        tasks = set()
+        try:
+            while True:
+                await slots.acquire()  # stops reading the connection (TCP backpressure)
+                line = await reader.readline()
+                if not line:
+                    slots.release()
+                    break
+                task = asyncio.ensure_future(self._respond(line, writer, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def _respond(self,
+                       line: bytes,
+                       writer: asyncio.StreamWriter,
+                       slots: asyncio.Semaphore) -> None:
+        request = {}
+        try:
+            try:
+                request = json.loads(line)
+                response = {'id': request.get('id'), 'result': await self.handle(request)}
+            except Overloaded:
+                response = {'id': request.get('id'), 'error': 'overloaded'}
+            except Exception as e:  # the connection serves other requests still
+                response = {'id': request.get('id'), 'error': str(e) or type(e).__name__}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        finally:
+            slots.release()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """Starts listening; `port=0` picks a free port, see `sockets` of the returned server."""
+        return await asyncio.start_server(self.serve_connection, host, port)
+
+
+def create_games(context: str, count: int) -> t.List[GameKey]:
+    """Stand-in setup: `count` games of the context in the DB."""
+    db_repo.create_tables()
+    db_repo.add_all([Game(context=context, id=i) for i in range(count)])
+    return [(context, i) for i in range(count)]
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8765, **options) -> None:
+    server = await GameServer(**options).start(host, port)
+    async with server:
+        await server.serve_forever()
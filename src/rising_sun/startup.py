@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Startup-time report: stages of getting a game server (or a test worker) ready, each timed
+in a fresh interpreter, along with the slowest imports (`python -X importtime`).
+
+    python -m rising_sun startup
+"""
+import json
+import subprocess
+import sys
+import typing as t
+
+STAGES: t.Tuple[t.Tuple[str, str], ...] = (
+    ('import rising_sun', 'import rising_sun'),
+    ('import models', 'import rising_sun.models'),
+    ('load config', "rising_sun.config_repo.load_config('battle_workout.yaml')"),
+    ('create engine', 'rising_sun.db_repo.engine'),
+    ('create tables', 'rising_sun.db_repo.create_tables()'),
+    ('first query', 'rising_sun.models.Game.query.count()'),
+)
+
+_SCRIPT = '''
+import json, sys
+from time import perf_counter
+timings = []
+for name, statement in json.loads(sys.argv[1]):
+    started = perf_counter()
+    exec(statement)
+    timings.append((name, perf_counter() - started))
+print(json.dumps(timings))
+'''
+
+
+class StartupReport(t.NamedTuple):
+    stages: t.List[t.Tuple[str, float]]  # seconds per stage, in order
+    imports: t.List[t.Tuple[str, float]]  # root packages by cumulative seconds, the slowest first
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.stages)
+
+    def format(self) -> str:
+        lines = [f'{name:<20} {seconds * 1000:8.1f} ms' for name, seconds in self.stages]
+        lines.append(f'{"total":<20} {self.total * 1000:8.1f} ms')
+        lines.append('')
+        lines.extend(f'{module:<40} {seconds * 1000:8.1f} ms' for module, seconds in self.imports)
+        return '\n'.join(lines)
+
+
+def profile_startup(stages: t.Sequence[t.Tuple[str, str]] = STAGES,
+                    top: int = 10) -> StartupReport:
+    """
+    >>> report = profile_startup(STAGES[:1], top=3)
+    >>> [name for name, _ in report.stages], len(report.imports) <= 3
+    (['import rising_sun'], True)
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _SCRIPT, json.dumps(stages)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    stages = [tuple(stage) for stage in json.loads(process.stdout.splitlines()[-1])]
+    return StartupReport(stages, _slowest_imports(process.stderr, top))
+
+
+def _slowest_imports(importtime: str, top: int) -> t.List[t.Tuple[str, float]]:
+    """
+    Parses `import time: self [us] | cumulative | imported module` lines into cumulative
+    times of root packages (the time of the outermost import of any of their modules).
+    """
+    imports = {}
+    for line in importtime.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        package = fields[2].strip().split('.')[0]
+        imports[package] = max(imports.get(package, 0.), int(fields[1]) / 1e6)
+    return sorted(imports.items(), key=lambda item: -item[1])[:top]
+
+
+def main() -> StartupReport:
+    report = profile_startup()
+    print(report.format())
+    return report
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Compact, array-backed state of a game for search: planners copy, hash & compare it
+instead of ORM rows. All the values live in a single `int32` array, so a copy is one
+`memcpy` and the full hash is one vectorized reduction; names are translated to indexes
+by the `StateLayout`, shared by all the states of a game.
+"""
+import typing as t
+from enum import IntEnum
+
+import numpy as np
+
+from rising_sun import config_repo
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.models.war_phase import AdvantageBid
+
+NONE = -1
+_MASK = (1 << 64) - 1
+
+
+class Phase(IntEnum):
+    TEA_CEREMONY = 0
+    POLITICAL = 1
+    WAR = 2
+    CLEANUP = 3
+
+
+def _mix(value: int) -> int:
+    """
+    SplitMix64 finalizer, hashing a single (slot key + value).
+
+    >>> _mix(1) == int(_mix_array(np.array([1], dtype=np.uint64))[0])
+    True
+    """
+    value = (value + 0x9E3779B97F4A7C15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+def _mix_array(values: np.ndarray) -> np.ndarray:
+    """Vectorized `_mix` (unsigned arithmetic of numpy wraps around, as the masks above)."""
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class StateLayout:
+    """
+    Numbering of clans, locations (regions of the map, then reserves of the clans),
+    advantages & figures of a game, and offsets of the fields in `GameState.data`:
+    `locations`, `owners` & `controllers` of figures, `coins` & `honor` of clans and
+    `bids` (clans x advantages) and the `phase` of the season. A missing value
+    (ie. the location of a figure out of the game) is -1.
+    """
+    __slots__ = (
+        'context', 'clans', 'locations', 'advantages', 'figure_ids',
+        'clan_index', 'location_index', 'advantage_index', 'figure_index',
+        'offsets', 'size', 'keys',
+    )
+
+    def __init__(self,
+                 context: t.Optional[str],
+                 clans: t.Sequence[str],
+                 regions: t.Sequence[str],
+                 advantages: t.Sequence[str],
+                 figure_ids: t.Sequence[int],
+                 seed: int = 0):
+        self.context = context
+        self.clans = tuple(clans)
+        self.locations = tuple(regions) + self.clans
+        self.advantages = tuple(advantages)
+        self.figure_ids = tuple(figure_ids)
+        self.clan_index = {name: i for i, name in enumerate(self.clans)}
+        self.location_index = {name: i for i, name in enumerate(self.locations)}
+        self.advantage_index = {name: i for i, name in enumerate(self.advantages)}
+        self.figure_index = {figure_id: i for i, figure_id in enumerate(self.figure_ids)}
+        figures, clans = len(self.figure_ids), len(self.clans)
+        sizes = (
+            ('locations', figures),
+            ('owners', figures),
+            ('controllers', figures),
+            ('coins', clans),
+            ('honor', clans),
+            ('bids', clans * len(self.advantages)),
+            ('phase', 1),
+        )
+        self.offsets = {}
+        offset = 0
+        for field, size in sizes:
+            self.offsets[field] = (offset, offset + size)
+            offset += size
+        self.size = offset
+        # a random key per slot of the data; the seed keeps hashes equal across processes
+        rng = np.random.default_rng(seed)
+        self.keys = rng.integers(0, 2 ** 63, size=self.size, dtype=np.uint64)
+
+    @classmethod
+    def from_models(cls,
+                    context: t.Optional[str],
+                    clans: t.Iterable[Clan],
+                    figures: t.Iterable[Figure]) -> 'StateLayout':
+        """
+        Regions & advantages come from the config of the context, clans & figures from the DB.
+        """
+        board_map, = config_repo.lookup('Map', 'context', context)
+        advantages = sorted(a.name for a in config_repo.lookup('Advantage', 'context', context))
+        return cls(
+            context,
+            sorted(clan.name for clan in clans),
+            [region.name for region in board_map.regions],
+            advantages,
+            sorted(figure.id for figure in figures),
+        )
+
+    def slot(self, field: str, index: int) -> int:
+        start, end = self.offsets[field]
+        assert 0 <= index < end - start, f"{field}[{index}] out of the layout"
+        return start + index
+
+
+class GameState:
+    """
+    Mutate the state only with its methods, which keep `hash` up to date in O(1): it is
+    the XOR of mixed `key + value` of all the slots (Zobrist-like), so a change of a slot
+    replaces its term. States of the same layout are equal iff their data are equal.
+
+    >>> layout = StateLayout(None, ['Fox', 'Koi'], ['Edo', 'Kansai'], ['Seppuku'], [1, 2, 3])
+    >>> state = GameState.initial(layout, coins=[4, 5], honor=[6, 1])
+    >>> state.move_figure(1, 'Edo', owner='Koi')
+    >>> state.move_figure(2, 'Edo', owner='Koi')
+    >>> state.move_figure(3, 'Kansai', owner='Fox')
+    >>> state.figures_per_location()
+    array([[0, 1, 0, 0],
+           [2, 0, 0, 0]])
+    >>> other = state.copy()
+    >>> other.add_coins('Koi', -2); other.place_bid('Koi', 'Seppuku', 2)
+    >>> other == state, other.coins.tolist(), other.bids.tolist()
+    (False, [4, 3], [[0], [2]])
+    >>> other.add_coins('Koi', 2); other.place_bid('Koi', 'Seppuku', 0)
+    >>> other == state, other.hash == state.hash == state.full_hash()
+    (True, True)
+    """
+    __slots__ = ('layout', 'data', 'hash')
+
+    def __init__(self, layout: StateLayout, data: np.ndarray, hash_: t.Optional[int] = None):
+        self.layout = layout
+        self.data = data
+        self.hash = self.full_hash() if hash_ is None else hash_
+
+    @classmethod
+    def initial(cls,
+                layout: StateLayout,
+                coins: t.Sequence[int] = None,
+                honor: t.Sequence[int] = None) -> 'GameState':
+        """All figures out of the game, without owners; no bids, at the tea ceremony."""
+        data = np.full(layout.size, NONE, dtype=np.int32)
+        data[layout.offsets['coins'][0]:] = 0
+        state = cls(layout, data, 0)
+        if coins is not None:
+            state.coins[:] = coins
+        if honor is not None:
+            state.honor[:] = honor
+        state.hash = state.full_hash()
+        return state
+
+    @classmethod
+    def from_models(cls,
+                    context: t.Optional[str],
+                    clans: t.Sequence[Clan],
+                    figures: t.Sequence[Figure],
+                    bids: t.Iterable[AdvantageBid] = (),
+                    layout: StateLayout = None) -> 'GameState':
+        """
+        Clans without persisted coins or honor start with the ones of their `ClanType`.
+        Pass the `layout` of another state of the game to share it.
+        """
+        layout = layout or StateLayout.from_models(context, clans, figures)
+        clans = sorted(clans, key=lambda clan: layout.clan_index[clan.name])
+        state = cls.initial(
+            layout,
+            coins=[
+                clan.type.starting_coins if clan.coins is None else clan.coins for clan in clans
+            ],
+            honor=[
+                clan.type.starting_honor if clan.honor is None else clan.honor for clan in clans
+            ],
+        )
+        index = layout.figure_index
+        for figure in figures:
+            i = index[figure.id]
+            state.locations[i] = _index_of(layout.location_index, figure.location)
+            state.owners[i] = _index_of(layout.clan_index, figure.owner_name)
+            state.controllers[i] = _index_of(layout.clan_index, figure.controller_name)
+        for bid in bids:
+            clan = layout.clan_index[bid.clan_name]
+            state.bids[clan, layout.advantage_index[bid.advantage_name]] = bid.coins
+        state.hash = state.full_hash()
+        return state
+
+    @classmethod
+    def load(cls, context: t.Optional[str]) -> 'GameState':
+        """State of the game of the context, as persisted in the DB."""
+        return cls.from_models(
+            context,
+            Clan.query.filter_by(context=context).all(),
+            Figure.query.filter_by(context=context).all(),
+            AdvantageBid.query.filter_by(context=context).all(),
+        )
+
+    def update_models(self,
+                      clans: t.Iterable[Clan],
+                      figures: t.Iterable[Figure],
+                      bids: t.Iterable[AdvantageBid] = ()) -> t.List[AdvantageBid]:
+        """
+        Writes the state back to the rows of the game; returns new (not yet added) rows
+        of bids, which have no row so far.
+        """
+        layout = self.layout
+        for clan in clans:
+            i = layout.clan_index[clan.name]
+            clan.coins, clan.honor = int(self.coins[i]), int(self.honor[i])
+        for figure in figures:
+            i = layout.figure_index[figure.id]
+            figure.location = _name_of(layout.locations, self.locations[i])
+            figure.owner_name = _name_of(layout.clans, self.owners[i])
+            figure.controller_name = _name_of(layout.clans, self.controllers[i])
+        existing = set()
+        for bid in bids:
+            clan = layout.clan_index[bid.clan_name]
+            advantage = layout.advantage_index[bid.advantage_name]
+            bid.coins = int(self.bids[clan, advantage])
+            existing.add((clan, advantage))
+        return [
+            AdvantageBid(
+                context=layout.context,
+                clan_name=layout.clans[clan],
+                advantage_name=layout.advantages[advantage],
+                coins=int(self.bids[clan, advantage]),
+            )
+            for clan, advantage in zip(*np.nonzero(self.bids))
+            if (clan, advantage) not in existing
+        ]
+
+    def copy(self) -> 'GameState':
+        return GameState(self.layout, self.data.copy(), self.hash)
+
+    def full_hash(self) -> int:
+        """Hash computed from scratch; `hash` is kept equal to it by the mutating methods."""
+        values = self.layout.keys + self.data.astype(np.int64).astype(np.uint64)
+        return int(np.bitwise_xor.reduce(_mix_array(values), initial=np.uint64(0)))
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return (
+            self.layout is other.layout and
+            self.hash == other.hash and
+            np.array_equal(self.data, other.data)
+        )
+
+    def _field(self, name: str) -> np.ndarray:
+        start, end = self.layout.offsets[name]
+        return self.data[start:end]
+
+    @property
+    def locations(self) -> np.ndarray:
+        return self._field('locations')
+
+    @property
+    def owners(self) -> np.ndarray:
+        return self._field('owners')
+
+    @property
+    def controllers(self) -> np.ndarray:
+        return self._field('controllers')
+
+    @property
+    def coins(self) -> np.ndarray:
+        return self._field('coins')
+
+    @property
+    def honor(self) -> np.ndarray:
+        return self._field('honor')
+
+    @property
+    def bids(self) -> np.ndarray:
+        return self._field('bids').reshape(len(self.layout.clans), len(self.layout.advantages))
+
+    @property
+    def phase(self) -> Phase:
+        return Phase(int(self.data[self.layout.offsets['phase'][0]]))
+
+    def set_phase(self, phase: Phase) -> None:
+        self.set('phase', 0, int(phase))
+
+    def set(self, field: str, index: int, value: int) -> None:
+        """Sets a single slot, updating the hash incrementally."""
+        slot = self.layout.slot(field, index)
+        old = int(self.data[slot])
+        if old == value:
+            return
+        key = int(self.layout.keys[slot])
+        self.hash ^= _mix((key + (old & _MASK)) & _MASK) ^ _mix((key + (value & _MASK)) & _MASK)
+        self.data[slot] = value
+
+    def move_figure(self,
+                    figure_id: int,
+                    location: t.Optional[str],
+                    owner: str = None,
+                    controller: str = None) -> None:
+        """
+        Moves the figure (out of the game with `location=None`); the owner controls it
+        by default.
+        """
+        layout = self.layout
+        i = layout.figure_index[figure_id]
+        self.set('locations', i, _index_of(layout.location_index, location))
+        if owner is not None:
+            self.set('owners', i, layout.clan_index[owner])
+        if controller is not None or owner is not None:
+            self.set('controllers', i, layout.clan_index[controller or owner])
+
+    def add_coins(self, clan: str, delta: int) -> None:
+        i = self.layout.clan_index[clan]
+        self.set('coins', i, int(self.coins[i]) + delta)
+
+    def add_honor(self, clan: str, delta: int) -> None:
+        i = self.layout.clan_index[clan]
+        self.set('honor', i, int(self.honor[i]) + delta)
+
+    def place_bid(self, clan: str, advantage: str, coins: int) -> None:
+        layout = self.layout
+        clan_index, advantage_index = layout.clan_index[clan], layout.advantage_index[advantage]
+        index = clan_index * len(layout.advantages) + advantage_index
+        self.set('bids', index, coins)
+
+    def figures_per_location(self, by: str = 'controllers') -> np.ndarray:
+        """
+        Number of figures per clan (rows) per location (columns), counted by controllers
+        or owners.
+        """
+        layout = self.layout
+        clans, locations = self._field(by), self.locations
+        in_game = (clans >= 0) & (locations >= 0)
+        counts = np.bincount(
+            clans[in_game] * len(layout.locations) + locations[in_game],
+            minlength=len(layout.clans) * len(layout.locations),
+        )
+        return counts.reshape(len(layout.clans), len(layout.locations))
+
+    def figures_at(self, location: str) -> t.List[int]:
+        """Ids of the figures at the location."""
+        index = self.layout.location_index[location]
+        return [self.layout.figure_ids[i] for i in np.flatnonzero(self.locations == index)]
+
+
+def _index_of(index: t.Mapping[str, int], name: t.Optional[str]) -> int:
+    return NONE if name is None else index[name]
+
+
+def _name_of(names: t.Sequence[str], index: int) -> t.Optional[str]:
+    return None if index == NONE else names[index]
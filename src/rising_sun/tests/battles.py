@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from rising_sun import config_repo
+from rising_sun.battles import Conflicts, region_rewards, simulate
+
+
+def test_simulate_sampled_conflicts():
+    config_repo.load_config('battle_workout.yaml', context='battles')
+    names, rewards = region_rewards('battles')
+    assert names == ('Edo', 'Shikoku', 'Kansai')
+    assert rewards.tolist() == [[0, 1, 1, 0], [0, 0, 3, 0], [3, 0, 0, 0]]
+    conflicts = Conflicts.sample(10000, clans=3, regions=len(names))
+    outcomes = simulate(conflicts, rewards)
+    # a battle is not fought only if no figure is left
+    fought = outcomes.winners >= 0
+    assert (outcomes.losses.sum(axis=1)[~fought] == conflicts.figures.sum(axis=1)[~fought]).all()
+    assert (outcomes.losses <= conflicts.figures).all()
+    # coins are paid or moved between clans; only regions give new ones
+    gained = np.where(fought, rewards[conflicts.regions, 1], 0)
+    assert (outcomes.coins.sum(axis=1) <= gained).all()
+    distribution = outcomes.distribution()
+    assert np.isclose(distribution['wins'].sum(), fought.mean())
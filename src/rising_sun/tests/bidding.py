@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from rising_sun import config_repo
+from rising_sun.battles import region_rewards
+from rising_sun.bidding import advantage_bids, BidSolver, Contests
+
+
+def test_bid_solver_equilibrium():
+    config_repo.load_config('battle_workout.yaml', context='bidding')
+    names, rewards = region_rewards('bidding')
+    contests = Contests(
+        regions=np.arange(len(names)),
+        figures=np.array([[2, 2, 0], [1, 2, 1], [3, 1, 2]]),
+        ronins=np.array([[1, 0, 0], [0, 2, 0], [1, 1, 1]]),
+        honor=np.array([2, 0, 1]),
+    )
+    solver = BidSolver(contests, rewards, coins=[4, 3, 5])
+    solution = solver.equilibrium(seconds=5)
+    assert solution.bids.shape == (3, 3, 4)
+    assert (solution.bids.sum(axis=(0, 2)) <= solver.coins).all()
+    # clans bid only where they fight
+    assert not solution.bids[contests.figures == 0].any()
+    assert solution.values.tolist() == solver.values(solution.bids).tolist()
+    # no clan gains more than the regret by a best response, nor loses by it
+    gains = [
+        solver.best_response(clan, solution.bids)[1] - solution.values[clan] for clan in range(3)
+    ]
+    assert 0 <= min(gains) and np.isclose(max(gains), solution.regret)
+    assert solution.converged == (solution.regret == 0)
+    assert solver.region_values.cache_info().hits > 0
+    rows = advantage_bids('bidding', ['Koi', 'Fox', 'Dragonfly'], solution.bids[2])
+    advantages = {'Seppuku', 'Take hostage', 'Hire ronin', 'Imperial poets'}
+    assert {row.advantage_name for row in rows} <= advantages
+    assert sum(row.coins for row in rows) == solution.bids[2].sum()
+
+
+def test_bid_solver_equilibrium_without_budget():
+    contests = Contests(
+        regions=np.array([0]),
+        figures=np.array([[2, 2]]),
+        ronins=np.zeros((1, 2), dtype=int),
+        honor=np.array([0, 1]),
+    )
+    solver = BidSolver(contests, rewards=np.array([[3, 0, 0, 0]]), coins=[2, 2])
+    initial = np.zeros((1, 2, 4), dtype=int)
+    initial[0, 0, 0] = 1
+    for solution in (
+        solver.equilibrium(initial, seconds=0),
+        solver.equilibrium(initial, max_iterations=0),
+    ):
+        assert solution.bids.tolist() == initial.tolist()
+        assert solution.values.tolist() == solver.values(initial).tolist()
+        assert solution.regret == np.inf
+        assert (solution.iterations, solution.converged) == (0, False)
+    assert solver.region_values.cache_info().misses == 0
+
+
+def test_bid_solver_best_response_to_bids_of_any_int_dtype():
+    contests = Contests(
+        regions=np.array([0]),
+        figures=np.array([[2, 2]]),
+        ronins=np.zeros((1, 2), dtype=int),
+        honor=np.array([0, 1]),
+    )
+    solver = BidSolver(contests, rewards=np.array([[3, 0, 0, 0]]), coins=[2, 2])
+    bids = np.zeros((1, 2, 4), dtype=np.int64)
+    bids[0, 1, 0] = 1
+    responses = [
+        solver.best_response(0, bids.astype(dtype)) for dtype in (np.int64, np.int32, np.int16)
+    ]
+    assert all(response.tolist() == responses[0][0].tolist() for response, _ in responses)
+    assert len({value for _, value in responses}) == 1
+    assert solver.region_values.cache_info().misses == 1
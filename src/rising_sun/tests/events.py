@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from rising_sun import config_repo
+from rising_sun.events import GameHistory
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.models.game import Game
+from rising_sun.planner import Rules
+from rising_sun.state import GameState, StateLayout
+
+
+def test_game_history_replays_from_snapshots(tmp_path):
+    board_map, = config_repo.lookup('Map', 'context', None)
+    clans = [Clan(name='Koi'), Clan(name='Fox')]
+    figures = [
+        Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi'),
+        Figure(id=2, location='Kansai', owner_name='Fox', controller_name='Fox'),
+    ]
+    initial = GameState.from_models(None, clans, figures)
+    history = GameHistory(str(tmp_path / 'game'), initial.layout, initial, snapshot_every=8)
+    rules, rng = Rules(), random.Random(0)
+    states = [initial.copy()]
+    for turn in range(50):
+        clan = ('Koi', 'Fox')[turn % 2]
+        actions = rules.legal_actions(history.state, board_map.graph, clan)
+        history.record(rng.choice(actions).as_dict())
+        states.append(history.state.copy())
+    assert history.snapshots.turns == list(range(0, 51, 8))
+    assert all(history.state_at(turn) == state for turn, state in enumerate(states))
+    history.close()
+
+    reopened = GameHistory(str(tmp_path / 'game'), initial.layout)
+    assert reopened.turn == 50 and reopened.state == states[-1]
+    branch = reopened.branch(20, str(tmp_path / 'branch'))
+    assert branch.turn == 20 and branch.state == states[20]
+    assert branch.snapshots.turns == [0, 8, 16]
+
+
+def test_game_history_passes_over_invalid_snapshots(tmp_path):
+    clans = [Clan(name='Koi'), Clan(name='Fox')]
+    figures = [Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi')]
+    initial = GameState.from_models(None, clans, figures)
+    path = str(tmp_path / 'game')
+    history = GameHistory(path, initial.layout, initial, snapshot_every=2)
+    for location in initial.layout.locations[:4]:
+        history.record({'type': 'move', 'clan': 'Koi', 'figure_id': 1, 'location': location})
+    assert history.snapshots.turns == [0, 2, 4]
+    states = [history.state_at(turn) for turn in range(5)]
+    history.close()
+    with open(f'{path}.snapshots', 'r+b') as snapshots:  # a flipped byte of the latest one
+        snapshots.seek(-1, 2)
+        last = snapshots.read(1)
+        snapshots.seek(-1, 2)
+        snapshots.write(bytes([last[0] ^ 1]))
+
+    reopened = GameHistory(path, initial.layout)
+    assert reopened.state == states[4] and reopened.state_at(3) == states[3]
+    reopened.close()
+    # snapshots of states of another layout
+    other = StateLayout(None, ['Fox', 'Koi'], ['Edo', 'Kansai'], ['Seppuku'], [1])
+    with pytest.raises(AssertionError, match='No valid snapshot'):
+        GameHistory(path, other)
+
+
+def test_game_history_keeps_the_state_of_the_log(tmp_path):
+    class StrictRules(Rules):
+        def apply(self, state, action):
+            super().apply(state, action)
+            assert (state.coins >= 0).all(), "Not enough coins"
+
+    clans = [Clan(name='Koi'), Clan(name='Fox')]
+    figures = [Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi')]
+    initial = GameState.from_models(None, clans, figures)
+    game = Game(context='history', id=3)
+    history = GameHistory.for_game(game, str(tmp_path), initial, rules=StrictRules(),
+                                   snapshot_every=8)
+    assert history.path == str(tmp_path / 'history' / 'game-3')
+    history.record({'type': 'move', 'clan': 'Koi', 'figure_id': 1, 'location': 'Kansai'})
+    advantage = initial.layout.advantages[0]
+    with pytest.raises(AssertionError):  # once the bid is placed & paid
+        history.record({'type': 'bid', 'clan': 'Koi', 'advantage': advantage, 'coins': 99})
+    assert history.turn == 1 and history.state == history.state_at(1)
+    assert history.state.figures_at('Kansai') == [1]
+    history.close()
+
+    reopened = GameHistory.for_game(game, str(tmp_path), initial)
+    assert reopened.turn == 1 and reopened.state == history.state
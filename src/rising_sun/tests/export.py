@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import io
+import sys
+
+import pytest
+
+from rising_sun import config_repo, db_repo
+from rising_sun.export import dump_context, dump_game, load_context, load_game
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.server import create_games
+
+
+def test_game_export_round_trip():
+    create_games('exported', 1)
+    db_repo.bulk_insert('Clan', [{'context': 'exported', 'name': 'Koi', 'coins': 3}])
+    figure = {'context': 'exported', 'type_name': 'Bushi', 'location': 'Edo', 'owner_name': 'Koi'}
+    db_repo.bulk_insert('Figure', (dict(figure, id=i) for i in range(20)))
+    stream = io.StringIO()
+    assert dump_game('exported', stream, chunk_size=8) == 22
+    assert load_game(io.StringIO(stream.getvalue()), context='imported') == 22
+    clan, = Clan.query.filter_by(context='imported')
+    assert (clan.name, clan.coins, clan.honor) == ('Koi', 3, None)
+    figures = Figure.query.filter_by(context='imported').order_by(Figure.id).all()
+    assert [(f.id, f.location, f.owner_name) for f in figures] == [
+        (i, 'Edo', 'Koi') for i in range(20)
+    ]
+
+
+def test_frozen_context_export(monkeypatch):
+    config_repo.load_config('battle_workout.yaml', context='frozen export')
+    config_repo.freeze_context('frozen export')
+    stream = io.StringIO()
+    try:
+        assert dump_context('frozen export', stream) > 0
+        load_context(io.StringIO(stream.getvalue()), 'thawed')
+        frozen_map, = config_repo.lookup('Map', 'context', 'frozen export')
+        thawed_map, = config_repo.lookup('Map', 'context', 'thawed')
+        names = [region.name for region in frozen_map.regions]
+        assert [region.name for region in thawed_map.regions] == names
+        assert thawed_map.regions[0] is config_repo.get('Region', ('thawed', names[0]))
+        # a clear error without the optional package
+        monkeypatch.setitem(sys.modules, 'msgpack', None)
+        with pytest.raises(ImportError, match='pip install msgpack'):
+            dump_context('frozen export', io.BytesIO(), format='msgpack')
+    finally:
+        config_repo.unload_context('frozen export')
+        config_repo.unload_context('thawed')
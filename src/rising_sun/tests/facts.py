@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import event
+
+from rising_sun import config_repo, db_repo
+from rising_sun.facts import FactBase
+from rising_sun.models.figure import Figure
+
+
+def test_fact_base_follows_flushed_figures():
+    config_repo.load_config('battle_workout.yaml', context='facts')
+    facts = FactBase.from_config('facts')
+    factory = db_repo.session.session_factory
+    facts.listen(factory)
+    try:
+        other = Figure(context='other facts', id=1, type_name='Bushi', location='Kansai',
+                       controller_name='Fox')
+        figure = Figure(
+            context='facts', id=1, type_name='Bushi', location='Edo', controller_name='Koi'
+        )
+        db_repo.add_all([other, figure])
+        assert facts.ask('present', 'Koi', 'Edo')
+        assert not facts.ask('present', 'Fox', 'Kansai')
+        figure.location = 'Shikoku'
+        db_repo.session.commit()
+        assert not facts.ask('present', 'Koi', 'Edo')
+        assert sorted(facts.query('reaches', 'Koi', None)) == [('Koi', 'Edo'), ('Koi', 'Kansai')]
+    finally:
+        _unlisten(facts, factory)
+        config_repo.unload_context('facts')
+
+
+def test_fact_base_drops_flushed_figures_rolled_back():
+    config_repo.load_config('battle_workout.yaml', context='rolled back facts')
+    facts = FactBase.from_config('rolled back facts')
+    factory = db_repo.session.session_factory
+    facts.listen(factory)
+    try:
+        figure = Figure(context='rolled back facts', id=1, type_name='Bushi', location='Edo',
+                        controller_name='Koi')
+        db_repo.session.add(figure)
+        db_repo.session.flush()
+        # not committed yet
+        assert not facts.ask('present', 'Koi', 'Edo')
+        db_repo.session.rollback()
+        assert not facts.ask('present', 'Koi', 'Edo')
+        db_repo.session.commit()
+        assert not facts.ask('present', 'Koi', 'Edo')
+        figure = Figure(context='rolled back facts', id=1, type_name='Bushi', location='Edo',
+                        controller_name='Koi')
+        db_repo.add_all([figure])
+        assert facts.ask('present', 'Koi', 'Edo')
+        figure.location = 'Kansai'
+        db_repo.session.flush()
+        db_repo.session.rollback()
+        assert facts.ask('present', 'Koi', 'Edo') and not facts.ask('present', 'Koi', 'Kansai')
+    finally:
+        _unlisten(facts, factory)
+        config_repo.unload_context('rolled back facts')
+
+
+def _unlisten(facts: FactBase, factory) -> None:
+    event.remove(factory, 'after_flush', facts._after_flush)
+    event.remove(factory, 'after_commit', facts._after_commit)
+    event.remove(factory, 'after_rollback', facts._after_rollback)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from rising_sun import get_async_db_repo
+from rising_sun.handlers import create_example_setup_async, handle_example_request_async
+from rising_sun.models import Game
+
+
+def test_async_handlers_serve_concurrent_requests(monkeypatch):
+    pytest.importorskip('sqlalchemy.ext.asyncio')
+    pytest.importorskip('aiosqlite')
+    monkeypatch.setattr(Game, 'resolve', lambda game, action: (game.context, game.id))
+    repo = get_async_db_repo()
+
+    async def main():
+        await create_example_setup_async()
+        try:
+            return await asyncio.gather(*(handle_example_request_async({}) for _ in range(3)))
+        finally:
+            await repo.engine.dispose()
+
+    assert asyncio.run(main()) == [('context', 'id')] * 3
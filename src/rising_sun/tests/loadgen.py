@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from rising_sun.loadgen import run_stand_in
+
+
+def test_load_generator_stand_in():
+    report = asyncio.run(run_stand_in(games=5, requests=202, connections=4, pipeline=4))
+    assert report['requests'] == 202 and not report['errors']
+    assert report['p99_ms'] >= report['p50_ms'] > 0
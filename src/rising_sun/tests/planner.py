@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from rising_sun import config_repo
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.planner import _run_batch, get_pool, plan
+from rising_sun.state import GameState
+
+
+def test_plan_in_process_pool():
+    board_map, = config_repo.lookup('Map', 'context', None)
+    clans = [Clan(name='Koi'), Clan(name='Fox')]
+    figures = [
+        Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi'),
+        Figure(id=2, location='Kansai', owner_name='Fox', controller_name='Fox'),
+    ]
+    state = GameState.from_models(None, clans, figures)
+    result = plan(state, board_map.graph, 'Koi', rollouts=256, workers=2, batch_size=16)
+    assert result.stats.rollouts == 256 and result.stats.batches == 16
+    assert result.action in result.stats.actions
+    # the pool outlives a search: the next one (of another clan) reuses it
+    assert get_pool(2) is get_pool(2)
+    timed = plan(
+        state, board_map.graph, 'Fox', rollouts=None, seconds=0.2, workers=2, batch_size=16
+    )
+    # batches running at the deadline stop short
+    assert 0 < timed.stats.rollouts <= 16 * timed.stats.batches
+    assert sum(visits for visits, _ in timed.stats.actions.values()) == timed.stats.rollouts
+    assert all(action.clan == 'Fox' for action in timed.stats.actions)
+    with ProcessPoolExecutor(1) as executor:
+        injected = plan(state, board_map.graph, 'Koi', rollouts=64, workers=1, executor=executor)
+    assert injected.stats.rollouts == 64 and injected.stats.transpositions.lookups == 64
+
+
+def test_plan_sends_the_setup_with_the_first_batches():
+    board_map, = config_repo.lookup('Map', 'context', None)
+    state = GameState.from_models(None, [Clan(name='Koi'), Clan(name='Fox')], [
+        Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi'),
+        Figure(id=2, location='Kansai', owner_name='Fox', controller_name='Fox'),
+    ])
+    setups = []
+
+    class Recording(ThreadPoolExecutor):
+        def submit(self, fn, search, setup, *args):
+            setups.append(setup)
+            return super().submit(fn, search, setup, *args)
+
+    with Recording(1) as executor:
+        result = plan(
+            state, board_map.graph, 'Koi', rollouts=64, workers=1, batch_size=8,
+            executor=executor
+        )
+    assert result.stats.rollouts == 64 and len(setups) == 8
+    assert [setup is not None for setup in setups] == [True, True] + [False] * 6
+    # a worker without the setup of the search leaves the batch to be resubmitted with it
+    assert _run_batch((0, -1), None, [], 0, None) is None
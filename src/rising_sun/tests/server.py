@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+import pytest
+from sqlalchemy import inspect
+
+from rising_sun import db_repo
+from rising_sun.models.game import Game
+from rising_sun.server import create_games, GameServer, load_games, Overloaded
+
+
+def test_server_batches_reads_and_rejects_overload():
+    keys = create_games('serving', 3)
+
+    async def main():
+        server = GameServer(max_pending=4)
+        requests = [{'game': keys[i % 3], 'action': {'type': 'pass'}} for i in range(6)]
+        results = await asyncio.gather(*map(server.handle, requests), return_exceptions=True)
+        return server, results
+
+    server, results = asyncio.run(main())
+    assert sum(isinstance(result, Overloaded) for result in results) == 2
+    assert server.stats()['batches'] == 1 and server.stats()['handled'] == 4
+
+
+def test_load_games_removes_the_session_of_the_batch():
+    keys = create_games('fresh', 2)
+    games = load_games(keys)
+    assert sorted(games) == keys and all(inspect(game).detached for game in games.values())
+    assert not db_repo.session.registry.has()
+    # read anew by the next batch
+    assert all(load_games([key])[key] is not games[key] for key in keys)
+
+
+def test_server_unknown_game():
+    with pytest.raises(LookupError):
+        asyncio.run(GameServer().handle({'game': ['serving', 404]}))
+
+
+def test_server_resolves_actions_of_a_game_one_at_a_time(monkeypatch):
+    keys = create_games('threaded', 2)
+    # read here, as threads of the executor have in-memory DBs of their own
+    games = load_games(keys)
+    running = Counter()
+    overlaps = []
+    lock = threading.Lock()
+
+    def resolve(game, action):
+        with lock:
+            running[game.id] += 1
+            overlaps.append((running[game.id], sum(running.values())))
+        sleep(0.01)
+        with lock:
+            running[game.id] -= 1
+
+    monkeypatch.setattr(Game, 'resolve', resolve)
+
+    async def main():
+        server = GameServer(load_many=lambda keys: games, executor=executor)
+        requests = [{'game': keys[i % 2], 'action': {'type': 'pass'}} for i in range(8)]
+        await asyncio.gather(*map(server.handle, requests))
+        return server
+
+    with ThreadPoolExecutor(4) as executor:
+        server = asyncio.run(main())
+    assert server.stats()['handled'] == 8
+    # never two actions of a game at a time, but actions of both games at once
+    assert max(of_game for of_game, _ in overlaps) == 1
+    assert max(of_all for _, of_all in overlaps) == 2
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.state import GameState
+
+
+def test_game_state_round_trip():
+    clans = [Clan(name='Koi'), Clan(name='Fox', coins=2)]
+    figures = [
+        Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi'),
+        Figure(id=2, location='Fox', owner_name='Fox', controller_name='Fox'),
+        Figure(id=3, location=None),
+    ]
+    state = GameState.from_models(None, clans, figures)
+    assert state.coins.tolist() == [2, 5]
+    assert state.figures_at('Edo') == [1]
+
+    moved = state.copy()
+    moved.move_figure(2, 'Kansai')
+    moved.add_honor('Koi', 2)
+    moved.place_bid('Fox', 'Seppuku', 1)
+    assert moved != state and moved.hash == moved.full_hash()
+    new_bids = moved.update_models(clans, figures)
+    assert figures[1].location == 'Kansai' and figures[2].location is None
+    assert clans[0].honor == 3
+    assert [(b.clan_name, b.advantage_name, b.coins) for b in new_bids] == [('Fox', 'Seppuku', 1)]
+    assert GameState.from_models(None, clans, figures, new_bids, layout=state.layout) == moved
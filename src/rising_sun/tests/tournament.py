@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from rising_sun import config_repo
+from rising_sun.tournament import Bot, run_tournament, Standings
+
+
+def test_tournament_standings_do_not_depend_on_workers():
+    def standings(**options):
+        bots = [Bot('random'), Bot('mc', rollouts=4, depth=1)]
+        result = Standings()
+        for game in run_tournament('full.yaml', bots, games=8, turns=2, **options):
+            result.add(game)
+        return result
+
+    in_process, pooled = standings(), standings(workers=2, batch_size=3)
+    assert pooled.as_dict() == in_process.as_dict()
+    assert in_process.games == 8
+    seats = {name: score.seats for name, score in in_process.bots.items()}
+    assert seats == {'random': 12, 'mc': 12}
+    assert 'tournament' not in config_repo.contexts()
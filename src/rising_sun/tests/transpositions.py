@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.state import GameState, Phase
+
+
+def test_game_state_hash_transpositions():
+    clans = [Clan(name='Koi'), Clan(name='Fox')]
+    figures = [Figure(id=1, location='Edo', owner_name='Koi', controller_name='Koi')]
+    state = GameState.from_models(None, clans, figures)
+    a, b = state.copy(), state.copy()
+    # the same changes, in another order
+    a.move_figure(1, 'Kansai')
+    a.add_coins('Koi', 1)
+    b.add_coins('Koi', 1)
+    b.move_figure(1, 'Kansai')
+    assert a == b and a.hash == b.hash
+    b.set_phase(Phase.WAR)
+    assert a != b and b.phase is Phase.WAR and b.hash == b.full_hash()
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Tournament of bots: self-play games of a config (ie. `battle_workout.yaml` or `full.yaml`),
+played in a pool of processes. Clans are seated by the bots in rotation, figures start
+in the home regions of their clans and each game lasts `turns` turns of all the clans
+(resolved with the stand-in `planner.Rules`). Results stream as games finish, and are
+aggregated into win rates & points of bots (and clans) by `Standings`.
+
+Workers are spawned (not forked), so each of them loads the config into its own context
+and sets the game up on its own in-memory database (a `DbRepo.fork`); games start from
+copies of the `GameState` read from it.
+A game is seeded by its number and the tournament `seed` only, so the standings do not
+depend on the number of workers nor on the order games finish in.
+
+    python -m rising_sun.tournament full.yaml --games 1000 --workers 8 --bot random --bot mc:32:2
+"""
+import argparse
+import random
+import typing as t
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from math import sqrt
+from multiprocessing import get_context
+
+from rising_sun import config_repo, db_repo
+from rising_sun.models.board import MapGraph
+from rising_sun.models.clan import Clan
+from rising_sun.models.figure import Figure
+from rising_sun.models.game import Game
+from rising_sun.planner import Action, plan, Rules
+from rising_sun.state import GameState
+
+CONTEXT = 'tournament'
+
+
+class Bot(t.NamedTuple):
+    """A random player (`rollouts=0`) or a `planner.plan` one, with `rollouts` per decision."""
+    name: str
+    rollouts: int = 0
+    depth: int = 2
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Bot':
+        """
+        >>> Bot.parse('random'), Bot.parse('mc:32:3')
+        (Bot(name='random', rollouts=0, depth=2), Bot(name='mc', rollouts=32, depth=3))
+        """
+        name, *numbers = spec.split(':')
+        return cls(name, *map(int, numbers))
+
+    def act(self,
+            state: GameState,
+            graph: MapGraph,
+            clan: str,
+            rules: Rules,
+            rng: random.Random) -> Action:
+        if not self.rollouts:
+            return rng.choice(rules.legal_actions(state, graph, clan))
+        seed = rng.getrandbits(32)
+        return plan(
+            state, graph, clan, rollouts=self.rollouts, depth=self.depth, seed=seed, rules=rules
+        ).action
+
+
+class GameResult(t.NamedTuple):
+    game: int
+    clans: t.Tuple[str, ...]
+    bots: t.Tuple[str, ...]  # of the clans
+    points: t.Tuple[int, ...]
+    rewards: t.Tuple[float, ...]  # see `Rules.reward`
+
+
+class Score:
+    """Running totals of the seats taken by a bot (or a clan) in the games played."""
+    __slots__ = ('seats', 'wins', 'points', 'squares')
+
+    def __init__(self):
+        self.seats = 0
+        self.wins = 0.
+        self.points = 0
+        self.squares = 0
+
+    def add(self, reward: float, points: int) -> None:
+        self.seats += 1
+        self.wins += reward
+        self.points += points
+        self.squares += points * points
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.seats if self.seats else 0.
+
+    @property
+    def win_rate_error(self) -> float:
+        """Half-width of the 95% confidence interval of the win rate (normal approximation)."""
+        rate = self.win_rate
+        return 1.96 * sqrt(rate * (1 - rate) / self.seats) if self.seats else 0.
+
+    @property
+    def mean_points(self) -> float:
+        return self.points / self.seats if self.seats else 0.
+
+    @property
+    def points_std(self) -> float:
+        if not self.seats:
+            return 0.
+        return sqrt(max(self.squares / self.seats - self.mean_points ** 2, 0.))
+
+    def as_dict(self) -> dict:
+        return {
+            'seats': self.seats,
+            'win_rate': self.win_rate,
+            'win_rate_error': self.win_rate_error,
+            'mean_points': self.mean_points,
+            'points_std': self.points_std,
+        }
+
+
+class Standings:
+    """
+    >>> standings = Standings()
+    >>> standings.add(GameResult(0, ('Fox', 'Koi'), ('mc', 'random'), (6, 1), (1., 0.)))
+    >>> standings.add(GameResult(1, ('Fox', 'Koi'), ('random', 'mc'), (2, 2), (.5, .5)))
+    >>> standings.games, standings.bots['mc'].win_rate, standings.clans['Koi'].mean_points
+    (2, 0.75, 1.5)
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.bots: t.Dict[str, Score] = {}
+        self.clans: t.Dict[str, Score] = {}
+
+    def add(self, result: GameResult) -> None:
+        self.games += 1
+        seats = zip(result.clans, result.bots, result.points, result.rewards)
+        for clan, bot, points, reward in seats:
+            self.bots.setdefault(bot, Score()).add(reward, points)
+            self.clans.setdefault(clan, Score()).add(reward, points)
+
+    def as_dict(self) -> dict:
+        return {
+            'games': self.games,
+            'bots': {name: score.as_dict() for name, score in sorted(self.bots.items())},
+            'clans': {name: score.as_dict() for name, score in sorted(self.clans.items())},
+        }
+
+    def format(self) -> str:
+        lines = [f'{self.games} games', f'{"":<12} {"seats":>6} {"win rate":>15} {"points":>13}']
+        for scores in (self.bots, self.clans):
+            lines.extend(
+                f'{name:<12} {score.seats:>6} {score.win_rate:>8.3f} ±{score.win_rate_error:.3f}'
+                f' {score.mean_points:>6.2f} ±{score.points_std:.2f}'
+                for name, score in sorted(scores.items(), key=lambda item: -item[1].win_rate)
+            )
+        return '\n'.join(lines)
+
+
+def run_tournament(config: str,
+                   bots: t.Sequence[Bot],
+                   games: int = 1000,
+                   workers: int = 0,
+                   seed: int = 0,
+                   turns: int = 8,
+                   figures: int = 3,
+                   batch_size: int = 10,
+                   rules: Rules = None) -> t.Iterator[GameResult]:
+    """
+    Plays the games and yields their results as they finish. With `workers=0` the games
+    are played in the calling process (in the `CONTEXT` config context, unloaded afterwards),
+    otherwise in a pool of processes, `batch_size` games per task.
+    `figures` is the number of figures a clan starts with.
+
+    >>> standings = Standings()
+    >>> bots = [Bot('random'), Bot('mc', 4, 1)]
+    >>> for result in run_tournament('battle_workout.yaml', bots, games=4, turns=2):
+    ...     standings.add(result)
+    >>> standings.games, sum(score.seats for score in standings.bots.values())
+    (4, 12)
+    """
+    assert len(set(bot.name for bot in bots)) == len(bots), "Names of the bots have to be unique"
+    initargs = (config, tuple(bots), seed, turns, figures, rules or Rules())
+    if not workers:
+        table = _Table(*initargs)
+        try:
+            for game in range(games):
+                yield table.play(game)
+        finally:
+            table.close()
+        return
+
+    pool = ProcessPoolExecutor(
+        workers, mp_context=get_context('spawn'), initializer=_init_worker, initargs=initargs
+    )
+    starts = iter(range(0, games, batch_size))
+    pending = set()
+    try:
+        while True:
+            for start in islice(starts, 2 * workers - len(pending)):
+                pending.add(pool.submit(_play_games, start, min(start + batch_size, games)))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Table:
+    """Plays games of a tournament, with the config & the database of its own."""
+
+    def __init__(self,
+                 config: str,
+                 bots: t.Sequence[Bot],
+                 seed: int,
+                 turns: int,
+                 figures: int,
+                 rules: Rules):
+        self.config = config
+        self.bots = bots
+        self.seed = seed
+        self.turns = turns
+        self.figures = figures
+        self.rules = rules
+        config_repo.unload_context(CONTEXT)
+        config_repo.load_config(config, CONTEXT)
+        board_map, = config_repo.lookup('Map', 'context', CONTEXT)
+        self.graph = board_map.graph
+        self.clan_types = sorted(
+            config_repo.lookup('ClanType', 'context', CONTEXT), key=lambda type_: type_.name
+        )
+        assert self.clan_types, f"No ClanType in {config}"
+        db_repo.create_tables()
+        self.repo = db_repo.fork()
+        self.repo.add_all(self.setup())
+        query = self.repo.session.query
+        # every game starts from a copy of the state of the rows, rather than from new rows
+        self.initial = GameState.from_models(
+            CONTEXT,
+            query(Clan).filter_by(context=CONTEXT).all(),
+            query(Figure).filter_by(context=CONTEXT).all(),
+        )
+
+    def play(self, game: int) -> GameResult:
+        rng = random.Random(f'{self.seed}-{game}')
+        rules, graph = self.rules, self.graph
+        state = self.initial.copy()
+        seats = {
+            type_.name: self.bots[(game + i) % len(self.bots)]
+            for i, type_ in enumerate(self.clan_types)
+        }
+        for _ in range(self.turns):
+            for clan in state.layout.clans:
+                rules.apply(state, seats[clan].act(state, graph, clan, rules, rng))
+
+        names = state.layout.clans
+        return GameResult(
+            game,
+            names,
+            tuple(seats[clan].name for clan in names),
+            tuple(rules.points(state, graph).tolist()),
+            tuple(rules.reward(state, graph, clan) for clan in names),
+        )
+
+    def setup(self) -> t.List[db_repo.Model]:
+        """Rows of the game: the clans of the config & their figures in their home regions."""
+        rows = [Game(context=CONTEXT, id=0, config=self.config)]
+        for i, type_ in enumerate(self.clan_types):
+            rows.append(Clan(context=CONTEXT, name=type_.name))
+            rows.extend(
+                Figure(
+                    context=CONTEXT,
+                    id=i * self.figures + j,
+                    location=type_.region.name,
+                    owner_name=type_.name,
+                    controller_name=type_.name,
+                )
+                for j in range(self.figures)
+            )
+        return rows
+
+    def close(self) -> None:
+        self.repo.session.remove()
+        config_repo.unload_context(CONTEXT)
+
+
+_table: t.Optional[_Table] = None
+
+
+def _init_worker(*args) -> None:
+    global _table
+    _table = _Table(*args)
+
+
+def _play_games(start: int, stop: int) -> t.List[GameResult]:
+    return [_table.play(game) for game in range(start, stop)]
+
+
+def main(argv: t.Sequence[str] = None) -> Standings:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('config', help="config file, ie. battle_workout.yaml or full.yaml")
+    parser.add_argument('--bot', dest='bots', action='append', type=Bot.parse,
+                        help="NAME[:ROLLOUTS[:DEPTH]], a random player without rollouts; "
+                             "repeat it for more bots")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--turns', type=int, default=8)
+    parser.add_argument('--figures', type=int, default=3, help="figures a clan starts with")
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--report-every', type=int, default=100,
+                        help="games between reports of the standings")
+    args = parser.parse_args(argv)
+    results = run_tournament(
+        args.config,
+        args.bots or [Bot('random'), Bot('mc', 32)],
+        games=args.games,
+        workers=args.workers,
+        seed=args.seed,
+        turns=args.turns,
+        figures=args.figures,
+        batch_size=args.batch_size,
+    )
+    standings = Standings()
+    for result in results:
+        standings.add(result)
+        if standings.games % args.report_every == 0 and standings.games < args.games:
+            print(standings.format(), end='\n\n', flush=True)
+    print(standings.format())
+    return standings
+
+
+if __name__ == '__main__':
+    main()
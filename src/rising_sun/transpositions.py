@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded transposition table of search results, keyed by the incremental hash of
+`GameState`s: positions reached by different orders of actions are evaluated once.
+"""
+import typing as t
+
+_EMPTY = None
+
+
+class TableStats(t.NamedTuple):
+    capacity: int
+    occupied: int
+    lookups: int
+    hits: int
+    stores: int
+    replacements: int
+    rejections: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.
+
+    @property
+    def occupancy(self) -> float:
+        return self.occupied / self.capacity
+
+    def __add__(self, other: 'TableStats') -> 'TableStats':
+        """Sum of the stats of tables of several processes."""
+        return TableStats(*(a + b for a, b in zip(self, other)))
+
+
+class TranspositionTable:
+    """
+    Fixed number of slots (a power of 2), addressed by the low bits of the hash; the full
+    hash is kept to tell a position from another one mapped to the same slot. A stored
+    entry is replaced by a different position if it comes from an older generation (see
+    `new_generation`) or if the new result is searched as deep or deeper (depth-preferred
+    replacement); otherwise the new result is rejected.
+
+    >>> table = TranspositionTable(capacity=4)
+    >>> table.store(1, 0.5, depth=2), table.store(5, 1., depth=1)  # the same slot
+    (True, False)
+    >>> table.get(1), table.get(5), table.get(2)
+    (0.5, None, None)
+    >>> table.new_generation(); table.store(5, 1., depth=1)
+    True
+    >>> table.get(5), table.get(1)
+    (1.0, None)
+    >>> stats = table.stats()
+    >>> stats.hits, stats.lookups, stats.replacements, stats.rejections, stats.occupancy
+    (2, 5, 1, 1, 0.25)
+    """
+    __slots__ = (
+        'capacity', '_mask', '_keys', '_values', '_depths', '_generations', '_generation',
+        'lookups', 'hits', 'stores', 'replacements', 'rejections', 'occupied',
+    )
+
+    def __init__(self, capacity: int = 1 << 16):
+        assert capacity > 0 and not capacity & (capacity - 1), "Capacity should be a power of 2"
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._keys: t.List[t.Optional[int]] = [_EMPTY] * capacity
+        self._values: t.List[t.Any] = [None] * capacity
+        self._depths = [0] * capacity
+        self._generations = [0] * capacity
+        self._generation = 0
+        self.lookups = self.hits = self.stores = 0
+        self.replacements = self.rejections = self.occupied = 0
+
+    def __len__(self):
+        return self.occupied
+
+    def get(self, key: int, depth: int = 0) -> t.Any:
+        """The stored result of the position, if it was searched at least `depth` deep."""
+        self.lookups += 1
+        slot = key & self._mask
+        if self._keys[slot] != key or self._depths[slot] < depth:
+            return None
+        self.hits += 1
+        self._generations[slot] = self._generation
+        return self._values[slot]
+
+    def store(self, key: int, value: t.Any, depth: int = 0) -> bool:
+        """Stores the result; returns False if it was rejected by the replacement policy."""
+        slot = key & self._mask
+        stored = self._keys[slot]
+        if stored is _EMPTY:
+            self.occupied += 1
+        elif stored != key:
+            if self._generations[slot] == self._generation and self._depths[slot] > depth:
+                self.rejections += 1
+                return False
+            self.replacements += 1
+        self.stores += 1
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._depths[slot] = depth
+        self._generations[slot] = self._generation
+        return True
+
+    def new_generation(self) -> None:
+        """Ages all the entries, ie. at the next decision: they are replaced by any new result."""
+        self._generation += 1
+
+    def clear(self) -> None:
+        self.__init__(self.capacity)
+
+    def stats(self) -> TableStats:
+        return TableStats(
+            self.capacity, self.occupied, self.lookups, self.hits,
+            self.stores, self.replacements, self.rejections,
+        )
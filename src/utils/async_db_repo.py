@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio counterpart of `utils.db_repo.DbRepo`, built on SQLAlchemy's async engine & session
+(SQLAlchemy>=1.4.19, and `aiosqlite` for local SQLite databases).
+
+Sessions are scoped to the running asyncio task, so concurrently served requests never
+share a session. Remember that lazy loading does not work with async sessions: load
+relationships eagerly (ie. with `selectinload`) or through `run_sync`.
+"""
+import asyncio
+import typing as t
+from functools import partial
+
+from sqlalchemy import event, MetaData
+from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.schema import Table
+
+from utils.db_repo import _set_sqlite_pragmas, ENGINE_PROFILES, EngineProfile
+from utils.functools import reify
+
+try:
+    from sqlalchemy.ext.asyncio import (
+        async_scoped_session,
+        AsyncEngine,
+        AsyncSession,
+        create_async_engine,
+    )
+except ImportError:  # SQLAlchemy<1.4
+    async_scoped_session = AsyncEngine = AsyncSession = create_async_engine = None
+
+
+class AsyncDbRepo:
+    """
+    >>> import pytest
+    >>> _ = pytest.importorskip('sqlalchemy.ext.asyncio'), pytest.importorskip('aiosqlite')
+    >>> from sqlalchemy import Column, Integer, Unicode
+    >>> repo = AsyncDbRepo()
+    >>> class Item(repo.Model):
+    ...     __tablename__ = 'item'
+    ...     id = Column(Integer, primary_key=True)
+    ...     name = Column(Unicode(20))
+    >>> 'engine' in repo.__dict__
+    False
+    >>> async def read(pk):
+    ...     try:
+    ...         return await repo.get('Item', pk)
+    ...     finally:
+    ...         await repo.remove()
+    >>> async def main():
+    ...     await repo.create_tables()
+    ...     await repo.add(Item(id=1, name='Koi'))
+    ...     await repo.remove()
+    ...     try:
+    ...         return await asyncio.gather(read(1), read(1))
+    ...     finally:
+    ...         await repo.engine.dispose()
+    >>> first, second = asyncio.run(main())
+    >>> first.name, first is second  # a session per task
+    ('Koi', False)
+    """
+
+    def __init__(self,
+                 session_options=None,
+                 metadata=None,
+                 model=object,
+                 metaclass=DeclarativeMeta,
+                 debug: bool = False,
+                 db_url: str = 'sqlite+aiosqlite://',
+                 profile: t.Union[str, EngineProfile] = 'memory',
+                 ):
+        assert async_scoped_session, "AsyncDbRepo requires SQLAlchemy>=1.4.19"
+        self._debug = debug
+        self._db_url = db_url
+        self._profile = ENGINE_PROFILES[profile] if isinstance(profile, str) else profile
+        self._session_options = session_options
+        self.Model = self.make_declarative_base(model, metaclass, metadata)
+
+    @property
+    def metadata(self):
+        return self.Model.metadata
+
+    @reify
+    def session(self) -> 'async_scoped_session':
+        """
+        The scoped session of the repo; built on the first use, along with the engine,
+        so declaring models does not connect to anything.
+        """
+        return self.create_scoped_session(options=self._session_options)
+
+    def create_scoped_session(self, options=None) -> 'async_scoped_session':
+        """
+        Creates a session registry scoped to the current asyncio task. Instances are not
+        expired on commit, as there is no implicit IO allowed to refresh them.
+
+        :param options: dict of keyword arguments passed to the session class
+        """
+        options = dict(options or {})
+        options.setdefault('expire_on_commit', False)
+        factory = sessionmaker(bind=self.engine, class_=AsyncSession, **options)
+        return async_scoped_session(factory, scopefunc=asyncio.current_task)
+
+    def make_declarative_base(self, model=object, metaclass=DeclarativeMeta, metadata=None):
+        """
+        Creates the declarative base that all models will inherit from, unless `model` is
+        already a declarative base (ie. `DbRepo.Model`), in which case its mapped classes
+        are served asynchronously as they are.
+        """
+        # declarative bases of other metaclasses (ie. of `rising_sun.db_model`) have metadata too
+        if not isinstance(getattr(model, 'metadata', None), MetaData):
+            model = declarative_base(
+                cls=model,
+                name='DbModel',
+                metadata=metadata,
+                metaclass=metaclass,
+            )
+        if metadata is not None and model.metadata is not metadata:
+            model.metadata = metadata
+        return model
+
+    @reify
+    def engine(self) -> 'AsyncEngine':
+        profile = self._profile
+        options = dict(profile.pool_options, echo=self._debug)
+        if profile.poolclass:
+            options['poolclass'] = profile.poolclass
+        if profile.connect_args:
+            options['connect_args'] = dict(profile.connect_args)
+        engine = create_async_engine(self._db_url, **options)
+        if profile.pragmas and engine.dialect.name == 'sqlite':
+            event.listen(
+                engine.sync_engine,
+                'connect',
+                partial(_set_sqlite_pragmas, pragmas=profile.pragmas)
+            )
+        return engine
+
+    async def create_tables(self, drop: bool = False) -> t.Mapping[str, Table]:
+        metadata = self.metadata
+        async with self.engine.begin() as connection:
+            if drop:
+                await connection.run_sync(metadata.drop_all)
+            await connection.run_sync(metadata.create_all)
+        return metadata.tables
+
+    async def add(self, instance: 'Model', commit: bool = True):
+        session = self.session()
+        session.add(instance)
+        if commit:
+            await session.commit()
+
+    async def get(self, klass_name: t.Union[str, t.Type['Model']], pk: t.Any):
+        klass = self.get_class(klass_name)
+        return await self.session().get(klass, pk)
+
+    async def remove(self):
+        """Closes & discards the session of the current task."""
+        await self.session.remove()
+
+    def get_class(self, klass: t.Union[str, t.Type['Model']]) -> t.Type['Model']:
+        """The model class of the name (a class is returned as it is), mapped by `Model`."""
+        if isinstance(klass, type):
+            return klass
+        classes = (mapper.class_ for mapper in self.Model.registry.mappers)
+        found = next((found for found in classes if found.__name__ == klass), None)
+        assert found, f"No class named '{klass}' found"
+        return found
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal engine of positive Datalog, maintained incrementally: relations are sets of tuples
+with lazily built hash indexes, rules are evaluated semi-naively, insertions of facts are
+propagated from their delta and deletions with DRed (delete & rederive), so a change of
+a few base facts never recomputes the whole fixpoint.
+
+>>> X, Y, Z = variables('X Y Z')
+>>> program = Program([
+...     rule(atom('path', X, Y), atom('edge', X, Y)),
+...     rule(atom('path', X, Z), atom('path', X, Y), atom('edge', Y, Z)),
+... ])
+>>> program.add('edge', [(1, 2), (2, 3)])
+>>> sorted(program.query('path'))
+[(1, 2), (1, 3), (2, 3)]
+>>> program.add('edge', [(3, 4)]); sorted(program.query('path', 1, None))
+[(1, 2), (1, 3), (1, 4)]
+>>> program.remove('edge', [(2, 3)]); sorted(program.query('path'))
+[(1, 2), (3, 4)]
+"""
+import typing as t
+from collections import defaultdict
+
+Fact = t.Tuple[t.Any, ...]
+
+
+class Var:
+    """Variable of rules; variables named with a leading `_` are anonymous (match anything)."""
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def is_anonymous(self) -> bool:
+        return self.name.startswith('_')
+
+    def __repr__(self):
+        return self.name
+
+
+def variables(names: str) -> t.Tuple[Var, ...]:
+    return tuple(Var(name) for name in names.split())
+
+
+class Atom(t.NamedTuple):
+    predicate: str
+    terms: t.Tuple[t.Any, ...]
+
+    def __repr__(self):
+        return f'{self.predicate}({", ".join(map(repr, self.terms))})'
+
+
+class Rule(t.NamedTuple):
+    head: Atom
+    body: t.Tuple[Atom, ...]
+
+    def __repr__(self):
+        return f'{self.head!r} :- {", ".join(map(repr, self.body))}'
+
+
+def atom(predicate: str, *terms) -> Atom:
+    return Atom(predicate, terms)
+
+
+def rule(head: Atom, *body: Atom) -> Rule:
+    assert body, f"Rule of {head} has no body; add it as a fact"
+    bound = {term.name for item in body for term in item.terms if isinstance(term, Var)}
+    assert all(
+        term.name in bound for term in head.terms if isinstance(term, Var)
+    ), f"Variables of the head of {head} should occur in the body"
+    return Rule(head, tuple(body))
+
+
+_ANY = object()
+
+
+class Relation:
+    """
+    Set of facts of a predicate; `match` uses a hash index per combination of bound
+    positions, built on its first use and maintained from then on.
+    """
+    __slots__ = ('name', 'facts', '_indexes')
+
+    def __init__(self, name: str, facts: t.Iterable[Fact] = ()):
+        self.name = name
+        self.facts: t.Set[Fact] = set(facts)
+        # bound positions -> values at the positions -> facts
+        self._indexes: t.Dict[t.Tuple[int, ...], t.Dict[tuple, t.Set[Fact]]] = {}
+
+    def __len__(self):
+        return len(self.facts)
+
+    def __contains__(self, fact: Fact):
+        return fact in self.facts
+
+    def __iter__(self):
+        return iter(self.facts)
+
+    def add(self, fact: Fact) -> bool:
+        if fact in self.facts:
+            return False
+        self.facts.add(fact)
+        for positions, index in self._indexes.items():
+            index.setdefault(tuple(fact[i] for i in positions), set()).add(fact)
+        return True
+
+    def discard(self, fact: Fact) -> bool:
+        if fact not in self.facts:
+            return False
+        self.facts.discard(fact)
+        for positions, index in self._indexes.items():
+            key = tuple(fact[i] for i in positions)
+            bucket = index[key]
+            bucket.discard(fact)
+            if not bucket:
+                del index[key]
+        return True
+
+    def match(self, pattern: t.Sequence[t.Any]) -> t.Iterable[Fact]:
+        """Facts equal to the pattern at its positions other than `_ANY`."""
+        positions = tuple(i for i, value in enumerate(pattern) if value is not _ANY)
+        if not positions:
+            return self.facts
+        if len(positions) == len(pattern):
+            fact = tuple(pattern)
+            return (fact,) if fact in self.facts else ()
+        index = self._indexes.get(positions)
+        if index is None:
+            index = self._indexes[positions] = {}
+            for fact in self.facts:
+                index.setdefault(tuple(fact[i] for i in positions), set()).add(fact)
+        return index.get(tuple(pattern[i] for i in positions), ())
+
+
+class Program:
+    """
+    Rules and relations of facts: base ones (added & removed explicitly) and derived
+    ones (heads of the rules). The derived relations are kept at the fixpoint
+    after each `add` & `remove`.
+    """
+
+    def __init__(self, rules: t.Iterable[Rule] = ()):
+        self.rules: t.List[Rule] = list(rules)
+        self.relations: t.Dict[str, Relation] = {}
+        self.derived = {r.head.predicate for r in self.rules}
+        # predicate -> rules & positions of atoms of the predicate in their bodies
+        self._dependents: t.Dict[str, t.List[t.Tuple[Rule, int]]] = defaultdict(list)
+        for r in self.rules:
+            for position, item in enumerate(r.body):
+                self._dependents[item.predicate].append((r, position))
+
+    def relation(self, predicate: str) -> Relation:
+        found = self.relations.get(predicate)
+        if found is None:
+            found = self.relations[predicate] = Relation(predicate)
+        return found
+
+    def query(self, predicate: str, *pattern) -> t.Iterable[Fact]:
+        """Facts of the predicate; `None`s of the pattern match anything."""
+        relation = self.relation(predicate)
+        if not pattern:
+            return relation.facts
+        return relation.match([_ANY if value is None else value for value in pattern])
+
+    def ask(self, predicate: str, *values) -> bool:
+        return tuple(values) in self.relation(predicate)
+
+    def add(self, predicate: str, facts: t.Iterable[Fact]) -> None:
+        assert predicate not in self.derived, f"{predicate} is derived by rules"
+        relation = self.relation(predicate)
+        delta = {predicate: {fact for fact in map(tuple, facts) if relation.add(fact)}}
+        self._propagate(delta)
+
+    def remove(self, predicate: str, facts: t.Iterable[Fact]) -> None:
+        """
+        DRed: over-deletes everything derived with the facts, then rederives what still holds.
+        """
+        assert predicate not in self.derived, f"{predicate} is derived by rules"
+        removed = {fact for fact in map(tuple, facts) if fact in self.relation(predicate)}
+        if not removed:
+            return
+        # 1. over-deletion, while the relations still hold the facts to be deleted
+        deleted = defaultdict(set, {predicate: removed})
+        delta = {predicate: removed}
+        while delta:
+            delta = self._consequences(delta, exclude=deleted)
+            for head, facts in delta.items():
+                deleted[head] |= facts
+        for name, facts in deleted.items():
+            relation = self.relation(name)
+            for fact in facts:
+                relation.discard(fact)
+        # 2. rederivation of over-deleted facts having other derivations
+        rederived = defaultdict(set)
+        for name, facts in deleted.items():
+            if name not in self.derived:
+                continue
+            for fact in facts:
+                if self._derivable(name, fact):
+                    rederived[name].add(fact)
+        for name, facts in rederived.items():
+            relation = self.relation(name)
+            for fact in facts:
+                relation.add(fact)
+        self._propagate(rederived)
+
+    def _propagate(self, delta: t.Dict[str, t.Set[Fact]]) -> None:
+        """Semi-naive evaluation from the new facts up to the fixpoint."""
+        delta = {name: facts for name, facts in delta.items() if facts}
+        while delta:
+            new = self._consequences(delta)
+            delta = {}
+            for head, facts in new.items():
+                relation = self.relation(head)
+                added = {fact for fact in facts if relation.add(fact)}
+                if added:
+                    delta[head] = added
+
+    def _consequences(self,
+                      delta: t.Mapping[str, t.Set[Fact]],
+                      exclude: t.Mapping[str, t.Set[Fact]] = None) -> t.Dict[str, t.Set[Fact]]:
+        """Heads of rules with an atom of the body matched by the delta (others by relations)."""
+        found = defaultdict(set)
+        for name, facts in delta.items():
+            for r, position in self._dependents.get(name, ()):
+                sources = [self.relation(item.predicate) for item in r.body]
+                sources[position] = Relation(name, facts)
+                for bindings in _join(r.body, sources, {}):
+                    head = _substitute(r.head, bindings)
+                    if exclude is None or head not in exclude.get(r.head.predicate, ()):
+                        found[r.head.predicate].add(head)
+        return found
+
+    def _derivable(self, predicate: str, fact: Fact) -> bool:
+        for r in self.rules:
+            if r.head.predicate != predicate:
+                continue
+            bindings = _unify(r.head.terms, fact, {})
+            if bindings is None:
+                continue
+            sources = [self.relation(item.predicate) for item in r.body]
+            if next(iter(_join(r.body, sources, bindings)), None) is not None:
+                return True
+        return False
+
+
+def _join(body: t.Sequence[Atom],
+          sources: t.Sequence[Relation],
+          bindings: dict) -> t.Iterator[dict]:
+    """All the bindings of variables satisfying the body, atom by atom."""
+    if not body:
+        yield bindings
+        return
+    first, source = body[0], sources[0]
+    pattern = [
+        bindings.get(term.name, _ANY) if isinstance(term, Var) else term
+        for term in first.terms
+    ]
+    for fact in source.match(pattern):
+        extended = _unify(first.terms, fact, bindings)
+        if extended is not None:
+            yield from _join(body[1:], sources[1:], extended)
+
+
+def _unify(terms: t.Sequence[t.Any], fact: Fact, bindings: dict) -> t.Optional[dict]:
+    if len(terms) != len(fact):
+        return None
+    extended = dict(bindings)
+    for term, value in zip(terms, fact):
+        if isinstance(term, Var):
+            if term.is_anonymous:
+                continue
+            bound = extended.setdefault(term.name, value)
+            if bound != value:
+                return None
+        elif term != value:
+            return None
+    return extended
+
+
+def _substitute(head: Atom, bindings: dict) -> Fact:
+    return tuple(bindings[term.name] if isinstance(term, Var) else term for term in head.terms)
@@ -1,12 +1,330 @@
 # -*- coding: utf-8 -*-
+import sqlite3
+import sys
 import typing as t
+from collections import abc, OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from itertools import chain
+from threading import RLock
 
-from sqlalchemy import orm
+from sqlalchemy import event, orm, pool
 from sqlalchemy.engine import create_engine, Engine
-from sqlalchemy.ext.declarative.api import declarative_base, DeclarativeMeta
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.declarative import declarative_base, DeclarativeMeta
 from sqlalchemy.sql.schema import Table
 
+from utils.db_stats import QueryStats
 from utils.functools import reify
+from utils.itertools import chunked
+
+
+class BulkResult(t.NamedTuple):
+    rowcount: int
+    pks: t.Optional[t.List[tuple]] = None
+
+
+class EngineProfile(t.NamedTuple):
+    """
+    Named set of engine options: the pool class and its options, DBAPI connect arguments
+    and SQLite pragmas issued on every new DBAPI connection.
+    """
+    poolclass: t.Optional[t.Type[pool.Pool]] = None
+    pool_options: t.Mapping[str, t.Any] = {}
+    connect_args: t.Mapping[str, t.Any] = {}
+    pragmas: t.Sequence[t.Tuple[str, t.Any]] = ()
+
+
+ENGINE_PROFILES: t.Dict[str, EngineProfile] = {
+    # SQLAlchemy defaults; with `sqlite://` each pooled connection gets its own empty database
+    'default': EngineProfile(),
+    # single in-memory database shared by all threads and sessions: tests & planners
+    'memory': EngineProfile(
+        poolclass=pool.StaticPool,
+        connect_args={'check_same_thread': False},
+        pragmas=(('foreign_keys', 'ON'),),
+    ),
+    # file database tuned for throughput of simulations rather than for durability
+    # (with an in-memory URL, it's a single database shared by threads, as with 'memory')
+    'simulation': EngineProfile(
+        poolclass=pool.QueuePool,
+        pool_options={'pool_size': 4, 'max_overflow': 4},
+        connect_args={'check_same_thread': False},
+        pragmas=(
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            ('temp_store', 'MEMORY'),
+            ('cache_size', -64000),
+            ('foreign_keys', 'ON'),
+        ),
+    ),
+    # database server shared by many workers
+    'server': EngineProfile(
+        poolclass=pool.QueuePool,
+        pool_options={
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True,
+        },
+    ),
+}
+
+
+def _is_sqlite_memory(db_url: str) -> bool:
+    url = make_url(db_url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+class RowCache:
+    """
+    Size-bounded LRU cache of committed row state, keyed by `(class name, pk)` and shared by
+    all sessions of a `DbRepo`. It holds plain dicts of column values (not instances), so
+    nothing in it is bound to any session.
+
+    Entries are invalidated when their rows are flushed as dirty or deleted, and once again
+    when the transaction that flushed them is committed or rolled back (so a row cached
+    in-between by another session does not outlive the change).
+    Bulk updates & deletes drop all entries of the class.
+    Rows read before an invalidation are not cached after it: `put` is given the `generation`
+    of the cache seen before the read, which every invalidation bumps.
+
+    >>> from sqlalchemy import Column, Integer, String
+    >>> repo = DbRepo(profile='memory', cache_size=16)
+    >>> class Item(repo.Model):
+    ...     __tablename__ = 'item'
+    ...     id = Column(Integer, primary_key=True)
+    ...     name = Column(String)
+    >>> _ = repo.create_tables()
+    >>> _ = repo.bulk_insert('Item', [{'id': 1, 'name': 'katana'}, {'id': 2, 'name': 'yari'}])
+    >>> other = repo.session.session_factory()
+    >>> other.query(Item).get(1).name = 'wakizashi'
+    >>> other.flush()
+    >>> repo.get('Item', 1).name, len(repo.cache)  # cached before the rollback
+    ('wakizashi', 1)
+    >>> other.rollback()
+    >>> len(repo.cache)
+    0
+    >>> repo.session.remove()
+    >>> repo.get('Item', 1).name, repo.get('Item', 2).name, len(repo.cache)
+    ('katana', 'yari', 2)
+    >>> repo.session.query(Item).filter(Item.id > 1).update({'name': 'naginata'})
+    1
+    >>> len(repo.cache)
+    0
+    >>> repo.session.commit()
+    >>> repo.session.remove()
+    >>> repo.get('Item', 1).name, repo.get('Item', 2).name, len(repo.cache)
+    ('katana', 'naginata', 2)
+    >>> _ = repo.session.query(Item).filter(Item.id == 2).delete()
+    >>> repo.session.commit()
+    >>> len(repo.cache), repo.get('Item', 2)
+    (0, None)
+    >>> generation = repo.cache.generation
+    >>> repo.cache.invalidate([('Item', (1,))])  # while reading the row
+    >>> repo.cache.put(('Item', (1,)), {'id': 1, 'name': 'katana'}, generation)
+    >>> len(repo.cache)
+    0
+    """
+    _session_key = '_row_cache_keys'
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # bumped by every invalidation
+        self.generation = 0
+        self._rows = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    @staticmethod
+    def make_key(instance_or_class, pk) -> t.Tuple[str, tuple]:
+        klass = instance_or_class if isinstance(instance_or_class, type) else \
+            type(instance_or_class)
+        return klass.__name__, tuple(pk) if isinstance(pk, (tuple, list)) else (pk,)
+
+    def get(self, key) -> t.Optional[dict]:
+        with self._lock:
+            state = self._rows.get(key)
+            if state is None:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(key)
+            self.hits += 1
+            return state
+
+    def put(self, key, state: dict, generation: t.Optional[int] = None) -> None:
+        """Caches the state, unless read before an invalidation (of the `generation` given)."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._rows[key] = state
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, keys: t.Iterable) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._rows.pop(key, None)
+
+    def invalidate_class(self, klass: t.Type) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._rows if key[0] == klass.__name__]:
+                del self._rows[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._rows.clear()
+
+    def listen(self, session_factory) -> None:
+        event.listen(session_factory, 'after_flush', self._after_flush)
+        event.listen(session_factory, 'after_commit', self._after_transaction)
+        event.listen(session_factory, 'after_rollback', self._after_transaction)
+        event.listen(session_factory, 'after_bulk_update', self._after_bulk)
+        event.listen(session_factory, 'after_bulk_delete', self._after_bulk)
+
+    def _after_flush(self, session, flush_context):
+        keys = session.info.setdefault(self._session_key, set())
+        for instance in chain(session.dirty, session.deleted):
+            identity = orm.object_mapper(instance).primary_key_from_instance(instance)
+            keys.add(self.make_key(instance, identity))
+        self.invalidate(keys)
+
+    def _after_transaction(self, session):
+        self.invalidate(session.info.pop(self._session_key, ()))
+
+    def _after_bulk(self, context):
+        self.invalidate_class(context.mapper.class_)
+
+
+class Snapshot:
+    """
+    Copy of a SQLite database kept in an in-memory SQLite database, taken (and restored)
+    with the online backup API: a page-level copy, without any SQL-level reloading.
+    """
+    __slots__ = ('connection',)
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    @classmethod
+    def take(cls, source: sqlite3.Connection) -> 'Snapshot':
+        return cls(_copy_sqlite_database(source))
+
+    def copy(self) -> sqlite3.Connection:
+        """A new, independent in-memory database with the content of the snapshot."""
+        return _copy_sqlite_database(self.connection)
+
+
+def _copy_sqlite_database(
+        source: sqlite3.Connection,
+        target: sqlite3.Connection = None
+) -> sqlite3.Connection:
+    if target is None:
+        target = sqlite3.connect(':memory:', check_same_thread=False)
+    source.backup(target)
+    return target
+
+
+class HydratingQuery(orm.Query):
+    """
+    Query handing loaded instances to `__hydrate__(instances)` of their classes (if defined),
+    in one call per class for the whole result (or per `yield_per` chunk of it): a hook for
+    resolving whatever the instances refer to outside of the database in bulk.
+
+    >>> from sqlalchemy import Column, Integer
+    >>> repo = DbRepo(profile='memory', query_class=HydratingQuery)
+    >>> class Item(repo.Model):
+    ...     __tablename__ = 'item'
+    ...     id = Column(Integer, primary_key=True)
+    ...     @classmethod
+    ...     def __hydrate__(cls, instances):
+    ...         print(sorted(i.id for i in instances))
+    >>> _ = repo.create_tables()
+    >>> _ = repo.bulk_insert('Item', ({'id': i} for i in range(3)))
+    >>> [i.id for i in Item.query]
+    [0, 1, 2]
+    [0, 1, 2]
+    >>> Item.query.hydrated(False).count(), [i.id for i in Item.query.yield_per(2).hydrated(False)]
+    (3, [0, 1, 2])
+    >>> [i.id for i in Item.query.yield_per(2)]
+    [0, 1]
+    [2]
+    [0, 1, 2]
+    >>> [(i.id, n) for i, n in repo.session.query(Item, Item.id + 1).filter(Item.id < 2)]
+    [0, 1]
+    [(0, 1), (1, 2)]
+    >>> Item.query.filter(Item.id > 0).all()[0].id, Item.query.first().id
+    [1, 2]
+    [0]
+    (1, 0)
+    >>> Item.query.filter_by(id=2).one().id
+    [2]
+    2
+    """
+    _hydrate = True
+
+    def hydrated(self, hydrate: bool = True) -> 'HydratingQuery':
+        query = self._clone()
+        query._hydrate = hydrate
+        return query
+
+    def __iter__(self):
+        rows = super().__iter__()
+        if not self._hydrate:
+            return rows
+        return self._hydrated_rows(rows)
+
+    # since SQLAlchemy 1.4 these do not fetch the results through `__iter__`
+
+    def all(self):
+        return list(self)
+
+    def first(self):
+        rows = list(self if self._statement is not None else self.limit(1))
+        return rows[0] if rows else None
+
+    def one(self):
+        row = self.one_or_none()
+        if row is None:
+            raise orm.exc.NoResultFound("No row was found for one()")
+        return row
+
+    def one_or_none(self):
+        rows = list(self)
+        if len(rows) > 1:
+            raise orm.exc.MultipleResultsFound("Multiple rows were found for one_or_none()")
+        return rows[0] if rows else None
+
+    def _hydrated_rows(self, rows):
+        # since SQLAlchemy 1.4 `yield_per` is kept by the load options & rows are not tuples
+        load_options = getattr(self, 'load_options', self)
+        for chunk in chunked(rows, load_options._yield_per or sys.maxsize):
+            by_class = {}
+            for row in chunk:
+                for item in row if isinstance(row, abc.Sequence) else (row,):
+                    if hasattr(type(item), '__hydrate__'):
+                        by_class.setdefault(type(item), []).append(item)
+            for klass, instances in by_class.items():
+                klass.__hydrate__(instances)
+            yield from chunk
 
 
 class _QueryProperty(object):
@@ -32,20 +350,44 @@ class DbRepo:
                  model=object,
                  metaclass=DeclarativeMeta,
                  debug: bool = False,
-                 db_url: str = 'sqlite://'
+                 db_url: str = 'sqlite://',
+                 profile: t.Union[str, EngineProfile] = 'default',
+                 cache_size: int = 0,
+                 instrument: t.Union[bool, QueryStats] = False,
                  ):
         self.app = app
         self._debug = debug
         self._db_url = db_url
+        self._profile = ENGINE_PROFILES[profile] if isinstance(profile, str) else profile
         self._class_registry = {}
+        self._session_options = session_options
+        self._query_stats = instrument if isinstance(instrument, QueryStats) else \
+            QueryStats() if instrument else None
         self.Query = query_class
-        self.session = self.create_scoped_session(session_options)
+        self.cache = RowCache(cache_size) if cache_size else None
         self.Model = self.make_declarative_base(model, metaclass, metadata)
 
     @property
     def metadata(self):
         return self.Model.metadata
 
+    @reify
+    def session(self) -> orm.scoped_session:
+        """
+        The scoped session of the repo; built on the first use, along with the engine,
+        so declaring models does not connect to anything.
+
+        >>> repo = DbRepo()
+        >>> 'engine' in repo.__dict__, repo.session.bind is repo.engine
+        (False, True)
+        """
+        session = self.create_scoped_session(options=self._session_options)
+        if self.cache is not None:
+            self.cache.listen(session.session_factory)
+        if self._query_stats is not None:
+            self._query_stats.listen_sessions(session.session_factory)
+        return session
+
     def create_scoped_session(self, scopefunc=None, options=None):
         """Create a :class:`~sqlalchemy.orm.scoping.scoped_session`
         on the factory from :meth:`create_session`.
@@ -76,7 +418,7 @@ class DbRepo:
 
         :param options: dict of keyword arguments passed to session class
         """
-        return orm.sessionmaker(db=self, **options)
+        return orm.sessionmaker(bind=self.engine, **options)
 
     def make_declarative_base(self, model=object, metaclass=DeclarativeMeta, metadata=None):
         """Creates the declarative base that all models will inherit from.
@@ -91,7 +433,6 @@ class DbRepo:
         """
         if not isinstance(model, DeclarativeMeta):
             model = declarative_base(
-                bind=self.engine,
                 cls=model,
                 name='DbModel',
                 metadata=metadata,
@@ -112,31 +453,307 @@ class DbRepo:
 
     @reify
     def engine(self) -> Engine:
-        if self._debug:
-            engine = create_engine(
-                self._db_url,
-                convert_unicode=True,
-                echo=True,
-                # connect_args={'check_same_thread': False}
+        """
+        Creates the engine according to the profile given to the constructor
+        (see `ENGINE_PROFILES`). A pool of connections to an in-memory SQLite database
+        would be a pool of separate empty databases: the pool of such an engine is replaced
+        with a single connection shared by threads.
+
+        >>> import os, tempfile
+        >>> from threading import Thread
+        >>> repo = DbRepo(profile='memory')
+        >>> thread = Thread(target=repo.engine.execute, args=('CREATE TABLE t (x INT)',))
+        >>> thread.start(); thread.join()
+        >>> repo.engine.execute('SELECT count(*) FROM t').scalar()
+        0
+        >>> path = os.path.join(tempfile.mkdtemp(), 'game.db')
+        >>> engine = DbRepo(db_url=f'sqlite:///{path}', profile='simulation').engine
+        >>> pragmas = ('journal_mode', 'synchronous', 'temp_store', 'cache_size', 'foreign_keys')
+        >>> [engine.execute(f'PRAGMA {name}').scalar() for name in pragmas]
+        ['wal', 1, 2, -64000, 1]
+        >>> engine = DbRepo(db_url=f'sqlite:///{path}', profile='server').engine
+        >>> type(engine.pool).__name__, engine.pool.size(), engine.pool.timeout()
+        ('QueuePool', 10, 30)
+        >>> repo = DbRepo(profile='simulation')
+        >>> thread = Thread(target=repo.engine.execute, args=('CREATE TABLE t (x INT)',))
+        >>> thread.start(); thread.join()
+        >>> type(repo.engine.pool).__name__, repo.engine.execute('SELECT count(*) FROM t').scalar()
+        ('StaticPool', 0)
+        """
+        return self._create_engine(self._db_url, self._profile)
+
+    def _create_engine(self, db_url: str, profile: EngineProfile, **options) -> Engine:
+        if profile.poolclass is pool.QueuePool and _is_sqlite_memory(db_url):
+            profile = profile._replace(
+                poolclass=pool.StaticPool,
+                pool_options={},
+                connect_args=dict(profile.connect_args, check_same_thread=False),
             )
-        else:
-            engine = create_engine(self._db_url, convert_unicode=True)
+        options = dict(profile.pool_options, convert_unicode=True, echo=self._debug, **options)
+        if profile.poolclass:
+            options['poolclass'] = profile.poolclass
+        if profile.connect_args:
+            options['connect_args'] = dict(profile.connect_args)
+        engine = create_engine(db_url, **options)
+        if profile.pragmas and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', partial(_set_sqlite_pragmas, pragmas=profile.pragmas))
+        if self._query_stats is not None:
+            self._query_stats.listen_engine(engine)
         return engine
 
+    def stats(self) -> t.Optional[dict]:
+        """
+        Statistics of the instrumented repo (see `utils.db_stats.QueryStats`), or `None`
+        iff the repo was created without `instrument` option:
+        * `statements`: count, total, p50 & p99 durations by normalized SQL, the slowest first
+        * `slow_queries`: the latest statements above `slow_query_threshold`
+        * `lazy_loads`: numbers of lazy loads (which hit the DB) per relationship
+        * `n_plus_one`: relationships suspected of N+1 lazy loading within a session
+
+        >>> from sqlalchemy import Column, Integer
+        >>> repo = DbRepo(profile='memory', instrument=QueryStats(slow_query_threshold=0))
+        >>> class Item(repo.Model):
+        ...     __tablename__ = 'item'
+        ...     id = Column(Integer, primary_key=True)
+        >>> _ = repo.create_tables()
+        >>> _ = repo.bulk_insert('Item', ({'id': i} for i in range(3)))
+        >>> [repo.get(Item, i).id for i in range(3)]
+        [0, 1, 2]
+        >>> stats = repo.stats()['statements']
+        >>> stats['SELECT item.id AS item_id FROM item WHERE item.id = ?']['count']
+        3
+        >>> len(repo.stats()['slow_queries']) > 3
+        True
+        """
+        return self._query_stats.as_dict() if self._query_stats is not None else None
+
     def create_tables(self, drop: bool = False) -> t.Mapping[str, Table]:
         metadata = self.Model.metadata
         if drop:
-            metadata.drop_all()
-        metadata.create_all()
+            metadata.drop_all(self.engine)
+        metadata.create_all(self.engine)
         return metadata.tables
 
     def add(self, instance: 'Model', commit: bool = True):
-        session = instance.metadata.session
+        session = self.session
         session.add(instance)
         if commit:
             session.commit()
 
-    def get(self, klass_name: str, pk: t.Any):
-        klass = self._class_registry.get(klass_name)
-        assert klass, f"No class named '{klass_name}' found"
-        return klass.query.get(pk)
+    def add_all(self,
+                instances: t.Iterable['Model'],
+                chunk_size: int = 1000,
+                return_pks: bool = False,
+                commit: bool = True) -> BulkResult:
+        """
+        Adds instances to the session, flushing them in chunks of `chunk_size` within
+        a single transaction. The unit of work batches INSERTs of a chunk into
+        executemany calls, unless it has to fetch autoincremented primary keys.
+
+        :param return_pks: iff `True`, the result holds identities of the instances
+        :return: the number of instances written (and their primary keys)
+        """
+        session = self.session
+        rowcount = 0
+        pks = [] if return_pks else None
+        try:
+            for chunk in chunked(instances, chunk_size):
+                session.add_all(chunk)
+                session.flush()
+                rowcount += len(chunk)
+                if return_pks:
+                    pks.extend(orm.object_mapper(i).primary_key_from_instance(i) for i in chunk)
+            if commit:
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return BulkResult(rowcount, pks)
+
+    def bulk_insert(self,
+                    klass: t.Union[str, t.Type['Model']],
+                    rows: t.Iterable[t.Mapping],
+                    chunk_size: int = 1000,
+                    return_pks: bool = False,
+                    commit: bool = True) -> BulkResult:
+        """
+        Inserts rows given as mappings of attribute names to values, in chunks of `chunk_size`
+        within a single transaction. Bypasses the unit of work: no instances are created,
+        each chunk is a single executemany INSERT. Use it for seeding large tables.
+
+        :param return_pks: iff `True`, rows are inserted one by one to fetch their
+            primary keys
+        :return: the number of rows written (and their primary keys)
+        """
+        mapper = orm.class_mapper(self.get_class(klass))
+        pk_keys = [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+        session = self.session
+        rowcount = 0
+        pks = [] if return_pks else None
+        try:
+            for chunk in chunked(rows, chunk_size):
+                chunk = [dict(row) for row in chunk]
+                session.bulk_insert_mappings(mapper, chunk, return_defaults=return_pks)
+                rowcount += len(chunk)
+                if return_pks:
+                    pks.extend(tuple(row[key] for key in pk_keys) for row in chunk)
+            if commit:
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return BulkResult(rowcount, pks)
+
+    def get(self, klass_name: t.Union[str, t.Type['Model']], pk: t.Any):
+        """
+        Gets an instance by its primary key. With `cache_size` given, committed rows
+        are served from the cache shared across sessions, without reaching the database.
+
+        >>> from sqlalchemy import Column, Integer, String
+        >>> repo = DbRepo(profile='memory', cache_size=16)
+        >>> class Item(repo.Model):
+        ...     __tablename__ = 'item'
+        ...     id = Column(Integer, primary_key=True)
+        ...     name = Column(String)
+        >>> _ = repo.create_tables()
+        >>> repo.add(Item(id=1, name='katana'))
+        >>> repo.session.remove()
+        >>> repo.get('Item', 1).name, repo.cache.misses, repo.cache.hits
+        ('katana', 1, 0)
+        >>> repo.session.remove()
+        >>> repo.get('Item', 1).name, repo.cache.misses, repo.cache.hits
+        ('katana', 1, 1)
+        >>> repo.get('Item', 1).name = 'wakizashi'
+        >>> repo.session.commit()
+        >>> len(repo.cache)
+        0
+        """
+        klass = self.get_class(klass_name)
+        if self.cache is None:
+            return self.session().query(klass).get(pk)
+
+        session = self.session()
+        mapper = orm.class_mapper(klass)
+        key = self.cache.make_key(klass, pk)
+        instance = session.identity_map.get(mapper.identity_key_from_primary_key(key[1]))
+        if instance is not None:
+            return instance
+
+        state = self.cache.get(key)
+        if state is not None:
+            instance = mapper.class_manager.new_instance()
+            for attr, value in state.items():
+                orm.attributes.set_committed_value(instance, attr, value)
+            orm.make_transient_to_detached(instance)
+            return session.merge(instance, load=False)
+
+        # a row changed by another session while read here is not cached
+        generation = self.cache.generation
+        instance = session.query(klass).get(pk)
+        if instance is not None and not session.is_modified(instance):
+            loaded = orm.attributes.instance_dict(instance)
+            self.cache.put(key, {
+                attr.key: loaded[attr.key] for attr in mapper.column_attrs if attr.key in loaded
+            }, generation)
+        return instance
+
+    def snapshot(self) -> Snapshot:
+        """
+        Takes a snapshot of the (SQLite) database, as seen by the connection of the current
+        thread. Commit the session first, as pending changes might be missing.
+
+        >>> import os, tempfile
+        >>> from sqlalchemy import Column, Integer
+        >>> path = os.path.join(tempfile.mkdtemp(), 'game.db')
+        >>> repo = DbRepo(db_url=f'sqlite:///{path}', profile='simulation')
+        >>> class Item(repo.Model):
+        ...     __tablename__ = 'item'
+        ...     id = Column(Integer, primary_key=True)
+        >>> _ = repo.create_tables()
+        >>> repo.add(Item(id=1))
+        >>> snapshot = repo.snapshot()
+        >>> repo.add(Item(id=2))
+        >>> repo.restore(snapshot)
+        >>> repo.session.query(Item).count()
+        1
+        >>> fork = repo.fork(snapshot)
+        >>> pragmas = ('cache_size', 'foreign_keys')
+        >>> [fork.engine.execute(f'PRAGMA {name}').scalar() for name in pragmas]
+        [-64000, 1]
+        """
+        with self._raw_sqlite_connection() as connection:
+            return Snapshot.take(connection)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """
+        Overwrites the database with the content of the snapshot. Sessions of the current scope
+        are removed, and the cache is cleared, as their content does not hold anymore.
+        """
+        self.session.remove()
+        if self.cache is not None:
+            self.cache.clear()
+        with self._raw_sqlite_connection() as connection:
+            _copy_sqlite_database(snapshot.connection, connection)
+
+    def fork(self, snapshot: Snapshot = None) -> 'DbRepo':
+        """
+        Creates an independent repo of the same models, bound to an in-memory clone
+        of the database (or of the snapshot given). Use sessions of the fork (ie. `fork.get`
+        or `fork.session.query`), as `Model.query` stays bound to the original repo.
+
+        >>> from sqlalchemy import Column, Integer
+        >>> repo = DbRepo(profile='memory', cache_size=8)
+        >>> class Item(repo.Model):
+        ...     __tablename__ = 'item'
+        ...     id = Column(Integer, primary_key=True)
+        ...     size = Column(Integer)
+        >>> _ = repo.create_tables()
+        >>> repo.add(Item(id=1, size=1))
+        >>> snapshot = repo.snapshot()
+        >>> fork = repo.fork()
+        >>> fork.add(Item(id=2))
+        >>> fork.session.query(Item).count(), repo.session.query(Item).count()
+        (2, 1)
+        >>> repo.get(Item, 1).size
+        1
+        >>> fork.get(Item, 1).size = 2
+        >>> fork.session.commit()
+        >>> repo.session.remove(); fork.session.remove()
+        >>> repo.get(Item, 1).size, fork.get(Item, 1).size, fork.cache is repo.cache
+        (1, 2, False)
+        >>> repo.add(Item(id=3))
+        >>> repo.restore(snapshot)
+        >>> repo.session.query(Item).count()
+        1
+        """
+        connection = snapshot.copy() if snapshot else self.snapshot().connection
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        clone._query_stats = None
+        # pragmas of the profile hold for the clone, served by its single connection
+        profile = self._profile._replace(
+            poolclass=pool.StaticPool, pool_options={}, connect_args={}
+        )
+        clone.engine = clone._create_engine('sqlite://', profile, creator=lambda: connection)
+        clone.session = clone.create_scoped_session(options=self._session_options)
+        clone.cache = RowCache(self.cache.maxsize) if self.cache is not None else None
+        if clone.cache is not None:
+            clone.cache.listen(clone.session.session_factory)
+        return clone
+
+    @contextmanager
+    def _raw_sqlite_connection(self) -> t.Iterator[sqlite3.Connection]:
+        assert self.engine.dialect.name == 'sqlite', "Snapshots are supported only for SQLite"
+        fairy = self.engine.raw_connection()
+        try:
+            yield fairy.connection
+        finally:
+            fairy.close()
+
+    def get_class(self, klass: t.Union[str, t.Type['Model']]) -> t.Type['Model']:
+        """The model class of the name (a class is returned as it is)."""
+        if isinstance(klass, type):
+            return klass
+        found = self._class_registry.get(klass)
+        assert found, f"No class named '{klass}' found"
+        return found
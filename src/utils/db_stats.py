@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+SQL instrumentation for `utils.db_repo.DbRepo`: per-statement timing aggregated by normalized
+SQL text, a threshold-based slow query log and per-session detection of N+1 lazy loads
+of relationships.
+"""
+import logging
+import re
+import threading
+import typing as t
+from collections import Counter, defaultdict, deque
+from time import perf_counter, time
+
+from sqlalchemy import event
+from sqlalchemy.orm import strategies
+
+from utils.itertools import percentile
+
+try:  # SQLAlchemy>=1.4: lazy loads are seen by the `do_orm_execute` event of sessions
+    from sqlalchemy.orm import ORMExecuteState
+except ImportError:
+    ORMExecuteState = None
+
+
+logger = logging.getLogger(__name__)
+
+_whitespace_re = re.compile(r'\s+')
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r'\b\d+(?:\.\d+)?\b')
+_placeholder_list_re = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_values_list_re = re.compile(r'(VALUES \(\?[^)]*\))(?:, \(\?[^)]*\))+', re.IGNORECASE)
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Reduces a statement to its shape: literals and lists of parameters are collapsed,
+    so statements differing only by their values are aggregated together.
+
+    >>> normalize_sql("SELECT * FROM figure WHERE id IN (?, ?, ?)  AND  name = 'Koi'")
+    'SELECT * FROM figure WHERE id IN (?) AND name = ?'
+    >>> normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?) LIMIT 10")
+    'INSERT INTO t (a, b) VALUES (?) LIMIT ?'
+    """
+    statement = _whitespace_re.sub(' ', statement.strip())
+    statement = _string_re.sub('?', statement)
+    statement = _number_re.sub('?', statement)
+    statement = _values_list_re.sub(r'\1', statement)
+    return _placeholder_list_re.sub('(?)', statement)
+
+
+class _StatementStats:
+    __slots__ = ('count', 'total', 'durations')
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.total = 0.
+        self.durations = deque(maxlen=sample_size)
+
+    def as_dict(self) -> dict:
+        ordered = sorted(self.durations)
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': percentile(ordered, 0.5),
+            'p99': percentile(ordered, 0.99),
+        }
+
+
+class QueryStats:
+    """
+    Collects statistics of statements executed by an engine and of relationship lazy loads
+    done by sessions of a session factory. Listeners are registered only by `listen_*`
+    methods (and removed by `close`), so a repo without `QueryStats` pays nothing.
+
+    :param slow_query_threshold: duration (in seconds) above which statements are logged
+        as slow queries; `None` turns the slow query log off
+    :param n_plus_one_threshold: number of lazy loads of the same relationship within a single
+        session which is reported as a suspected N+1 problem
+    :param sample_size: number of the latest durations per statement used for percentiles
+
+    >>> from sqlalchemy import Column, ForeignKey, Integer, create_engine, orm
+    >>> from sqlalchemy.ext.declarative import declarative_base
+    >>> Model = declarative_base()
+    >>> class Parent(Model):
+    ...     __tablename__ = 'parent'
+    ...     id = Column(Integer, primary_key=True)
+    >>> class Child(Model):
+    ...     __tablename__ = 'child'
+    ...     id = Column(Integer, primary_key=True)
+    ...     parent_id = Column(Integer, ForeignKey('parent.id'))
+    ...     parent = orm.relationship(Parent)
+    >>> engine = create_engine('sqlite://')
+    >>> Model.metadata.create_all(engine)
+    >>> session_factory = orm.sessionmaker(engine)
+    >>> stats = QueryStats(n_plus_one_threshold=3)
+    >>> stats.listen_engine(engine); stats.listen_sessions(session_factory)
+    >>> session = session_factory()
+    >>> session.add_all([Parent(id=i) for i in range(3)])
+    >>> session.add_all([Child(id=i, parent_id=i) for i in range(3)])
+    >>> session.commit()
+    >>> session.expunge_all()
+    >>> [child.parent.id for child in session.query(Child).order_by(Child.id)]
+    [0, 1, 2]
+    >>> stats.as_dict()['lazy_loads'], stats.as_dict()['n_plus_one']
+    ({'Child.parent': 3}, {'Child.parent': {'sessions': 1, 'max_loads': 3}})
+    >>> stats.close()
+    >>> session.expunge_all()
+    >>> [child.parent.id for child in session.query(Child).order_by(Child.id)]
+    [0, 1, 2]
+    >>> stats.as_dict()['lazy_loads']
+    {'Child.parent': 3}
+    """
+    session_key = '_query_stats'
+
+    def __init__(self,
+                 slow_query_threshold: t.Optional[float] = None,
+                 n_plus_one_threshold: int = 10,
+                 sample_size: int = 1000,
+                 slow_log_size: int = 100):
+        self.slow_query_threshold = slow_query_threshold
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.sample_size = sample_size
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._statements: t.Dict[str, _StatementStats] = {}
+        self._lazy_loads = Counter()
+        self._n_plus_one = defaultdict(lambda: {'sessions': 0, 'max_loads': 0})
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._engines = []
+        self._session_factories = []
+
+    def listen_engine(self, engine) -> None:
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._engines.append(engine)
+
+    def listen_sessions(self, session_factory) -> None:
+        """
+        Lazy loads are counted by the `do_orm_execute` event of the sessions; before
+        SQLAlchemy 1.4, by the lazy loader of relationships, hooked while listened to.
+        """
+        if ORMExecuteState is not None:
+            event.listen(session_factory, 'do_orm_execute', self._do_orm_execute)
+        else:
+            info = dict(session_factory.kw.get('info') or {})
+            info[self.session_key] = self
+            session_factory.configure(info=info)
+            _lazy_load_hook.acquire()
+        self._session_factories.append(session_factory)
+
+    def close(self) -> None:
+        """Stops listening to the engines & session factories; the statistics are kept."""
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        for session_factory in self._session_factories:
+            if ORMExecuteState is not None:
+                event.remove(session_factory, 'do_orm_execute', self._do_orm_execute)
+                continue
+            info = dict(session_factory.kw.get('info') or {})
+            info.pop(self.session_key, None)
+            session_factory.configure(info=info)
+            _lazy_load_hook.release()
+        self._engines.clear()
+        self._session_factories.clear()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.slow_queries.clear()
+            self._statements.clear()
+            self._lazy_loads.clear()
+            self._n_plus_one.clear()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            statements = sorted(
+                ((sql, stats.as_dict()) for sql, stats in self._statements.items()),
+                key=lambda item: item[1]['total'],
+                reverse=True
+            )
+            return {
+                'statements': dict(statements),
+                'slow_queries': list(self.slow_queries),
+                'lazy_loads': dict(self._lazy_loads),
+                'n_plus_one': {key: dict(value) for key, value in self._n_plus_one.items()},
+            }
+
+    @property
+    def executed_in_thread(self) -> int:
+        return getattr(self._local, 'executed', 0)
+
+    # start times are kept by the connection: statements of other connections of the thread
+    # (ie. of a nested session) may run in between
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_stats_start', []).append(perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = perf_counter() - conn.info['query_stats_start'].pop()
+        self._local.executed = self.executed_in_thread + 1
+        key = normalize_sql(statement)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = _StatementStats(self.sample_size)
+            stats.count += 1
+            stats.total += duration
+            stats.durations.append(duration)
+            if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+                self.slow_queries.append({
+                    'statement': statement,
+                    'parameters': parameters,
+                    'duration': duration,
+                    'timestamp': time(),
+                })
+                logger.warning("Slow query (%.3fs): %s", duration, key)
+
+    def _do_orm_execute(self, orm_execute_state: 'ORMExecuteState') -> None:
+        # executed by lazy loads which hit the database only
+        if orm_execute_state.lazy_loaded_from is not None:
+            relationship = str(orm_execute_state.loader_strategy_path.prop)
+            self._record_lazy_load(orm_execute_state.session, relationship)
+
+    def _record_lazy_load(self, session, relationship: str) -> None:
+        loads = session.info.setdefault('_lazy_loads', Counter())
+        loads[relationship] += 1
+        with self._lock:
+            self._lazy_loads[relationship] += 1
+            if loads[relationship] >= self.n_plus_one_threshold:
+                n_plus_one = self._n_plus_one[relationship]
+                if loads[relationship] == self.n_plus_one_threshold:
+                    n_plus_one['sessions'] += 1
+                    logger.warning(
+                        "Suspected N+1 lazy loading of %s (%d loads in a session)",
+                        relationship, loads[relationship]
+                    )
+                n_plus_one['max_loads'] = max(n_plus_one['max_loads'], loads[relationship])
+
+
+class _LazyLoadHook:
+    """
+    Before SQLAlchemy 1.4 (which has no event of lazy loads), wraps the lazy loader strategy
+    of relationships to report lazy loads which hit the database to `QueryStats` of
+    the session of the loaded instance. The strategy method is looked up on every load, so
+    it is wrapped while any `QueryStats` listens to sessions (see `acquire` & `release`) and
+    restored afterwards. Sessions without `QueryStats` pay only for a lookup in `Session.info`
+    meanwhile.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self._original = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if not self.users:
+                assert hasattr(strategies.LazyLoader, '_load_for_state'), \
+                    "Lazy loads can't be counted: the lazy loader of this SQLAlchemy is unknown"
+                self._original = strategies.LazyLoader._load_for_state
+                strategies.LazyLoader._load_for_state = self._wrap(self._original)
+            self.users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.users -= 1
+            if not self.users:
+                strategies.LazyLoader._load_for_state = self._original
+                self._original = None
+
+    @staticmethod
+    def _wrap(original):
+        def _load_for_state(loader, state, passive, *args, **kwargs):
+            session = state.session
+            stats: QueryStats = session.info.get(QueryStats.session_key) if session else None
+            if stats is None:
+                return original(loader, state, passive, *args, **kwargs)
+            executed = stats.executed_in_thread
+            result = original(loader, state, passive, *args, **kwargs)
+            if stats.executed_in_thread > executed:
+                stats._record_lazy_load(session, str(loader.parent_property))
+            return result
+
+        return _load_for_state
+
+
+_lazy_load_hook = _LazyLoadHook()
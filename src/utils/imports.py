@@ -21,7 +21,7 @@ def get_all_names(_file, _name, _filter=lambda obj: True):
     parent_module = sys.modules[_name]
 
     result = {}
-    for py in [filename[:-3] for filename in os.listdir(path)
+    for py in [filename[:-3] for filename in sorted(os.listdir(path))
                if filename.endswith('.py') and filename != '__init__.py']:
         module = __import__('.'.join([_name, py]), fromlist=[py])
         module_names = getattr(module, '__all__', None) or dir(module)
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+import math
+import sys
 from collections import abc
-from itertools import tee
-from numpy import ndarray
-from typing import Iterable, Sequence, Tuple
+from itertools import islice, tee
+from typing import Iterable, Iterator, List, Sequence, Tuple
 
 
 def transpose(items: Iterable) -> list:
@@ -28,6 +29,37 @@ def pairwise(iterable: Iterable) -> Iterable[Tuple[Iterable, Iterable]]:
     return zip(a, b)
 
 
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    Splits iterable into lists of `size` elements (the last one might be shorter).
+
+    >>> list(chunked(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    assert size > 0, "Chunk size has to be positive"
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an ordered sequence (0 if it's empty): the smallest item
+    not below `fraction` of the items.
+
+    >>> percentile([1, 2, 3, 4], 0.5), percentile([1, 2, 3, 4], 0.99), percentile([], 0.5)
+    (2, 4, 0.0)
+    >>> percentile(range(1, 11), 0.9), percentile([1, 2], 0.5), percentile([1, 2], 0)
+    (9, 1, 1)
+    """
+    if not ordered:
+        return 0.
+    rank = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
 def xrange(start, stop, step):
     """
     Naive range iterator, which can support Numbers other than int
@@ -68,8 +100,10 @@ def is_sequence(obj):
     >>> is_sequence({})
     False
     """
-    return not isinstance(obj, (str, bytes, abc.Mapping)) and \
-        isinstance(obj, (Sequence, generator_type, ndarray))
+    # an ndarray exists only if numpy is imported already; not importing it here saves the startup
+    numpy = sys.modules.get('numpy')
+    sequence_types = (Sequence, generator_type) + ((numpy.ndarray,) if numpy else ())
+    return not isinstance(obj, (str, bytes, abc.Mapping)) and isinstance(obj, sequence_types)
 
 
 def recursive_get(obj, key, default=None):
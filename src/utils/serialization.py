@@ -12,6 +12,8 @@ class CustomLoader(yaml.Loader):
     * `!include` constructor which can incorporate another file (YAML, JSON or plain text lines)
     * supplies constructed object's arguments to __new__ during its construction (the old one
         forces __new__ without arguments)
+    * constructs all the nodes deeply, so an aliased sequence or mapping is complete when
+        an object referencing it is constructed (and validated)
     """
 
     def __init__(self, stream: t.IO, *args, **kwargs) -> None:
@@ -22,6 +24,7 @@ class CustomLoader(yaml.Loader):
             self._root = os.path.curdir
 
         super().__init__(stream, *args, **kwargs)
+        self.deep_construct = True
 
     def construct_yaml_object(self, node: t.Any, cls: t.Any) -> t.Any:
         state = self.construct_mapping(node, deep=True)
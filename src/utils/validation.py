@@ -2,7 +2,6 @@
 import typing as t
 
 from colander import *  # noqa
-from colanderalchemy.schema import SQLAlchemySchemaNode  # noqa
 
 from .imports import import_entity
 
@@ -42,3 +41,11 @@ class Instance(SchemaType):
                 '%r has to be an instance of %r or a serialized form it' % (cstruct, self.klass)
             ))
         return instance
+
+
+def __getattr__(name):
+    # ColanderAlchemy imports SQLAlchemy: it's deferred until a schema of a DB model is built
+    if name == 'SQLAlchemySchemaNode':
+        from colanderalchemy.schema import SQLAlchemySchemaNode
+        return SQLAlchemySchemaNode
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,74 @@
 # -*- coding: utf-8 -*-
+import typing as t
+from itertools import chain
+
 from lxml import etree
 
 
-def load_xml(filepath):
-    tree = etree.parse(filepath)
+def make_parser(huge_tree: bool = False) -> etree.XMLParser:
+    """
+    XML parser used by the loaders. `huge_tree` lifts libxml2 security limits on
+    the depth and the size of text nodes; use it only for own (trusted) datafiles.
+    """
+    return etree.XMLParser(huge_tree=huge_tree)
+
+
+def load_xml(filepath, huge_tree: bool = False):
+    tree = etree.parse(filepath, make_parser(huge_tree))
     assert len(tree.getroot())
     return tree
+
+
+def iter_xml(
+        filepath,
+        tag: str = None,
+        klass: str = None,
+        huge_tree: bool = False
+) -> t.Iterator[etree._Element]:
+    """
+    Streaming companion of `load_xml`: yields elements matching `tag` and/or the value
+    of their `class` attribute (ie. `DoCO:TextChunk`) as soon as they are fully parsed.
+
+    Each yielded element is cleared after the consumer gets back to the loop, together
+    with already processed siblings of it and of its ancestors, so the memory stays flat
+    regardless of the size of the document. Copy the element (or its data) if you need it
+    after the next iteration step. A match nested in another match is yielded too,
+    but it is not cleared, as it is still a part of the enclosing one.
+
+    >>> from io import BytesIO
+    >>> source = BytesIO(
+    ...     b'<doc><region class="DoCO:TextChunk">a</region><region class="x">b</region>'
+    ...     b'<section><region class="DoCO:TextChunk">c</region></section></doc>'
+    ... )
+    >>> [e.text for e in iter_xml(source, tag='region', klass='DoCO:TextChunk')]
+    ['a', 'c']
+    """
+    assert tag or klass, "Provide `tag` and/or `klass` to match elements against"
+    context = etree.iterparse(
+        filepath,
+        events=('end',),
+        tag=tag or '*',
+        huge_tree=huge_tree,
+    )
+    for _, element in context:
+        if klass is not None and element.get('class') != klass:
+            continue
+        yield element
+        if not any(_is_match(ancestor, tag, klass) for ancestor in element.iterancestors()):
+            _release(element)
+    del context
+
+
+def _is_match(element: etree._Element, tag: t.Optional[str], klass: t.Optional[str]) -> bool:
+    return (
+        (tag is None or element.tag == tag) and
+        (klass is None or element.get('class') == klass)
+    )
+
+
+def _release(element: etree._Element) -> None:
+    """Frees the element and everything parsed before it."""
+    element.clear()
+    for node in chain((element,), element.iterancestors()):
+        while node.getprevious() is not None:
+            del node.getparent()[0]